@@ -22,6 +22,7 @@ takes into account the sources dependencies when building so you don't
 need to provide a source list ordered by hand.
 """
 import os
+from multiprocessing import cpu_count
 
 from ._version import get_versions
 
@@ -40,7 +41,17 @@ DEFAULT_PROJECT_FILE = os.environ.get(
     "_hdl_checker.config" if ON_WINDOWS else ".hdl_checker.config",
 )
 
-CACHE_NAME = os.environ.get("HDL_CHECKER_CACHE_NAME", "cache.json")
+CACHE_NAME = os.environ.get("HDL_CHECKER_CACHE_NAME", "cache.db")
+PARSE_CACHE_NAME = os.environ.get("HDL_CHECKER_PARSE_CACHE_NAME", "parse_cache")
+BUILD_STAMPS_NAME = os.environ.get("HDL_CHECKER_BUILD_STAMPS_NAME", "build_stamps.db")
+# Maximum number of independent dependencies to build at the same time
+BUILD_JOBS = int(os.environ.get("HDL_CHECKER_BUILD_JOBS", cpu_count()))
+# Maximum number of processes used to parse sources when configuring
+PARSE_JOBS = int(os.environ.get("HDL_CHECKER_PARSE_JOBS", cpu_count()))
+# Time in seconds static checks can take on a single file
+STATIC_CHECK_TIME_BUDGET = float(
+    os.environ.get("HDL_CHECKER_STATIC_CHECK_TIME_BUDGET", 5)
+)
 WORK_PATH = os.environ.get(
     "HDL_CHECKER_WORK_PATH", "_hdl_checker" if ON_WINDOWS else ".hdl_checker"
 )
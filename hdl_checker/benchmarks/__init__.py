@@ -0,0 +1,17 @@
+# This file is part of HDL Checker.
+#
+# Copyright (c) 2015 - 2019 suoto (Andre Souto)
+#
+# HDL Checker is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# HDL Checker is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with HDL Checker.  If not, see <http://www.gnu.org/licenses/>.
+"Benchmarks for HDL Checker, see each module for how to run it"
@@ -0,0 +1,244 @@
+# This file is part of HDL Checker.
+#
+# Copyright (c) 2015 - 2019 suoto (Andre Souto)
+#
+# HDL Checker is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# HDL Checker is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with HDL Checker.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Compares Database.getBuildSequence against the previous implementation, which
+swept every path until no more could be built. Run with
+
+    python -m hdl_checker.benchmarks.build_sequence [--size N] [--repeat N]
+"""
+
+from __future__ import print_function
+
+import argparse
+import logging
+import os.path as p
+import shutil
+import tempfile
+import time
+from itertools import chain
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+
+from hdl_checker import DEFAULT_LIBRARY
+from hdl_checker.database import Database, LibraryUnitTuple
+from hdl_checker.parsers.elements.dependency_spec import RequiredDesignUnit
+from hdl_checker.parsers.elements.identifier import Identifier
+from hdl_checker.path import Path
+
+_logger = logging.getLogger(__name__)
+
+_PACKAGE = """\
+{uses}
+package {name} is
+end package {name};
+"""
+
+_ENTITY = """\
+{uses}
+entity {name} is
+end entity {name};
+"""
+
+# Maps a unit name to the units it uses
+Topology = Dict[str, List[str]]
+
+
+def _chain(size):
+    # type: (int) -> Tuple[str, Topology]
+    "Each package uses the previous one"
+    topology = {"pkg_0": []}  # type: Topology
+    for i in range(1, size):
+        topology["pkg_%d" % i] = ["pkg_%d" % (i - 1)]
+    return "pkg_%d" % (size - 1), topology
+
+
+def _fanIn(size):
+    # type: (int) -> Tuple[str, Topology]
+    "A single entity using lots of independent packages"
+    topology = {"pkg_%d" % i: [] for i in range(size)}  # type: Topology
+    topology["top"] = sorted(topology)
+    return "top", topology
+
+
+def _diamonds(size):
+    # type: (int) -> Tuple[str, Topology]
+    "Diamonds stacked on top of each other, each one using the one below"
+    topology = {"pkg_0_bottom": []}  # type: Topology
+    bottom = "pkg_0_bottom"
+    for i in range(1, max(2, size // 3)):
+        left, right, top = "pkg_%d_left" % i, "pkg_%d_right" % i, "pkg_%d_bottom" % i
+        topology[left] = [bottom]
+        topology[right] = [bottom]
+        topology[top] = [left, right]
+        bottom = top
+    return bottom, topology
+
+
+_TOPOLOGIES = (
+    ("chain", _chain),
+    ("fan-in", _fanIn),
+    ("diamond", _diamonds),
+)  # type: Tuple[Tuple[str, Callable[[int], Tuple[str, Topology]]], ...]
+
+
+def _writeSources(root, top, topology):
+    # type: (str, str, Topology) -> Dict[str, Path]
+    "Writes one file per unit and returns a map of unit names to paths"
+    paths = {}  # type: Dict[str, Path]
+    for name, uses in topology.items():
+        path = p.join(root, name + ".vhd")
+        template = _ENTITY if name == top else _PACKAGE
+        with open(path, "w") as fd:
+            fd.write(
+                template.format(
+                    name=name,
+                    uses="\n".join("use work.%s.all;" % x for x in sorted(uses)),
+                )
+            )
+        paths[name] = Path(path)
+    return paths
+
+
+def legacyBuildSequence(database, units_to_build):
+    # type: (Database, Set[LibraryUnitTuple]) -> Iterable[Tuple[Identifier, Path]]
+    """
+    Build sequence as it was calculated before: every path not built is checked
+    on every iteration, until no more paths can be built
+    """
+    units_compiled = set()  # type: Set[LibraryUnitTuple]
+
+    paths_to_build = set(
+        chain.from_iterable(
+            database.getPathsDefining(name=name, library=library)
+            for library, name in units_to_build
+        )
+    )
+
+    for _ in range(len(paths_to_build) + 1):
+        paths_built = set()  # type: Set[Path]
+
+        for current_path in paths_to_build:
+            own = {
+                (database.getLibrary(current_path), x.name)
+                for x in database.getDesignUnitsByPath(current_path)
+            }
+
+            deps = {
+                (
+                    dependency.library or database.getLibrary(dependency.owner),
+                    dependency.name,
+                )
+                for dependency in database.getDependenciesByPath(current_path)
+                if dependency.name.name != "all"
+                and isinstance(dependency, RequiredDesignUnit)
+            }
+
+            path_needs = deps - units_compiled - own
+            new_units = own - units_compiled
+
+            if new_units and not path_needs:
+                yield database.getLibrary(current_path) or DEFAULT_LIBRARY, current_path
+                paths_built.add(current_path)
+                units_compiled |= own
+            elif not new_units:
+                paths_built.add(current_path)
+
+        paths_to_build -= paths_built
+
+        if not paths_built:
+            return
+
+
+def _timeIt(func, repeat):
+    # type: (Callable[[], object], int) -> float
+    "Returns the best time out of the given number of runs"
+    times = []  # type: List[float]
+    for _ in range(max(1, repeat)):
+        start = time.time()
+        func()
+        times.append(time.time() - start)
+    return min(times)
+
+
+def run(size, repeat):
+    # type: (int, int) -> List[Tuple[str, float, float]]
+    """
+    Runs the benchmark for every topology, returning a list of (topology name,
+    legacy time, current time) tuples
+    """
+    results = []  # type: List[Tuple[str, float, float]]
+    for name, generator in _TOPOLOGIES:
+        root = tempfile.mkdtemp(prefix="hdl_checker_bench_")
+        try:
+            top, topology = generator(size)
+            paths = _writeSources(root, top, topology)
+
+            database = Database()
+            for path in paths.values():
+                database.addSource(path, "lib")
+
+            snapshot = database.snapshot
+            (
+                units,
+                _,
+                _,
+            ) = database._searchDependencies(  # pylint: disable=protected-access
+                snapshot, paths[top]
+            )
+
+            def current():
+                # type: () -> Tuple[Tuple[Identifier, Path], ...]
+                return tuple(
+                    database._getBuildSequence(  # pylint: disable=protected-access
+                        snapshot, paths[top], frozenset(), set(units)
+                    )
+                )
+
+            def legacy():
+                # type: () -> Tuple[Tuple[Identifier, Path], ...]
+                return tuple(legacyBuildSequence(database, set(units)))
+
+            # Paths built on the same sweep might come out in a different
+            # order, but both should build exactly the same paths
+            assert set(current()) == set(legacy()), (
+                "Build sequences differ for %s" % name
+            )
+
+            results.append((name, _timeIt(legacy, repeat), _timeIt(current, repeat)))
+        finally:
+            shutil.rmtree(root)
+
+    return results
+
+
+def main():
+    # type: () -> None
+    "Runs the benchmarks from the command line"
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--size", type=int, default=400, help="Units per topology")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per topology")
+    args = parser.parse_args()
+
+    print("%-10s %12s %12s %10s" % ("topology", "legacy (s)", "current (s)", "speedup"))
+    for name, legacy, current in run(args.size, args.repeat):
+        print(
+            "%-10s %12.4f %12.4f %9.1fx"
+            % (name, legacy, current, legacy / current if current else float("inf"))
+        )
+
+
+if __name__ == "__main__":
+    main()
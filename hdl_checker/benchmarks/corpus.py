@@ -0,0 +1,280 @@
+# This file is part of HDL Checker.
+#
+# Copyright (c) 2015 - 2019 suoto (Andre Souto)
+#
+# HDL Checker is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# HDL Checker is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with HDL Checker.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Generates reproducible synthetic projects mixing VHDL, Verilog and
+SystemVerilog sources, for benchmarking operations at realistic project
+sizes. Write one to a folder (along with a config file listing its sources)
+with
+
+    python -m hdl_checker.benchmarks.corpus PATH [--sources N] [--seed N] ...
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import logging
+import os
+import os.path as p
+import random
+from typing import Any, Dict, List, NamedTuple, Sequence, Tuple
+
+from hdl_checker.path import Path
+
+_logger = logging.getLogger(__name__)
+
+# Maps each language to the extension its sources use
+LANGUAGES = {"vhdl": "vhd", "verilog": "v", "systemverilog": "sv"}
+
+TOPOLOGIES = ("chain", "tree", "random")
+
+Corpus = NamedTuple(
+    "Corpus",
+    (
+        ("root", str),
+        ("config", Dict[str, Any]),
+        # Sources in the order they were generated, headers not included
+        ("paths", Tuple[Path, ...]),
+        # Path each source's design unit (named after the path) is defined in
+        ("units", Dict[str, Path]),
+    ),
+)
+
+_VHDL = """\
+{libraries}
+package {name} is
+    constant C_{name} : integer := {value};
+end package {name};
+
+package body {name} is
+end package body {name};
+"""
+
+_VERILOG = """\
+{includes}
+module {name} (input clk, output reg q);
+    always @(posedge clk) q <= ~q;
+endmodule
+"""
+
+_SYSTEMVERILOG = """\
+{includes}
+package {name};
+{imports}
+    parameter int P_{name} = {value};
+endpackage
+"""
+
+_HEADER = """\
+{includes}
+`define HEADER_{depth}
+"""
+
+
+def _getDependencies(rng, topology, count, fan_out):
+    # type: (random.Random, str, int, int) -> List[List[int]]
+    """
+    Indexes of the sources each of count sources depend on, always lower
+    than the source's own index so there are no circular dependencies
+    """
+    if topology == "chain":
+        return [[i - 1] if i else [] for i in range(count)]
+    if topology == "tree":
+        return [[(i - 1) // fan_out] if i else [] for i in range(count)]
+    if topology == "random":
+        return [sorted(rng.sample(range(i), min(i, fan_out))) for i in range(count)]
+    raise ValueError("Unknown topology %s, use one of %s" % (topology, TOPOLOGIES))
+
+
+def _write(root, name, content):
+    # type: (str, str, str) -> Path
+    path = p.join(root, name)
+    if not p.exists(p.dirname(path)):
+        os.makedirs(p.dirname(path))
+    with open(path, "w") as fd:
+        fd.write(content)
+    return Path(path)
+
+
+def generateCorpus(  # pylint: disable=too-many-arguments,too-many-locals
+    root,  # type: str
+    sources=1000,  # type: int
+    topology="random",  # type: str
+    fan_out=3,  # type: int
+    include_depth=2,  # type: int
+    libraries=4,  # type: int
+    inferred_ratio=0.5,  # type: float
+    languages=tuple(LANGUAGES),  # type: Sequence[str]
+    seed=0,  # type: int
+):
+    # type: (...) -> Corpus
+    """
+    Writes a synthetic project to root. Sources are assigned a language at
+    random and depend only on sources of the same language, following the
+    given topology: VHDL packages use other packages, SystemVerilog packages
+    import other packages and Verilog modules have no dependencies other than
+    includes. Verilog and SystemVerilog sources include a chain of
+    include_depth headers. Sources are spread across libraries and, of those,
+    about inferred_ratio are listed without a library so that it has to be
+    inferred. The same arguments always generate the same project.
+    """
+    rng = random.Random(seed)
+
+    headers = [
+        _write(
+            root,
+            p.join("include", "header_%d.svh" % depth),
+            _HEADER.format(
+                includes='`include "header_%d.svh"' % (depth + 1)
+                if depth + 1 < include_depth
+                else "",
+                depth=depth,
+            ),
+        )
+        for depth in range(include_depth)
+    ]
+    includes = '`include "header_0.svh"' if include_depth else ""
+
+    # Work out dependencies within each language
+    by_language = {}  # type: Dict[str, List[int]]
+    for index in range(sources):
+        by_language.setdefault(rng.choice(languages), []).append(index)
+
+    dependencies = {}  # type: Dict[int, List[int]]
+    for indexes in by_language.values():
+        for index, deps in zip(
+            indexes, _getDependencies(rng, topology, len(indexes), fan_out)
+        ):
+            dependencies[index] = [indexes[x] for x in deps]
+
+    language_of = {
+        index: language
+        for language, indexes in by_language.items()
+        for index in indexes
+    }
+
+    def library(index):
+        # type: (int) -> str
+        return "lib_%d" % (index % libraries)
+
+    paths = []  # type: List[Path]
+    units = {}  # type: Dict[str, Path]
+    entries = [header.name for header in headers]  # type: List[Any]
+    for index in range(sources):
+        name = "unit_%d" % index
+        language = language_of[index]
+
+        if language == "vhdl":
+            content = _VHDL.format(
+                name=name,
+                value=index,
+                libraries="\n".join(
+                    "library {0};\nuse {0}.unit_{1}.all;".format(library(x), x)
+                    for x in dependencies[index]
+                ),
+            )
+        elif language == "verilog":
+            content = _VERILOG.format(name=name, includes=includes)
+        else:
+            content = _SYSTEMVERILOG.format(
+                name=name,
+                value=index,
+                includes=includes,
+                imports="\n".join(
+                    "    import unit_%d::*;" % x for x in dependencies[index]
+                ),
+            )
+
+        path = _write(
+            root,
+            p.join(library(index), "%s.%s" % (name, LANGUAGES[language])),
+            content,
+        )
+        paths.append(path)
+        units[name] = path
+
+        if rng.random() < inferred_ratio:
+            entries.append(path.name)
+        else:
+            entries.append([path.name, {"library": library(index)}])
+
+    return Corpus(
+        root=root, config={"sources": entries}, paths=tuple(paths), units=units
+    )
+
+
+def addCorpusArguments(parser):
+    # type: (argparse.ArgumentParser) -> None
+    "Adds arguments of generateCorpus to an argument parser"
+    parser.add_argument("--sources", type=int, default=1000, help="Number of sources")
+    parser.add_argument(
+        "--topology", choices=TOPOLOGIES, default="random", help="Dependency topology"
+    )
+    parser.add_argument("--fan-out", type=int, default=3, help="Dependencies per unit")
+    parser.add_argument(
+        "--include-depth", type=int, default=2, help="Depth of nested includes"
+    )
+    parser.add_argument("--libraries", type=int, default=4, help="Number of libraries")
+    parser.add_argument(
+        "--inferred-ratio",
+        type=float,
+        default=0.5,
+        help="Ratio of sources without a library set",
+    )
+    parser.add_argument(
+        "--languages",
+        nargs="+",
+        choices=tuple(LANGUAGES),
+        default=tuple(LANGUAGES),
+        help="Languages to generate sources for",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+
+
+def getCorpusArguments(args):
+    # type: (argparse.Namespace) -> Dict[str, Any]
+    "Extracts the arguments of generateCorpus parsed from the command line"
+    return {
+        "sources": args.sources,
+        "topology": args.topology,
+        "fan_out": args.fan_out,
+        "include_depth": args.include_depth,
+        "libraries": args.libraries,
+        "inferred_ratio": args.inferred_ratio,
+        "languages": tuple(args.languages),
+        "seed": args.seed,
+    }
+
+
+def main():
+    # type: () -> None
+    "Writes a corpus from the command line"
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("path", help="Folder to write the project to")
+    addCorpusArguments(parser)
+    args = parser.parse_args()
+
+    corpus = generateCorpus(args.path, **getCorpusArguments(args))
+    config_file = p.join(args.path, "config.json")
+    with open(config_file, "w") as fd:
+        fd.write(json.dumps(corpus.config, indent=2))
+
+    print("Wrote %d sources, config file is %s" % (len(corpus.paths), config_file))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+# This file is part of HDL Checker.
+#
+# Copyright (c) 2015 - 2019 suoto (Andre Souto)
+#
+# HDL Checker is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# HDL Checker is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with HDL Checker.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Times parsing large VHDL and Verilog files, comparing locations resolved via
+the line index against scanning the text before each match. Run with
+
+    python -m hdl_checker.benchmarks.parsers [--lines N] [--repeat N]
+"""
+
+from __future__ import print_function
+
+import argparse
+import logging
+import os.path as p
+import shutil
+import tempfile
+import time
+from typing import Any, Callable, List, Tuple, Type
+
+from hdl_checker.parsers.base_parser import BaseSourceFile
+from hdl_checker.parsers.verilog_parser import VerilogParser
+from hdl_checker.parsers.vhdl_parser import VhdlParser
+from hdl_checker.path import Path
+
+_logger = logging.getLogger(__name__)
+
+
+def _vhdlPackage(lines):
+    # type: (int) -> str
+    "Generated package with lots of constants referring to other packages"
+    body = []  # type: List[str]
+    for i in range(lines):
+        if i % 4 == 0:
+            body.append("    -- Constant %d, refers to lib.pkg_%d" % (i, i % 50))
+        body.append(
+            "    constant C_%d : integer := lib.pkg_%d.C_VALUE + %d;" % (i, i % 50, i)
+        )
+
+    return "\n".join(
+        ["library lib;", "use lib.pkg_0.all;", "", "package big_pkg is"]
+        + body
+        + ["end package big_pkg;", "", "package body big_pkg is", "end package body;"]
+    )
+
+
+def _verilogNetlist(lines):
+    # type: (int) -> str
+    "Generated module with lots of package references"
+    body = []  # type: List[str]
+    for i in range(lines):
+        if i % 4 == 0:
+            body.append("  // Wire %d" % i)
+        body.append("  wire [pkg_%d::WIDTH - 1:0] w_%d;" % (i % 50, i))
+
+    return "\n".join(
+        ['`include "defines.svh"', "module big_netlist;"] + body + ["endmodule"]
+    )
+
+
+class _ScanningLineIndex(object):
+    "Works out locations by scanning the text, like parsers used to"
+
+    def __init__(self, text):
+        # type: (str) -> None
+        self._text = text
+        self._lines = text.split("\n")
+
+    def getLine(self, offset):
+        # type: (int) -> int
+        return self._text[:offset].count("\n")
+
+    def getColumn(self, offset):
+        # type: (int) -> int
+        return len(self._text[:offset].split("\n")[-1])
+
+    def getLineStart(self, line):
+        # type: (int) -> int
+        return len("\n".join(self._lines[:line])) + (1 if line else 0)
+
+
+def _scanning(parser_class):
+    # type: (Type[BaseSourceFile]) -> Any
+    "Creates a parser class that uses _ScanningLineIndex"
+
+    class _Parser(parser_class):  # type: ignore
+        def _canScanBuffer(self, buffer):
+            # Scanning the bytes of the file doesn't use the line index
+            return False
+
+        def getLineIndex(self):
+            return _ScanningLineIndex(self.getSourceContent())
+
+    return _Parser
+
+
+def _parse(parser_class, path):
+    # type: (Type[BaseSourceFile], Path) -> Tuple[Any, Any]
+    "Parses a file from scratch"
+    parser = parser_class(path)
+    return parser.getDesignUnits(), parser.getDependencies()
+
+
+def _timeIt(func, repeat):
+    # type: (Callable[[], object], int) -> float
+    "Returns the best time out of the given number of runs"
+    times = []  # type: List[float]
+    for _ in range(max(1, repeat)):
+        start = time.time()
+        func()
+        times.append(time.time() - start)
+    return min(times)
+
+
+_SOURCES = (
+    ("vhdl", "big_pkg.vhd", _vhdlPackage, VhdlParser),
+    ("verilog", "big_netlist.sv", _verilogNetlist, VerilogParser),
+)  # type: Tuple[Tuple[str, str, Callable[[int], str], Type[BaseSourceFile]], ...]
+
+
+def run(lines, repeat):
+    # type: (int, int) -> List[Tuple[str, float, float]]
+    """
+    Runs the benchmark for each language, returning a list of (language,
+    scanning time, indexed time) tuples
+    """
+    results = []  # type: List[Tuple[str, float, float]]
+    root = tempfile.mkdtemp(prefix="hdl_checker_bench_")
+    try:
+        for name, filename, generator, parser_class in _SOURCES:
+            path = Path(p.join(root, filename))
+            with open(path.name, "w") as fd:
+                fd.write(generator(lines))
+
+            scanning_class = _scanning(parser_class)
+
+            assert _parse(parser_class, path) == _parse(scanning_class, path), (
+                "Parse results differ for %s" % name
+            )
+
+            results.append(
+                (
+                    name,
+                    _timeIt(lambda: _parse(scanning_class, path), repeat),
+                    _timeIt(lambda: _parse(parser_class, path), repeat),
+                )
+            )
+    finally:
+        shutil.rmtree(root)
+
+    return results
+
+
+def main():
+    # type: () -> None
+    "Runs the benchmarks from the command line"
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--lines", type=int, default=40000, help="Lines per file")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per file")
+    args = parser.parse_args()
+
+    print(
+        "%-10s %12s %12s %10s" % ("language", "scanning (s)", "indexed (s)", "speedup")
+    )
+    for name, scanning, indexed in run(args.lines, args.repeat):
+        print(
+            "%-10s %12.4f %12.4f %9.1fx"
+            % (name, scanning, indexed, scanning / indexed if indexed else float("inf"))
+        )
+
+
+if __name__ == "__main__":
+    main()
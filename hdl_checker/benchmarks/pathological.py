@@ -0,0 +1,122 @@
+# This file is part of HDL Checker.
+#
+# Copyright (c) 2015 - 2019 suoto (Andre Souto)
+#
+# HDL Checker is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# HDL Checker is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with HDL Checker.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Times parsers and static checks on inputs known to make regexes backtrack,
+comparing the time taken for two sizes of each. Scanning should be linear, so
+4 times the size should take about 4 times as long. Run with
+
+    python -m hdl_checker.benchmarks.pathological [--size N] [--repeat N]
+"""
+
+from __future__ import print_function
+
+import argparse
+import logging
+import os.path as p
+import shutil
+import tempfile
+from typing import Callable, List, Optional, Tuple
+
+from hdl_checker.benchmarks.parsers import _timeIt
+from hdl_checker.parser_utils import parseSourceCompact
+from hdl_checker.static_check import getStaticMessages
+from hdl_checker.utils import TimeBudget
+
+_logger = logging.getLogger(__name__)
+
+# Name, file extension and a function that generates content of about the size
+# given. Files with extension None are passed to the static checker
+_CORPUS = (
+    ("vhdl whitespaces", "vhd", lambda n: "package p is\n" + " " * n + "\nend;"),
+    ("vhdl blank lines", "vhd", lambda n: "package p is\n" + "\n" * n + "end;"),
+    (
+        "vhdl library list",
+        "vhd",
+        lambda n: "library " + ", ".join("l%d" % i for i in range(n // 5)),
+    ),
+    ("vhdl dots", "vhd", lambda n: "a" + ". a" * (n // 3)),
+    ("vhdl long word", "vhd", lambda n: "a" * n + " .x"),
+    ("sv whitespaces", "sv", lambda n: "module m;\n" + " " * n + "\nendmodule"),
+    ("sv unterminated comments", "sv", lambda n: "/* " * (n // 3)),
+    ("sv backslashes", "sv", lambda n: "a\\" * (n // 2)),
+    ("sv unterminated includes", "sv", lambda n: '`include "' * (n // 10)),
+    ("sv scopes", "sv", lambda n: "a ::" * (n // 4)),
+    ("static port whitespaces", None, lambda n: "entity e is\n  port (\na" + " " * n),
+    ("static library whitespaces", None, lambda n: "library " + " " * n + "x"),
+    ("static comment whitespaces", None, lambda n: "x" + " " * n + "y -- z"),
+    (
+        "static many signals",
+        None,
+        lambda n: "\n".join(
+            ["architecture a of e is"]
+            + ["signal s%d : bit;" % i for i in range(n // 10)]
+            + ["begin"]
+        ),
+    ),
+)  # type: Tuple[Tuple[str, Optional[str], Callable[[int], str]], ...]
+
+
+def _check(root, extension, content):
+    # type: (str, Optional[str], str) -> Callable[[], object]
+    "Returns a function that parses or statically checks content"
+    if extension is None:
+        lines = tuple(content.split("\n"))
+        return lambda: getStaticMessages(lines, TimeBudget(None))
+
+    filename = p.join(root, "source_%d.%s" % (len(content), extension))
+    with open(filename, "w") as fd:
+        fd.write(content)
+    return lambda: parseSourceCompact(filename)
+
+
+def run(size, repeat):
+    # type: (int, int) -> List[Tuple[str, float, float]]
+    """
+    Runs every case of the corpus, returning a list of (name, time for size,
+    time for 4 * size) tuples
+    """
+    results = []  # type: List[Tuple[str, float, float]]
+    root = tempfile.mkdtemp(prefix="hdl_checker_bench_")
+    try:
+        for name, extension, generator in _CORPUS:
+            small = _check(root, extension, generator(size))
+            large = _check(root, extension, generator(4 * size))
+            results.append((name, _timeIt(small, repeat), _timeIt(large, repeat)))
+    finally:
+        shutil.rmtree(root)
+
+    return results
+
+
+def main():
+    # type: () -> None
+    "Runs the benchmarks from the command line"
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--size", type=int, default=50000, help="Chars per input")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per input")
+    args = parser.parse_args()
+
+    print("%-30s %10s %10s %8s" % ("input", "1x (s)", "4x (s)", "growth"))
+    for name, small, large in run(args.size, args.repeat):
+        print(
+            "%-30s %10.4f %10.4f %7.1fx"
+            % (name, small, large, large / small if small else float("inf"))
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+# This file is part of HDL Checker.
+#
+# Copyright (c) 2015 - 2019 suoto (Andre Souto)
+#
+# HDL Checker is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# HDL Checker is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with HDL Checker.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Times Database and HdlCheckerCore operations on a synthetic project generated
+by hdl_checker.benchmarks.corpus and writes results as JSON, so that runs
+can be compared to catch regressions. Builds use MockBuilder, so only HDL
+Checker's own overhead is measured. Run with
+
+    python -m hdl_checker.benchmarks.project [--output FILE] [--sample N] ...
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import logging
+import platform
+import random
+import shutil
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from hdl_checker import __version__
+from hdl_checker.benchmarks.corpus import (
+    Corpus,
+    addCorpusArguments,
+    generateCorpus,
+    getCorpusArguments,
+)
+from hdl_checker.database import Database
+from hdl_checker.path import Path
+from hdl_checker.static_check import getStaticMessages
+from hdl_checker.tests import DummyServer, MockBuilder, PatchBuilder
+
+_logger = logging.getLogger(__name__)
+
+# Operation name, first run time and best time out of all runs
+Result = Tuple[str, float, float]
+
+
+def _measure(name, func, repeat):
+    # type: (str, Callable[[], object], int) -> Result
+    "Times the first run of func and the best out of all runs"
+    times = []  # type: List[float]
+    for _ in range(max(1, repeat)):
+        start = time.time()
+        func()
+        times.append(time.time() - start)
+    _logger.info("%s: %s", name, times)
+    return name, times[0], min(times)
+
+
+def _configure(corpus):
+    # type: (Corpus) -> Database
+    "Creates a database configured with the corpus sources"
+    database = Database()
+    # Database.configure consumes the config, so give it a copy
+    database.configure(json.loads(json.dumps(corpus.config)), corpus.root)
+    return database
+
+
+def _timeDatabase(corpus, sample, repeat):
+    # type: (Corpus, List[Path], int) -> List[Result]
+    "Times database operations on each of the sampled paths"
+    results = [_measure("configure", lambda: _configure(corpus), repeat)]
+
+    database = _configure(corpus)
+
+    def cold(func):
+        # type: (Callable[[Path], object]) -> Callable[[], None]
+        "Runs func on every sampled path after dropping memoized results"
+
+        def wrapper():
+            # type: () -> None
+            database._clearLruCaches()  # pylint: disable=protected-access
+            for path in sample:
+                func(path)
+
+        return wrapper
+
+    def inferLibrary(path):
+        # type: (Path) -> object
+        "Gets the path's library, inferring it again if it was inferred before"
+        # pylint: disable=protected-access
+        if path in database._inferred_libraries:
+            database._stale_inferences.add(path)
+        return database.getLibrary(path)
+
+    units = [next(iter(database.getDesignUnitsByPath(path))) for path in sample]
+    lines = [tuple(open(path.name).read().split("\n")) for path in sample]
+
+    return results + [
+        _measure("getBuildSequence", cold(database.getBuildSequence), repeat),
+        _measure("getLibrary", cold(inferLibrary), repeat),
+        _measure(
+            "getReferencesToDesignUnit",
+            lambda: [tuple(database.getReferencesToDesignUnit(x)) for x in units],
+            repeat,
+        ),
+        _measure(
+            "getStaticMessages", lambda: [getStaticMessages(x) for x in lines], repeat
+        ),
+    ]
+
+
+def _timeCore(corpus, sample, repeat):
+    # type: (Corpus, List[Path], int) -> List[Result]
+    "Times getting messages for each of the sampled paths via HdlCheckerCore"
+    core = DummyServer(Path(corpus.root))
+    config = json.loads(json.dumps(corpus.config))
+    config["builder"] = MockBuilder.builder_name
+
+    with PatchBuilder():
+        core.configure(config)
+
+    return [
+        _measure(
+            "getMessagesByPath",
+            lambda: [core.getMessagesByPath(x) for x in sample],
+            repeat,
+        )
+    ]
+
+
+def run(corpus_args, sample_size, repeat):
+    # type: (Dict[str, Any], int, int) -> Dict[str, Any]
+    """
+    Generates a corpus with the given arguments and times operations on
+    sample_size of its paths, returning a dict with the results and details
+    of the environment
+    """
+    root = tempfile.mkdtemp(prefix="hdl_checker_bench_")
+    try:
+        start = time.time()
+        corpus = generateCorpus(root, **corpus_args)
+        _logger.info("Generated corpus in %.2fs", time.time() - start)
+
+        sample = random.Random(corpus_args.get("seed", 0)).sample(
+            corpus.paths, min(sample_size, len(corpus.paths))
+        )
+
+        results = _timeDatabase(corpus, sample, repeat) + _timeCore(
+            corpus, sample, repeat
+        )
+    finally:
+        shutil.rmtree(root)
+
+    return {
+        "version": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "corpus": corpus_args,
+        "sample": len(sample),
+        "repeat": repeat,
+        "results": {
+            name: {"first": first, "best": best, "best_per_path": best / len(sample)}
+            for name, first, best in results
+        },
+    }
+
+
+def main():
+    # type: () -> None
+    "Runs the benchmarks from the command line"
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    addCorpusArguments(parser)
+    parser.add_argument(
+        "--sample", type=int, default=50, help="Number of paths to time operations on"
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per operation")
+    parser.add_argument("--output", help="File to write results to as JSON")
+    args = parser.parse_args()
+
+    # MockBuilder doesn't support Verilog or SystemVerilog, don't flood the
+    # output with warnings about it
+    logging.basicConfig(level=logging.ERROR)
+
+    report = run(getCorpusArguments(args), args.sample, args.repeat)
+
+    print("%-28s %10s %10s" % ("operation", "first (s)", "best (s)"))
+    for name, result in report["results"].items():
+        print("%-28s %10.4f %10.4f" % (name, result["first"], result["best"]))
+
+    if args.output:
+        with open(args.output, "w") as fd:
+            fd.write(json.dumps(report, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
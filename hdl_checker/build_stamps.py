@@ -0,0 +1,167 @@
+# This file is part of HDL Checker.
+#
+# Copyright (c) 2015 - 2019 suoto (Andre Souto)
+#
+# HDL Checker is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# HDL Checker is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with HDL Checker.  If not, see <http://www.gnu.org/licenses/>.
+"Persistent stamps of the sources compiled by a builder"
+
+import hashlib
+import json
+import logging
+import sqlite3
+from threading import Lock
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from hdl_checker.diagnostics import CheckerDiagnostic
+from hdl_checker.path import Path
+from hdl_checker.utils import removeIfExists
+
+_logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS stamps (
+    path TEXT PRIMARY KEY,
+    stamp TEXT NOT NULL,
+    diagnostics TEXT NOT NULL
+);
+"""
+
+_CHUNK_SIZE = 1 << 16
+
+
+def makeStamp(*items):
+    # type: (object) -> str
+    "Digest of the JSON representation of the items"
+    return hashlib.sha1(json.dumps(items).encode()).hexdigest()
+
+
+def _connect(filename):
+    # type: (str) -> Tuple[sqlite3.Connection, Iterable[Tuple[str, str, str]]]
+    "Opens the database and reads all stamps from it"
+    # Builds can happen on a different thread than the one that created the
+    # connection, access is serialized by BuildStamps._lock
+    connection = sqlite3.connect(filename, check_same_thread=False)
+    try:
+        connection.executescript(_SCHEMA)
+        rows = connection.execute(
+            "SELECT path, stamp, diagnostics FROM stamps"
+        ).fetchall()
+    except sqlite3.Error:
+        connection.close()
+        raise
+    return connection, rows
+
+
+class BuildStamps(object):
+    """
+    Stamps of the sources compiled by a builder and the diagnostics compiling
+    them generated. Stamps are created by the builder from everything a compile
+    depends on, so sources only need to be compiled again when their stamps
+    change. Stamps are kept in a SQLite database so that they're still valid
+    after restarting the server
+    """
+
+    def __init__(self, filename):
+        # type: (str) -> None
+        self.filename = filename
+        self._lock = Lock()
+        # Content digests are only calculated again if the mtime changed
+        self._digests = {}  # type: Dict[Path, Tuple[float, str]]
+        try:
+            self._connection, rows = _connect(filename)
+        except sqlite3.Error as exc:
+            _logger.warning("Discarding build stamps from %s: %s", filename, exc)
+            removeIfExists(filename)
+            try:
+                self._connection, rows = _connect(filename)
+            except sqlite3.Error:
+                _logger.warning("Build stamps won't be saved to %s", filename)
+                self._connection, rows = _connect(":memory:")
+
+        self._stamps = {
+            path: (stamp, diagnostics) for path, stamp, diagnostics in rows
+        }  # type: Dict[str, Tuple[str, str]]
+
+    def __repr__(self):
+        return "{}(filename={})".format(self.__class__.__name__, repr(self.filename))
+
+    def close(self):
+        # type: () -> None
+        "Closes the underlying connection"
+        with self._lock:
+            self._connection.close()
+
+    def getDigest(self, path):
+        # type: (Path) -> Optional[str]
+        "Digest of the path's contents or None if it can't be read"
+        try:
+            mtime = path.mtime
+        except OSError:
+            return None
+
+        cached = self._digests.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        digest = hashlib.sha1()
+        try:
+            with open(path.name, "rb") as fd:
+                for chunk in iter(lambda: fd.read(_CHUNK_SIZE), b""):
+                    digest.update(chunk)
+        except (IOError, OSError):
+            return None
+
+        result = digest.hexdigest()
+        with self._lock:
+            self._digests[path] = mtime, result
+        return result
+
+    def get(self, path):
+        # type: (Path) -> Optional[str]
+        "Stamp the path was last compiled with, None if it wasn't"
+        entry = self._stamps.get(path.name)
+        return None if entry is None else entry[0]
+
+    def getDiagnostics(self, path):
+        # type: (Path) -> Set[CheckerDiagnostic]
+        "Diagnostics generated by the last compilation of the path"
+        entry = self._stamps.get(path.name)
+        if entry is None:
+            return set()
+        diagnostics = set()
+        for state in json.loads(entry[1]):
+            state["filename"] = Path(state["filename"])
+            diagnostics.add(CheckerDiagnostic.fromDict(state))
+        return diagnostics
+
+    def put(self, path, stamp, diagnostics):
+        # type: (Path, str, Iterable[CheckerDiagnostic]) -> None
+        "Sets the stamp and diagnostics of the path's last compilation"
+        entry = stamp, json.dumps([x.toDict() for x in diagnostics])
+        with self._lock, self._connection:
+            self._stamps[path.name] = entry
+            self._connection.execute(
+                "INSERT OR REPLACE INTO stamps (path, stamp, diagnostics) "
+                "VALUES (?, ?, ?)",
+                (path.name,) + entry,
+            )
+
+    def remove(self, path):
+        # type: (Path) -> None
+        "Removes the path's stamp so that it's compiled next time"
+        if path.name not in self._stamps:
+            return
+        with self._lock, self._connection:
+            self._stamps.pop(path.name, None)
+            self._connection.execute("DELETE FROM stamps WHERE path = ?", (path.name,))
@@ -23,12 +23,17 @@ import os.path as p
 from threading import Lock
 from typing import Any, Dict, FrozenSet, Iterable, Mapping, Optional, Set, Tuple
 
+from hdl_checker import BUILD_STAMPS_NAME
+from hdl_checker.build_stamps import BuildStamps, makeStamp
 from hdl_checker.database import Database  # pylint: disable=unused-import
 from hdl_checker.diagnostics import CheckerDiagnostic, DiagType
 from hdl_checker.exceptions import SanityCheckError
-from hdl_checker.parsers.elements.dependency_spec import IncludedPath
+from hdl_checker.parsers.elements.dependency_spec import (
+    IncludedPath,
+    RequiredDesignUnit,
+)
 from hdl_checker.parsers.elements.identifier import Identifier
-from hdl_checker.path import Path
+from hdl_checker.path import Path, TemporaryPath
 from hdl_checker.types import (
     BuildFlags,
     BuildFlagScope,
@@ -57,6 +62,11 @@ class BaseBuilder(object):  # pylint: disable=useless-object-inheritance
 
     _external_libraries = {FileType.vhdl: set(), FileType.verilog: set()}  # type: dict
 
+    # Sources on the same library are always compiled one at a time, set this
+    # to False if sources on different libraries can't be compiled at the same
+    # time either
+    _concurrent_libraries = True
+
     @classmethod
     def addExternalLibrary(cls, lang, library_name):
         # type: (FileType, Identifier) -> None
@@ -99,13 +109,15 @@ class BaseBuilder(object):  # pylint: disable=useless-object-inheritance
 
     def __init__(self, work_folder, database):
         # type: (Path, Database) -> None
-        # Shell accesses must be atomic
+        # Creating libraries must be atomic, compiling sources is serialized by
+        # the locks of the libraries they're compiled into
         self._lock = Lock()
+        self._library_locks = {}  # type: Dict[Optional[Identifier], Lock]
 
         self._logger = logging.getLogger(__package__ + "." + self.builder_name)
         self._database = database
         self._work_folder = p.abspath(p.expanduser(work_folder.name))
-        self._build_info_cache = {}  # type: Dict[Path, Dict[str, Any]]
+        self._build_stamps = None  # type: Optional[BuildStamps]
         self._builtin_libraries = None  # type: Optional[Set[Identifier]]
         self._added_libraries = set()  # type: Set[Identifier]
 
@@ -141,7 +153,8 @@ class BaseBuilder(object):  # pylint: disable=useless-object-inheritance
         obj._added_libraries = set(state.pop("_added_libraries"))
 
         obj._lock = Lock()
-        obj._build_info_cache = {}
+        obj._library_locks = {}
+        obj._build_stamps = None
         obj.__dict__.update(state)
         # pylint: enable=protected-access
 
@@ -156,8 +169,9 @@ class BaseBuilder(object):  # pylint: disable=useless-object-inheritance
         state["_logger"] = self._logger.name
         state["_builtin_libraries"] = list(self.builtin_libraries)
         state["_added_libraries"] = list(self._added_libraries)
-        del state["_build_info_cache"]
+        del state["_build_stamps"]
         del state["_lock"]
+        del state["_library_locks"]
         del state["_database"]
         return state
 
@@ -310,6 +324,67 @@ class BaseBuilder(object):  # pylint: disable=useless-object-inheritance
             )
         )
 
+    def _getBuildStamps(self):
+        # type: () -> BuildStamps
+        "Opens the build stamps of the work folder if they're not open yet"
+        with self._lock:
+            if self._build_stamps is None:
+                self._build_stamps = BuildStamps(
+                    p.join(self._work_folder, BUILD_STAMPS_NAME)
+                )
+            return self._build_stamps
+
+    def close(self):
+        # type: () -> None
+        "Closes the build stamps, if open, so they can be removed or opened again"
+        with self._lock:
+            if self._build_stamps is not None:
+                self._build_stamps.close()
+            self._build_stamps = None
+
+    def _getBuildStamp(self, path, library, flags):
+        # type: (Path, Identifier, BuildFlags) -> Optional[str]
+        """
+        Gets a stamp of everything compiling path depends on: its contents,
+        library and flags, the stamps of the paths defining the units it uses
+        and the contents of the paths it includes. Returns None if the path
+        can't be read
+        """
+        build_stamps = self._getBuildStamps()
+        digest = build_stamps.getDigest(path)
+        if digest is None:
+            return None
+
+        upstream = set()  # type: Set[Tuple[str, str]]
+        for dependency in self._database.getDependenciesByPath(path):
+            if isinstance(dependency, IncludedPath):
+                included = self._database.resolveIncludedPath(dependency)
+                upstream.add(
+                    (
+                        str(dependency.name),
+                        (included and build_stamps.getDigest(included)) or "",
+                    )
+                )
+            elif (
+                isinstance(dependency, RequiredDesignUnit)
+                and dependency.name.name != "all"
+                and dependency.library not in self.builtin_libraries
+            ):
+                for dependency_path in self._database.getPathsDefining(
+                    name=dependency.name,
+                    library=dependency.library
+                    or self._database.getLibrary(dependency.owner),
+                ):
+                    if dependency_path != path:
+                        upstream.add(
+                            (
+                                str(dependency_path),
+                                build_stamps.get(dependency_path) or "",
+                            )
+                        )
+
+        return makeStamp(digest, str(library), list(flags), sorted(upstream))
+
     def _buildAndGetDiagnostics(
         self, path, library, flags
     ):  # type: (Path, Identifier, BuildFlags) -> Tuple[Set[CheckerDiagnostic],Set[RebuildInfo]]
@@ -377,12 +452,21 @@ class BaseBuilder(object):  # pylint: disable=useless-object-inheritance
         Proxy for only creating libraries once and avoid overwriting builtin
         libraries
         """
-        if library in self._added_libraries:
-            return
-        if library in self.builtin_libraries:
-            return
-        self._added_libraries.add(library)
-        self._createLibrary(library)
+        with self._lock:
+            if library in self._added_libraries:
+                return
+            if library in self.builtin_libraries:
+                return
+            self._added_libraries.add(library)
+            self._createLibrary(library)
+
+    def _getLibraryLock(self, library):
+        # type: (Optional[Identifier]) -> Lock
+        "Gets the lock that must be held while compiling sources into library"
+        if not self._concurrent_libraries:
+            library = None
+        with self._lock:
+            return self._library_locks.setdefault(library, Lock())
 
     @abc.abstractmethod
     def _createLibrary(self, library):
@@ -413,39 +497,35 @@ class BaseBuilder(object):  # pylint: disable=useless-object-inheritance
             )
             return set(), set()
 
-        if path not in self._build_info_cache:
-            self._build_info_cache[path] = {
-                "compile_time": 0.0,
-                "diagnostics": [],
-                "rebuilds": [],
-            }
-
-        cached_info = self._build_info_cache[path]
+        flags = self._getFlags(path, scope)
+        build_stamps = self._getBuildStamps()
+        # Temporary paths are removed right after being built, so they're
+        # never stamped
+        if isinstance(path, TemporaryPath):
+            stamp = None
+        else:
+            stamp = self._getBuildStamp(path, library, flags)
 
-        build = False
         if forced:
-            build = True
             self._logger.info("Forcing build of %s", str(path))
-        elif path.mtime > cached_info["compile_time"]:
-            build = True
+        elif stamp is not None and stamp == build_stamps.get(path):
+            self._logger.debug("Nothing to do for %s", path)
+            return build_stamps.getDiagnostics(path), set()
+        else:
             self._logger.info("Building %s", str(path))
 
-        if build:
-            with self._lock:
-                diagnostics, rebuilds = self._buildAndGetDiagnostics(
-                    path, library, self._getFlags(path, scope)
-                )
-
-            cached_info["diagnostics"] = diagnostics
-            cached_info["rebuilds"] = rebuilds
-            cached_info["compile_time"] = path.mtime
-
-            if DiagType.ERROR in [x.severity for x in diagnostics]:
-                cached_info["compile_time"] = 0
-
+        with self._getLibraryLock(library):
+            diagnostics, rebuilds = self._buildAndGetDiagnostics(path, library, flags)
+
+        # Only stamp sources that compiled cleanly, everything else needs to be
+        # compiled again next time
+        if (
+            stamp is None
+            or rebuilds
+            or DiagType.ERROR in [x.severity for x in diagnostics]
+        ):
+            build_stamps.remove(path)
         else:
-            self._logger.debug("Nothing to do for %s", path)
-            diagnostics = cached_info["diagnostics"]
-            rebuilds = cached_info["rebuilds"]
+            build_stamps.put(path, stamp, diagnostics)
 
         return diagnostics, rebuilds
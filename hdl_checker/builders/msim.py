@@ -39,6 +39,10 @@ class MSim(BaseBuilder):
     builder_name = "msim"
     file_types = {FileType.vhdl, FileType.verilog, FileType.systemverilog}
 
+    # Creating a library rewrites the modelsim.ini file every vcom and vlog
+    # call reads
+    _concurrent_libraries = False
+
     # MSim specific class properties
     _stdout_message_scanner = re.compile(
         r"""^\*\*\s*
@@ -58,6 +58,9 @@ class XVHDL(BaseBuilder):
     # TODO: Add xvlog support
     file_types = {FileType.vhdl}
 
+    # Every xvhdl call runs from the work folder, where it writes its own files
+    _concurrent_libraries = False
+
     def _shouldIgnoreLine(self, line):
         # type: (str) -> bool
         if "ignored due to previous errors" in line:
@@ -17,31 +17,51 @@
 "HDL Checker project builder class"
 
 import abc
+import hashlib
 import json
 import logging
 import os
 import os.path as p
+import sqlite3
 import tempfile
 import traceback
-from multiprocessing.pool import ThreadPool
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pprint import pformat
-from threading import RLock, Timer
+from threading import Lock, RLock, Timer
 from typing import Any, AnyStr, Dict, Iterable, NamedTuple, Optional, Set, Tuple, Union
 
-from hdl_checker import CACHE_NAME, DEFAULT_LIBRARY, WORK_PATH, __version__
+from hdl_checker import (
+    BUILD_JOBS,
+    CACHE_NAME,
+    DEFAULT_LIBRARY,
+    PARSE_CACHE_NAME,
+    PARSE_JOBS,
+    WORK_PATH,
+    __version__,
+)
 from hdl_checker.builder_utils import (
     getBuilderByName,
     getPreferredBuilder,
     getVunitSources,
 )
 from hdl_checker.builders.fallback import Fallback
-from hdl_checker.database import Database
+from hdl_checker.database import (  # pylint: disable=unused-import
+    BuildSequence,
+    Database,
+)
 from hdl_checker.diagnostics import (
     CheckerDiagnostic,
     DiagType,
     PathNotInProjectFile,
     UnresolvedDependency,
 )
+from hdl_checker.parse_cache import ParseCache
+from hdl_checker.parser_utils import (  # pylint: disable=unused-import
+    CompactParseResult,
+    parseSourceCompact,
+)
 from hdl_checker.parsers.config_parser import ConfigParser
 from hdl_checker.parsers.elements.dependency_spec import (
     BaseDependencySpec,
@@ -50,7 +70,8 @@ from hdl_checker.parsers.elements.dependency_spec import (
 )
 from hdl_checker.parsers.elements.identifier import Identifier
 from hdl_checker.path import Path, TemporaryPath
-from hdl_checker.serialization import StateEncoder, jsonObjectHook
+from hdl_checker.serialization import StateEncoder
+from hdl_checker.state_store import StateStore
 from hdl_checker.static_check import getStaticMessages
 from hdl_checker.types import (
     BuildFlagScope,
@@ -60,7 +81,11 @@ from hdl_checker.types import (
     RebuildPath,
     RebuildUnit,
 )
-from hdl_checker.utils import removeDirIfExists, removeIfExists, toBytes
+from hdl_checker.utils import (
+    removeDirIfExists,
+    removeIfExists,
+    toBytes,
+)
 
 try:
     from functools import lru_cache
@@ -93,10 +118,18 @@ class HdlCheckerCore:
 
     _USE_THREADS = True
     _MAX_REBUILD_ATTEMPTS = 20
+    # Number of parse results of unsaved buffers to keep around
+    _MAX_BUFFER_PARSE_RESULTS = 64
+    # Threads used to run static checks, shared by all requests
+    _DEFAULT_WORKERS = 4
+    # Requests only schedule saving the state to the cache file, which happens
+    # on a separate thread at most once every this many seconds
+    _CACHE_SAVE_INTERVAL_S = 5.0
 
     __metaclass__ = abc.ABCMeta
 
-    def __init__(self, root_dir):  # type: (Path) -> None
+    def __init__(self, root_dir, workers=None, build_jobs=None, parse_jobs=None):
+        # type: (Path, Optional[int], Optional[int], Optional[int]) -> None
         # Root dir is the absolute path to use when any path passed on is
         # relative
         self.root_dir = root_dir
@@ -107,7 +140,36 @@ class HdlCheckerCore:
         self._lock = RLock()
         self.config_file = None  # type: Optional[WatchedFile]
 
-        self._database = Database()
+        # Executor shared by all requests, created when first needed
+        self._workers = workers or self._DEFAULT_WORKERS
+        self._executor = None  # type: Optional[ThreadPoolExecutor]
+        # Executor running builds of independent dependencies
+        self._build_jobs = build_jobs or BUILD_JOBS
+        self._build_executor = None  # type: Optional[ThreadPoolExecutor]
+        # Processes used to parse sources when configuring a project
+        self._parse_jobs = parse_jobs or PARSE_JOBS
+
+        # Pending save of the cache file and digest of what was last written
+        self._cache_save_timer = None  # type: Optional[Timer]
+        self._cache_save_lock = Lock()
+        self._cache_digest = None  # type: Optional[str]
+        # Set by clean() so that nothing is written to the work dir until it's
+        # set up again
+        self._cleaned = False
+        # State store opened when first needed and the database whose sources
+        # it holds. Sources of other databases must replace the stored ones
+        self._state_store = None  # type: Optional[StateStore]
+        self._stored_database = None  # type: Optional[Database]
+
+        # Parse results of unsaved buffers, keyed by extension and digest of
+        # the content and ordered from least to most recently used
+        self._buffer_parse_results = (
+            OrderedDict()
+        )  # type: OrderedDict[Tuple[str, str], CompactParseResult]
+
+        self._database = Database(
+            parse_jobs=self._parse_jobs, parse_cache=self._getParseCache()
+        )
         self._builder = Fallback(self.work_dir, self._database)
 
         self._setupIfNeeded()
@@ -228,6 +290,7 @@ class HdlCheckerCore:
 
         _logger.debug("Builder class: %s", builder_cls)
 
+        self._builder.close()
         self._builder = builder_cls(self.work_dir, self._database)
 
         sources_added = self._database.configure(config, str(self.root_dir))
@@ -252,28 +315,106 @@ class HdlCheckerCore:
         # type: () -> Path
         """
         The cache file name will always be inside the path returned by self._getWorkingPath
-        and defaults to cache.json
+        and defaults to cache.db
         """
         return Path(CACHE_NAME, self.work_dir)
 
+    def _getParseCache(self):
+        # type: () -> ParseCache
+        """
+        Parse results are stored inside the work dir as well, under
+        PARSE_CACHE_NAME
+        """
+        return ParseCache(p.join(self.work_dir.name, PARSE_CACHE_NAME))
+
+    def _getStateStore(self):
+        # type: () -> StateStore
+        "Opens the state store inside the work dir if it's not open yet"
+        if self._state_store is None:
+            cache_fname = self._getCacheFilename()
+            if not p.exists(p.dirname(cache_fname.name)):
+                os.makedirs(p.dirname(cache_fname.name))
+            self._state_store = StateStore(cache_fname.name)
+        return self._state_store
+
+    def _closeStateStore(self):
+        # type: () -> None
+        "Closes the state store, if open, so it can be removed or opened again"
+        with self._cache_save_lock:
+            if self._state_store is not None:
+                self._state_store.close()
+            self._state_store = None
+            self._stored_database = None
+            self._cache_digest = None
+
     def _saveCache(self):
         # type: (...) -> Any
         """
-        Dumps project object to a file to recover its state later
+        Saves the project state to the state store to recover it later. Only
+        sources that changed since the last save are written
         """
-        cache_fname = self._getCacheFilename()
+        with self._lock:
+            database = self._database
+            values = {
+                "builder": self._builder,
+                "config_file": self.config_file,
+                "__version__": __version__,
+            }  # type: Optional[Dict[str, Any]]
+
+        with self._cache_save_lock:
+            if self._cleaned:
+                _logger.debug("Work dir has been cleaned, not saving the state")
+                return
+            store = self._getStateStore()
+            replace = database is not self._stored_database
+            changes = database.popChangedSources(everything=replace)
+
+            content = json.dumps(values, cls=StateEncoder)
+            digest = hashlib.sha1(toBytes(content)).hexdigest()
+            if digest == self._cache_digest:
+                if not changes and not replace:
+                    _logger.debug("State is unchanged, not saving it")
+                    return
+                values = None
+
+            _logger.debug("Saving %d changed source(s) to %s", len(changes), store)
+            try:
+                store.update(changes, values, replace=replace)
+            except:
+                # Changes have been taken from the database already, so write
+                # everything on the next attempt
+                self._stored_database = None
+                raise
+            self._stored_database = database
+            self._cache_digest = digest
 
-        state = {
-            "builder": self.builder,
-            "config_file": self.config_file,
-            "database": self.database,
-            "__version__": __version__,
-        }
+    def _scheduleCacheSave(self):
+        # type: () -> None
+        """
+        Saves the cache on a separate thread after _CACHE_SAVE_INTERVAL_S
+        seconds. Calls made while a save is pending are coalesced into it
+        """
+        with self._lock:
+            if self._cleaned or self._cache_save_timer is not None:
+                return
+            self._cache_save_timer = Timer(
+                self._CACHE_SAVE_INTERVAL_S, self._saveScheduledCache
+            )
+            self._cache_save_timer.daemon = True
+            self._cache_save_timer.start()
 
-        _logger.debug("Saving state to '%s'", cache_fname)
-        if not p.exists(p.dirname(cache_fname.name)):
-            os.makedirs(p.dirname(cache_fname.name))
-        json.dump(state, open(cache_fname.name, "w"), indent=True, cls=StateEncoder)
+    def _saveScheduledCache(self):
+        # type: () -> None
+        "Saves the cache if a save is still pending"
+        with self._lock:
+            timer, self._cache_save_timer = self._cache_save_timer, None
+        if timer is None:
+            return
+        timer.cancel()
+        try:
+            self._saveCache()
+        except Exception:  # pylint: disable=broad-except
+            _logger.exception("Unable to save state to the cache file")
 
     def _setState(self, state):
         # type: (...) -> Any
@@ -281,8 +422,12 @@ class HdlCheckerCore:
         Serializer load implementation
         """
         self._database = state.pop("database")
+        self._database.parse_cache = self._getParseCache()
         self._builder = state.pop("builder", Fallback)
-        self._builder._database = self._database  #  pylint: disable=protected-access
+        # pylint: disable=protected-access
+        self._database._parse_jobs = self._parse_jobs
+        self._builder._database = self._database
+        # pylint: enable=protected-access
         config_file = state.pop("config_file", None)
         if config_file is None:
             self.config_file = None
@@ -298,36 +443,78 @@ class HdlCheckerCore:
         """
         cache_fname = self._getCacheFilename()
 
-        try:
-            cache = json.load(open(cache_fname.name, "r"), object_hook=jsonObjectHook)
-        except IOError:
+        if not p.exists(cache_fname.name):
             _logger.debug("Couldn't read cache file %s, skipping recovery", cache_fname)
             return
-        except ValueError as exception:
+
+        # Held so that failures loading the database's sources are only
+        # handled once the state has been set
+        with self._lock:
+            try:
+                store = self._getStateStore()
+
+                # Check the cache info and the current version match
+                cached_version = store.getValue("__version__")
+                if __version__ != cached_version:
+                    _logger.info(
+                        "Cache versions mismatch: %s and %s",
+                        __version__,
+                        cached_version,
+                    )
+                    return
+
+                # Sources are loaded in the background
+                state = {
+                    "builder": store.getValue("builder"),
+                    "config_file": store.getValue("config_file"),
+                    "database": Database.fromStore(
+                        store, partial(self._handleStoreLoadError, store)
+                    ),
+                }
+            except (sqlite3.Error, ValueError, KeyError) as exception:
+                self._handleUiWarning(
+                    "Unable to recover cache from '{}': {}".format(
+                        cache_fname, str(exception)
+                    )
+                )
+
+                _logger.warning(
+                    "Unable to recover cache from '%s': %s",
+                    cache_fname,
+                    traceback.format_exc(),
+                )
+                self._closeStateStore()
+                removeIfExists(cache_fname.name)
+                return
+
+            _logger.debug("Recovered cache from '%s'", cache_fname)
+            self._setState(state)
+            self._stored_database = self._database
+            self._builder.setup()
+
+    def _handleStoreLoadError(self, store, exception):
+        # type: (StateStore, Exception) -> None
+        """
+        Handles the database failing to load sources from the state store
+        like failing to recover it. The database is left empty, so the config
+        file must be parsed again
+        """
+        with self._lock:
+            # Store has been closed or replaced meanwhile
+            if store is not self._state_store:
+                return
+            cache_fname = self._getCacheFilename()
             self._handleUiWarning(
                 "Unable to recover cache from '{}': {}".format(
                     cache_fname, str(exception)
                 )
             )
-
-            _logger.warning(
-                "Unable to recover cache from '%s': %s",
-                cache_fname,
-                traceback.format_exc(),
-            )
-            return
-
-        # Check the cache info and the current version match
-        cached_version = cache.get("__version__", None)
-        if __version__ != cached_version:
-            _logger.info(
-                "Cache versions mismatch: %s and %s", __version__, cached_version
-            )
-            return
-
-        _logger.debug("Recovered cache from '%s'", cache_fname)
-        self._setState(cache)
-        self._builder.setup()
+            self._closeStateStore()
+            removeIfExists(cache_fname.name)
+            if self.config_file is not None:
+                self.config_file = WatchedFile(
+                    self.config_file.path, 0, self.config_file.origin
+                )
 
     def _setupIfNeeded(self):
         # type: (...) -> Any
@@ -341,11 +528,14 @@ class HdlCheckerCore:
         self.clean()
 
         os.makedirs(str(self.work_dir))
+        self._cleaned = False
 
         del self._builder
         del self._database
 
-        database = Database()
+        database = Database(
+            parse_jobs=self._parse_jobs, parse_cache=self._getParseCache()
+        )
         self._database = database
         self._builder = Fallback(self.work_dir, database)
 
@@ -359,12 +549,60 @@ class HdlCheckerCore:
             self.config_file.path, 0, self.config_file.origin
         )
 
+    def _getExecutor(self):
+        # type: (...) -> ThreadPoolExecutor
+        "Returns the executor shared by all requests, creating it if needed"
+        with self._lock:
+            if self._executor is None:
+                _logger.debug("Starting executor with %d workers", self._workers)
+                self._executor = ThreadPoolExecutor(max_workers=self._workers)
+            return self._executor
+
+    def _getBuildExecutor(self):
+        # type: (...) -> ThreadPoolExecutor
+        "Returns the executor used to build dependencies, creating it if needed"
+        with self._lock:
+            if self._build_executor is None:
+                _logger.debug("Starting build executor with %d jobs", self._build_jobs)
+                self._build_executor = ThreadPoolExecutor(max_workers=self._build_jobs)
+            return self._build_executor
+
+    def shutdown(self, wait=True):
+        # type: (bool) -> None
+        """
+        Saves pending changes to the cache (unless the project has been
+        cleaned since), closes the state store and build stamps and stops the
+        executors used to run checks and builds. Tasks already submitted are
+        allowed to finish. The executors, state store and build stamps are
+        created again the next time they're needed, so the object can still
+        be used afterwards
+        """
+        self._saveScheduledCache()
+        self._closeStateStore()
+        self._builder.close()
+        with self._lock:
+            executors = self._executor, self._build_executor
+            self._executor = self._build_executor = None
+        for executor in executors:
+            if executor is not None:
+                _logger.debug("Shutting down executor")
+                executor.shutdown(wait=wait)
+
     def clean(self):
         # type: (...) -> Any
         """
         Clean up generated files
         """
         _logger.debug("Cleaning up project")
+        # Pending and in progress saves would write the state back into the
+        # work dir being removed
+        with self._lock:
+            self._cleaned = True
+            timer, self._cache_save_timer = self._cache_save_timer, None
+        if timer is not None:
+            timer.cancel()
+        self._closeStateStore()
+        self._builder.close()
         removeDirIfExists(str(self.work_dir))
 
     @abc.abstractmethod
@@ -398,12 +636,8 @@ class HdlCheckerCore:
 
         path = Path(path, self.root_dir)
 
-        for dep_library, dep_path in self.database.getBuildSequence(
-            path, self.builder.builtin_libraries
-        ):
-            for record in self._buildAndHandleRebuilds(
-                dep_path, dep_library, scope=BuildFlagScope.dependencies
-            ):
+        for level in self.database.getBuildLevels(path, self.builder.builtin_libraries):
+            for record in self._buildDependencies(level):
                 if record.severity in (DiagType.ERROR, DiagType.STYLE_ERROR):
                     yield record
 
@@ -417,6 +651,61 @@ class HdlCheckerCore:
         ):
             yield record
 
+    def _buildDependencies(self, level):
+        # type: (BuildSequence) -> Iterable[CheckerDiagnostic]
+        """
+        Builds paths of a level of the build sequence, which don't depend on
+        each other, running up to self._build_jobs builds at the same time.
+        Rebuilds are handled on this thread once all builds have finished
+        """
+        if self._build_jobs < 2 or len(level) < 2:
+            for library, path in level:
+                for record in self._buildAndHandleRebuilds(
+                    path, library, scope=BuildFlagScope.dependencies
+                ):
+                    yield record
+            return
+
+        # Builds can't use self.builder or self.database from other threads
+        # because callers might be holding self._lock
+        builder = self.builder
+        database = self.database
+        executor = self._getBuildExecutor()
+
+        def build(path, library, mtimes):
+            # type: (Path, Identifier, Dict[Path, Optional[float]]) -> Tuple[Set[CheckerDiagnostic], Set[RebuildInfo]]
+            # Builds share the caller's epoch, so paths checked for changes
+            # by one of them or by the caller are not checked again
+            with database.freshnessEpoch(mtimes):
+                return builder.build(
+                    path=path, library=library, scope=BuildFlagScope.dependencies
+                )
+
+        # Kept open until every build has finished, even if the caller has no
+        # epoch of its own
+        with database.freshnessEpoch() as mtimes:
+            builds = [
+                (library, path, executor.submit(build, path, library, mtimes))
+                for library, path in level
+            ]
+
+            for library, path, build_result in builds:
+                records, rebuilds = (
+                    build_result.result()
+                )  # type: Iterable[CheckerDiagnostic], Set[RebuildInfo]
+                if rebuilds:
+                    _logger.debug(
+                        "Building '%s' triggers rebuilding: %s",
+                        path,
+                        ", ".join([str(x) for x in rebuilds]),
+                    )
+                    self._handleRebuilds(rebuilds)
+                    records = self._buildAndHandleRebuilds(
+                        path, library, scope=BuildFlagScope.dependencies
+                    )
+                for record in records:
+                    yield record
+
     def _buildAndHandleRebuilds(self, path, library, scope, forced=False):
         # type: (Path, Identifier, BuildFlagScope, bool) -> Iterable[CheckerDiagnostic]
         """
@@ -478,6 +767,13 @@ class HdlCheckerCore:
         Returns the messages for the given path, including messages
         from the configured builder (if available) and static checks
         """
+        # Changes to sources only need to be checked once per request
+        with self.database.freshnessEpoch():
+            return self._getMessagesByPath(path)
+
+    def _getMessagesByPath(self, path):
+        # type: (Path) -> Iterable[CheckerDiagnostic]
+        "Actual implementation of getMessagesByPath"
         self._clearLruCaches()
 
         path = Path(path, self.root_dir)
@@ -485,19 +781,15 @@ class HdlCheckerCore:
         builder_diags = set()  # type: Set[CheckerDiagnostic]
 
         if self._USE_THREADS:
-            pool = ThreadPool()
-
-            static_check = pool.apply_async(
-                getStaticMessages, args=(tuple(open(path.name).read().split("\n")),)
+            # Static checks run on the shared executor while the builder runs
+            # on this thread, since callers might be holding self._lock
+            static_check = self._getExecutor().submit(
+                getStaticMessages, tuple(open(path.name).read().split("\n"))
             )
 
-            builder_check = pool.apply_async(self._getBuilderMessages, args=[path])
-            builder_diags |= set(builder_check.get())
-
-            pool.close()
-            pool.join()
+            builder_diags |= set(self._getBuilderMessages(path))
 
-            static_diags = set(static_check.get())
+            static_diags = set(static_check.result())
 
         else:  # pragma: no cover
             builder_diags |= set(self._getBuilderMessages(path))
@@ -513,7 +805,7 @@ class HdlCheckerCore:
                 diag = diag.copy(filename=path)
             builder_diags.add(diag)
 
-        self._saveCache()
+        self._scheduleCacheSave()
 
         # Add diagnostics the database might have
         diags = builder_diags | set(self.database.getDiagnosticsForPath(path))
@@ -534,11 +826,12 @@ class HdlCheckerCore:
 
         return {diag for diag in diags if not isinstance(diag, PathNotInProjectFile)}
 
-    def getMessagesWithText(self, path, content):
-        # type: (Path, AnyStr) -> Iterable[CheckerDiagnostic]
+    def getMessagesWithText(self, path, content, parse_result=None):
+        # type: (Path, AnyStr, Optional[CompactParseResult]) -> Iterable[CheckerDiagnostic]
         """
         Dumps content to a temprary file and replaces the temporary file name
-        for path on the diagnostics received
+        for path on the diagnostics received. parse_result, when given, must
+        describe content and saves parsing it again
         """
         with self._lock:
             _logger.info("Getting messages for '%s' with content", path)
@@ -551,6 +844,10 @@ class HdlCheckerCore:
             temporary_file.file.write(toBytes(content))  # type: ignore
             temporary_file.close()
 
+            parse_result = self._getBufferParseResult(
+                ext, content, temp_path, parse_result
+            )
+
             # If the reference path was added to the database, add the
             # temporary file with the same attributes
             if path in self.database.paths:
@@ -560,7 +857,12 @@ class HdlCheckerCore:
                     getattr(library, "display_name", None),
                     self.database.getFlags(path, BuildFlagScope.single),
                     self.database.getFlags(path, BuildFlagScope.dependencies),
+                    parse_result=parse_result,
                 )
+            else:
+                # Paths outside the project are only added when read, which
+                # must use the buffer's parse result as well
+                self.database.setParseResult(temp_path, parse_result)
 
             diags = set()  # type: Set[CheckerDiagnostic]
 
@@ -586,6 +888,29 @@ class HdlCheckerCore:
 
         return diags
 
+    def _getBufferParseResult(self, ext, content, temp_path, parse_result=None):
+        # type: (str, AnyStr, Path, Optional[CompactParseResult]) -> CompactParseResult
+        """
+        Parse result of an unsaved buffer whose content was written to
+        temp_path. Results are memoized by content so that buffers seen before
+        (e.g., reverted changes or the same file being reopened) are not
+        parsed again
+        """
+        key = ext.lower(), hashlib.sha1(toBytes(content)).hexdigest()
+        with self._lock:
+            if parse_result is None:
+                parse_result = self._buffer_parse_results.pop(key, None)
+            if parse_result is None:
+                _logger.debug("Parsing buffer for %s", temp_path)
+                parse_result = parseSourceCompact(temp_path.name)
+
+            self._buffer_parse_results.pop(key, None)
+            self._buffer_parse_results[key] = parse_result
+            while len(self._buffer_parse_results) > self._MAX_BUFFER_PARSE_RESULTS:
+                self._buffer_parse_results.popitem(last=False)
+
+        return parse_result
+
     @lru_cache()
     def resolveDependencyToPath(self, dependency):
         # type: (RequiredDesignUnit) -> Optional[Tuple[Path, Identifier]]
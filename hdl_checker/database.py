@@ -20,15 +20,22 @@
 
 import logging
 import os.path as p
+import sqlite3
+from contextlib import contextmanager
+from heapq import heappop, heappush
 from itertools import chain
-from threading import RLock
+from multiprocessing import cpu_count
+from threading import Event, RLock, Thread, current_thread, local
 from typing import (
+    TYPE_CHECKING,
     Any,
+    Callable,
     Dict,
     FrozenSet,
     Iterable,
     Iterator,
     List,
+    NamedTuple,
     Optional,
     Set,
     Tuple,
@@ -42,8 +49,17 @@ from hdl_checker.diagnostics import (  # pylint: disable=unused-import
     PathLibraryIsNotUnique,
     PathNotInProjectFile,
 )
-from hdl_checker.exceptions import UnknownTypeExtension
-from hdl_checker.parser_utils import flattenConfig, getSourceParserFromPath
+from hdl_checker.parse_cache import ParseCache  # pylint: disable=unused-import
+from hdl_checker.parser_utils import (  # pylint: disable=unused-import
+    CompactDependency,
+    CompactDesignUnit,
+    CompactParseResult,
+    expandCompactParseResult,
+    flattenConfig,
+    freezeCompactParseResult,
+    parseSourceCompact,
+    parseSourcesCompact,
+)
 from hdl_checker.parsers.elements.dependency_spec import (
     BaseDependencySpec,
     IncludedPath,
@@ -59,41 +75,435 @@ from hdl_checker.types import (  # pylint: disable=unused-import
     BuildFlagScope,
     FileType,
 )
-from hdl_checker.utils import HashableByKey, getMostCommonItem, isFileReadable
+from hdl_checker.utils import (
+    HashableByKey,
+    getMostCommonItem,
+    getReadableMtime,
+    removeDuplicates,
+)
 
-try:
-    from functools import lru_cache
-except ImportError:
-    from backports.functools_lru_cache import lru_cache  # type: ignore
+if TYPE_CHECKING:  # pragma: no cover
+    # Importing it at runtime would be circular
+    from hdl_checker.state_store import StateStore  # pylint: disable=unused-import
 
 _logger = logging.getLogger(__name__)
 _LIBRARY_WORK = Identifier("work", case_sensitive=False)
 
 UnresolvedLibrary = Union[Identifier, None]
 LibraryUnitTuple = Tuple[UnresolvedLibrary, Identifier]
+BuildSequence = Tuple[Tuple[Identifier, Path], ...]
+
+# Compact parse results as kept by the database, frozen sets make their order
+# irrelevant when comparing
+FrozenParseResult = Tuple[FrozenSet[CompactDesignUnit], FrozenSet[CompactDependency]]
+_NOT_PARSED = (frozenset(), frozenset())  # type: FrozenParseResult
+
+# Design units and dependencies built from a compact parse result, along with
+# the library given to dependencies that don't specify one
+_ParsedInfo = NamedTuple(
+    "_ParsedInfo",
+    (
+        ("result", FrozenParseResult),
+        ("library", Optional[Identifier]),
+        ("design_units", FrozenSet[tAnyDesignUnit]),
+        ("dependencies", FrozenSet[BaseDependencySpec]),
+    ),
+)
+
+# Actions when working out build sequences, skipping must sort first
+_SKIP_PATH = 0
+_BUILD_PATH = 1
+
+# Memoized build sequence and what was looked at to compute it, so that it can
+# be invalidated only when something relevant changes. Names are normalized
+# (see Identifier.name) and includes are the names of included paths
+_BuildSequenceEntry = NamedTuple(
+    "_BuildSequenceEntry",
+    (
+        ("sequence", BuildSequence),
+        ("paths", FrozenSet[Path]),
+        ("names", FrozenSet[str]),
+        ("includes", FrozenSet[str]),
+    ),
+)
+
+
+class _FreshnessEpoch(local):
+    """
+    Per thread state of Database.freshnessEpoch, so that requests running on
+    different threads don't end each other's epochs or reuse each other's
+    modification times
+    """
+
+    def __init__(self):  # type: () -> None
+        super(_FreshnessEpoch, self).__init__()
+        self.depth = 0
+        # Modification times of paths checked during the current epoch (None
+        # if the path could not be read)
+        self.mtimes = {}  # type: Dict[Path, Optional[float]]
+
+
+class _PathSuffixTrie(object):
+    """
+    Trie of reversed path components, so that finding paths that end with a
+    given suffix (e.g. to resolve `include directives) takes time proportional
+    to the suffix depth instead of the number of paths.
+
+    Snapshots share nodes with the database, so nodes are tagged with the
+    generation they were created on and changes copy nodes from previous
+    generations instead of changing them
+    """
+
+    def __init__(self, generation=0):  # type: (int) -> None
+        self._generation = generation
+        self._children = {}  # type: Dict[str, _PathSuffixTrie]
+        self._paths = set()  # type: Set[Path]
+
+    @staticmethod
+    def _split(name):
+        # type: (str) -> List[str]
+        # Same splitting Path.endswith uses
+        return p.normpath(name).split(p.sep)
+
+    def _own(self, generation):
+        # type: (int) -> _PathSuffixTrie
+        "Returns a node that can be changed on the given generation"
+        if self._generation == generation:
+            return self
+        node = _PathSuffixTrie(generation)
+        node._children = dict(self._children)
+        node._paths = set(self._paths)
+        return node
+
+    def add(self, path, generation):
+        # type: (Path, int) -> _PathSuffixTrie
+        "Returns the root of a trie with the path added"
+        root = self._own(generation)
+        node = root
+        for component in reversed(self._split(path.name)):
+            child = node._children.get(component, None)
+            if child is None:
+                child = _PathSuffixTrie(generation)
+            else:
+                child = child._own(generation)
+            node._children[component] = child
+            child._paths.add(path)
+            node = child
+        return root
+
+    def remove(self, path, generation):
+        # type: (Path, int) -> _PathSuffixTrie
+        """
+        Returns the root of a trie with the path removed, pruning nodes that
+        become empty
+        """
+        root = self._own(generation)
+        node = root
+        for component in reversed(self._split(path.name)):
+            child = node._children.get(component, None)
+            if child is None or path not in child._paths:
+                break
+            if len(child._paths) == 1:
+                del node._children[component]
+                break
+            child = child._own(generation)
+            node._children[component] = child
+            child._paths.discard(path)
+            node = child
+        return root
+
+    def getPathsEndingWith(self, suffix):
+        # type: (str) -> Set[Path]
+        "Returns paths whose last components match those of suffix"
+        node = self
+        for component in reversed(self._split(suffix)):
+            child = node._children.get(component, None)
+            if child is None:
+                return set()
+            node = child
+        return set(node._paths)
+
+
+class DatabaseSnapshot(object):
+    """
+    Immutable view of the database contents at a given version. Readers can
+    hold on to a snapshot for as long as they need without locking, changes
+    made to the database after it was published are not seen
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        version,  # type: int
+        paths,  # type: FrozenSet[Path]
+        paths_by_suffix,  # type: _PathSuffixTrie
+        library_map,  # type: Dict[Path, Identifier]
+        flags_map,  # type: Dict[Path, Dict[BuildFlagScope, BuildFlags]]
+        parse_results,  # type: Dict[Path, FrozenParseResult]
+        dependencies_library,  # type: Dict[Path, Identifier]
+        units_by_name,  # type: Dict[str, FrozenSet[Path]]
+        dependencies_by_name,  # type: Dict[str, FrozenSet[Path]]
+        parsed_info,  # type: Dict[Path, _ParsedInfo]
+    ):
+        # type: (...) -> None
+        self._version = version
+        self._paths = paths
+        self._paths_by_suffix = paths_by_suffix
+        self._library_map = library_map
+        self._flags_map = flags_map
+        self._parse_results = parse_results
+        self._dependencies_library = dependencies_library
+        self._units_by_name = units_by_name
+        self._dependencies_by_name = dependencies_by_name
+        # Shared by every snapshot, entries are only used if built from the
+        # same parse result and library this snapshot has
+        self._parsed_info = parsed_info
+
+    def __repr__(self):
+        return "{}(version={}, paths={})".format(
+            self.__class__.__name__, self._version, len(self._paths)
+        )
+
+    @property
+    def version(self):  # type: () -> int
+        "Incremented every time a snapshot with new contents is published"
+        return self._version
+
+    @property
+    def paths(self):  # type: () -> FrozenSet[Path]
+        "Paths added to the database"
+        return self._paths
+
+    @property
+    def design_units(self):  # type: () -> FrozenSet[tAnyDesignUnit]
+        "Design units defined by any path"
+        return frozenset(
+            chain.from_iterable(
+                self._getParsedInfo(path).design_units for path in self._parse_results
+            )
+        )
+
+    def getLibrary(self, path):
+        # type: (Path) -> Optional[Identifier]
+        "Library the path was assigned or inferred to be in, if known"
+        return self._library_map.get(path, None)
+
+    def getFlags(self, path, scope=None):
+        # type: (Path, Optional[BuildFlagScope]) -> BuildFlags
+        """
+        Flags of the given scope (defaults to single) followed by the source
+        specific ones, empty if the path is not found
+        """
+        flags = self._flags_map.get(path, {})
+        return flags.get(scope or BuildFlagScope.single, ()) + flags.get(
+            BuildFlagScope.source_specific, ()
+        )
+
+    def getPathsEndingWith(self, suffix):
+        # type: (str) -> Set[Path]
+        "Paths whose last components match those of suffix"
+        return self._paths_by_suffix.getPathsEndingWith(suffix)
+
+    def _getParsedInfo(self, path):
+        # type: (Path) -> _ParsedInfo
+        """
+        Design units and dependencies of the given path. They're only built
+        from the compact parse result when first needed
+        """
+        result = self._parse_results.get(path, _NOT_PARSED)
+        library = self._dependencies_library.get(path, None)
+        info = self._parsed_info.get(path, None)
+        if info is None or info.result is not result or info.library != library:
+            design_units, dependencies = expandCompactParseResult(path, result, library)
+            info = _ParsedInfo(
+                result, library, frozenset(design_units), frozenset(dependencies)
+            )
+            if result is not _NOT_PARSED:
+                self._parsed_info[path] = info
+        return info
+
+    def getDesignUnitsByPath(self, path):
+        # type: (Path) -> FrozenSet[tAnyDesignUnit]
+        "Design units defined by the given path"
+        return self._getParsedInfo(path).design_units
+
+    def getDependenciesByPath(self, path):
+        # type: (Path) -> FrozenSet[BaseDependencySpec]
+        "Dependencies found on the given path"
+        return self._getParsedInfo(path).dependencies
+
+    def getDesignUnitsByName(self, name):
+        # type: (Identifier) -> FrozenSet[tAnyDesignUnit]
+        "Design units whose name matches the given identifier"
+        return frozenset(
+            unit
+            for path in self._units_by_name.get(name.name, ())
+            for unit in self._getParsedInfo(path).design_units
+            if unit.name == name
+        )
+
+    def getDependenciesByName(self, name):
+        # type: (Identifier) -> FrozenSet[BaseDependencySpec]
+        "Dependencies referring to the given identifier"
+        return frozenset(
+            dependency
+            for path in self._dependencies_by_name.get(name.name, ())
+            for dependency in self._getParsedInfo(path).dependencies
+            if dependency.name == name
+        )
+
+
+def _updateCopy(previous, source, keys, convert):
+    # type: (Dict[Any, Any], Dict[Any, Any], Iterable[Any], Callable[[Any], Any]) -> Dict[Any, Any]
+    """
+    Returns previous with the values of source for each key passed through
+    convert, removing keys whose converted values are None. Previous is
+    returned as is if no value changes, otherwise it's copied so that
+    snapshots holding it are not affected
+    """
+    result = previous
+    for key in keys:
+        value = convert(source.get(key, None))
+        if previous.get(key, None) == value:
+            continue
+        if result is previous:
+            result = dict(previous)
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = value
+    return result
+
+
+def _freeze(value):
+    # type: (Optional[Iterable[Any]]) -> Optional[FrozenSet[Any]]
+    "Converts non empty iterables to frozensets and empty ones to None"
+    return frozenset(value) if value else None
+
+
+def _keep(value):
+    # type: (Any) -> Any
+    "Returns the value unchanged"
+    return value
+
+
+def _getNames(elements):
+    # type: (Iterable[Union[CompactDesignUnit, CompactDependency]]) -> Set[str]
+    """
+    Normalized names (see Identifier.name) of compact design units or
+    dependencies
+    """
+    return {element[1][0].lower() for element in elements}
+
+
+def _updateIndex(index, path, old_names, new_names):
+    # type: (Dict[str, Set[Path]], Path, Set[str], Set[str]) -> Set[str]
+    """
+    Updates an index of paths by name for a path whose names changed from
+    old_names to new_names. Returns the names whose entry changed
+    """
+    for name in old_names - new_names:
+        paths = index[name]
+        paths.discard(path)
+        if not paths:
+            del index[name]
+    for name in new_names - old_names:
+        index.setdefault(name, set()).add(path)
+    return old_names ^ new_names
 
 
 class Database(HashableByKey):  # pylint: disable=too-many-instance-attributes
     "Stores info on and provides operations for a project file set"
 
-    def __init__(self):  # type: () -> None
+    def __init__(self, parse_jobs=None, parse_cache=None):
+        # type: (Optional[int], Optional[ParseCache]) -> None
+        # Held while changing the info below (see _changing). Readers go
+        # through the published snapshot instead and never wait for it, only
+        # for sources being loaded (see fromStore)
         self._lock = RLock()
+        self._change_depth = 0
+
+        # Maximum number of processes used to parse sources when configuring,
+        # defaults to the number of CPUs
+        self._parse_jobs = parse_jobs or cpu_count()
+
+        # Parse results are looked up here before actually parsing sources
+        self.parse_cache = parse_cache
 
         self._paths = set()  # type: Set[Path]
+        self._paths_by_suffix = _PathSuffixTrie()
         self._parse_timestamp = {}  # type: Dict[Path, float]
+        # Compact parse results of each path. Design units and dependencies
+        # objects are only built from them when readers need them (see
+        # DatabaseSnapshot.getDesignUnitsByPath)
+        self._parse_results = {}  # type: Dict[Path, FrozenParseResult]
+        # Library given to dependencies that don't specify one when their
+        # path's library is set by _updatePathLibrary. Cleared when the path
+        # is parsed again
+        self._dependencies_library = {}  # type: Dict[Path, Identifier]
+        self._parsed_info = {}  # type: Dict[Path, _ParsedInfo]
         self._library_map = {}  # type: Dict[Path, Identifier]
         self._flags_map = {}  # type: Dict[Path, Dict[BuildFlagScope, BuildFlags]]
-        self._dependencies_map = {}  # type: Dict[Path, Set[BaseDependencySpec]]
+        # Reverse dependency index: maps a normalized name to the paths with
+        # dependencies referring to it
+        self._dependencies_by_name = {}  # type: Dict[str, Set[Path]]
         self._inferred_libraries = set()  # type: Set[Path]
-        self._design_units = set()  # type: Set[tAnyDesignUnit]
+        # Paths whose library must be inferred when the current change ends,
+        # either because none was set or because the references to units the
+        # path defines have changed
+        self._stale_inferences = set()  # type: Set[Path]
+        # Index of paths by the normalized names of the design units they
+        # define, so that looking up paths defining a given name doesn't need
+        # to scan every path
+        self._units_by_name = {}  # type: Dict[str, Set[Path]]
+        # Diagnostics are added by readers as well, so they have a lock of
+        # their own
+        self._diags_lock = RLock()
         self._diags = {}  # type: Dict[Path, Set[CheckerDiagnostic]]
 
-        # Use this to know which methods should be cache
-        self._cached_methods = {
-            getattr(self, x)
-            for x in dir(self)
-            if hasattr(getattr(self, x), "cache_clear")
-        }
+        # See freshnessEpoch
+        self._epoch = _FreshnessEpoch()
+
+        # Memoized query results. Entries are dropped individually when the
+        # info they were computed from changes (see _invalidateCaches)
+        self._libraries_referred_cache = {}  # type: Dict[Identifier, List[Identifier]]
+        self._paths_defining_cache = (
+            {}
+        )  # type: Dict[Tuple[Identifier, UnresolvedLibrary], Iterable[Path]]
+        self._build_sequence_cache = (
+            {}
+        )  # type: Dict[Tuple[Path, Any], _BuildSequenceEntry]
+        # Paths not in the project that were already added on a different
+        # library (see _prepareForReading)
+        self._not_in_project_cache = set()  # type: Set[Path]
+        # Readers memoize results computed from the snapshot, so entries
+        # affected by a change can only be dropped once the snapshot with it
+        # is published. Until then, they're recorded here (see
+        # _invalidateCaches)
+        self._pending_invalidations = (
+            []
+        )  # type: List[Tuple[Path, FrozenSet[str], bool]]
+        self._pending_clear = False
+
+        # Readers get immutable snapshots of the info above, published when
+        # the outermost change ends. Mutators record which keys changed and
+        # only the entries for those are rebuilt, but the dicts holding them
+        # are copied as a whole (see _updateCopy)
+        self._published = DatabaseSnapshot(
+            0, frozenset(), _PathSuffixTrie(), {}, {}, {}, {}, {}, {}, self._parsed_info
+        )
+        self._snapshot_stale = False
+        self._changed_paths = set()  # type: Set[Path]
+        self._changed_unit_names = set()  # type: Set[str]
+        self._changed_dependency_names = set()  # type: Set[str]
+
+        # Paths whose info changed since it was last persisted, see
+        # popChangedSources
+        self._dirty_paths = set()  # type: Set[Path]
+
+        # Set while sources are loaded from a state store, see fromStore
+        self._loading = None  # type: Optional[Event]
+        self._loader = None  # type: Optional[Thread]
+        self._store = None  # type: Optional[StateStore]
 
     @property
     def __hash_key__(self):
@@ -103,7 +513,182 @@ class Database(HashableByKey):  # pylint: disable=too-many-instance-attributes
     @property
     def design_units(self):  # type: (...) -> FrozenSet[tAnyDesignUnit]
         "Set of design units found"
-        return frozenset(self._design_units)
+        return self._snapshot.design_units
+
+    @property
+    def snapshot(self):  # type: () -> DatabaseSnapshot
+        """
+        Immutable view of the database, including every change that has
+        finished
+        """
+        return self._snapshot
+
+    @property
+    def _snapshot(self):  # type: () -> DatabaseSnapshot
+        "Latest snapshot published, once sources being loaded are in"
+        self._waitUntilLoaded()
+        return self._published
+
+    def _waitUntilLoaded(self):
+        # type: () -> None
+        """
+        Waits for sources being loaded from a state store (see fromStore).
+        The thread loading them doesn't wait
+        """
+        loading = self._loading
+        if loading is not None and current_thread() is not self._loader:
+            loading.wait()
+
+    @contextmanager
+    def _changing(self):
+        # type: () -> Iterator[None]
+        """
+        Context for changing the database. Changes can be nested and are only
+        published once the outermost one ends, after inferring libraries that
+        need it, so readers never see the database half updated
+        """
+        self._waitUntilLoaded()
+        with self._lock:
+            self._change_depth += 1
+            try:
+                yield
+                if self._change_depth == 1 and self._stale_inferences:
+                    self._inferLibraries(self._stale_inferences & self._paths)
+            finally:
+                self._change_depth -= 1
+                if not self._change_depth:
+                    self._publishSnapshot()
+
+    @contextmanager
+    def _changingIfIdle(self):
+        # type: () -> Iterator[bool]
+        """
+        Like _changing but doesn't wait for changes in progress on other
+        threads. Yields False in that case and nothing should be changed
+        """
+        if self._loading is not None or not self._lock.acquire(False):
+            yield False
+            return
+        try:
+            with self._changing():
+                yield True
+        finally:
+            self._lock.release()
+
+    def _markChanged(self, paths=(), unit_names=(), dependency_names=()):
+        # type: (Iterable[Path], Iterable[str], Iterable[str]) -> None
+        "Records keys whose info must be refreshed on the next snapshot"
+        paths = tuple(paths)
+        self._changed_paths.update(paths)
+        self._dirty_paths.update(paths)
+        self._changed_unit_names.update(unit_names)
+        self._changed_dependency_names.update(dependency_names)
+        self._snapshot_stale = True
+
+    def _publishSnapshot(self):  # type: () -> None
+        """
+        Builds a new snapshot from the previous one and the changed keys, then
+        drops memoized results that the changes have invalidated
+        """
+        if self._snapshot_stale:
+            previous = self._snapshot
+            changed_paths = self._changed_paths
+
+            paths = previous.paths
+            if any((path in self._paths) != (path in paths) for path in changed_paths):
+                paths = frozenset(self._paths)
+
+            self._published = DatabaseSnapshot(
+                previous.version + 1,
+                paths,
+                self._paths_by_suffix,
+                _updateCopy(
+                    previous._library_map, self._library_map, changed_paths, _keep
+                ),
+                _updateCopy(previous._flags_map, self._flags_map, changed_paths, _keep),
+                _updateCopy(
+                    previous._parse_results, self._parse_results, changed_paths, _keep
+                ),
+                _updateCopy(
+                    previous._dependencies_library,
+                    self._dependencies_library,
+                    changed_paths,
+                    _keep,
+                ),
+                _updateCopy(
+                    previous._units_by_name,
+                    self._units_by_name,
+                    self._changed_unit_names,
+                    _freeze,
+                ),
+                _updateCopy(
+                    previous._dependencies_by_name,
+                    self._dependencies_by_name,
+                    self._changed_dependency_names,
+                    _freeze,
+                ),
+                self._parsed_info,
+            )
+            self._changed_paths = set()
+            self._changed_unit_names = set()
+            self._changed_dependency_names = set()
+            self._snapshot_stale = False
+            _logger.debug("Published %s", self._published)
+
+        if self._pending_clear:
+            self._pending_clear = False
+            self._pending_invalidations = []
+            self._paths_defining_cache.clear()
+            self._build_sequence_cache.clear()
+            self._not_in_project_cache.clear()
+
+        while self._pending_invalidations:
+            self._invalidateMemoized(*self._pending_invalidations.pop())
+
+    @contextmanager
+    def freshnessEpoch(self, mtimes=None):
+        # type: (Optional[Dict[Path, Optional[float]]]) -> Iterator[Dict[Path, Optional[float]]]
+        """
+        Within this context, each path is checked for changes at most once, so
+        that the many lookups done by a single request don't each hit the file
+        system. Epochs can be nested, changes are checked again once the
+        outermost one ends. Each thread has its own epoch, but the value
+        yielded can be passed as mtimes on other threads (e.g., to tasks
+        submitted to an executor) to make them share it instead. Only the
+        thread that started the epoch ends it.
+        """
+        epoch = self._epoch
+        joined = False
+        if mtimes is not None and not epoch.depth:
+            epoch.mtimes = mtimes
+            joined = True
+        epoch.depth += 1
+        try:
+            yield epoch.mtimes
+        finally:
+            epoch.depth -= 1
+            if not epoch.depth:
+                if joined:
+                    epoch.mtimes = {}
+                else:
+                    epoch.mtimes.clear()
+
+    def _getReadableMtime(self, path):
+        # type: (Path) -> Optional[float]
+        """
+        Returns the path's modification time or None if the path is not
+        readable. Results are reused until the current thread's epoch ends.
+        """
+        epoch = self._epoch
+        try:
+            return epoch.mtimes[path]
+        except KeyError:
+            pass
+
+        mtime = getReadableMtime(path.name)
+        if epoch.depth:
+            epoch.mtimes[path] = mtime
+        return mtime
 
     def refresh(self):
         # type: (...) -> Any
@@ -111,16 +696,20 @@ class Database(HashableByKey):  # pylint: disable=too-many-instance-attributes
         Clears caches, inferred libraries and parses and checks if any source
         should be parsed
         """
-        self._clearLruCaches()
+        with self._changing():
+            self._clearLruCaches()
 
-        while self._inferred_libraries:
-            try:
-                del self._library_map[self._inferred_libraries.pop()]
-            except KeyError:  # pragma: no cover
-                pass
+            while self._inferred_libraries:
+                path = self._inferred_libraries.pop()
+                self._markChanged((path,))
+                self._stale_inferences.add(path)
+                try:
+                    del self._library_map[path]
+                except KeyError:  # pragma: no cover
+                    pass
 
-        for path in self.paths:
-            self._parseSourceIfNeeded(path)
+            for path in tuple(self._paths):
+                self._parseSourceIfNeeded(path)
 
     def configure(self, root_config, root_path):
         # type: (Dict[str, Any], str) -> int
@@ -131,15 +720,22 @@ class Database(HashableByKey):  # pylint: disable=too-many-instance-attributes
         Returns the number of sources added.
         """
         cnt = 0
-        for entry in flattenConfig(root_config, root_path):
-            self.addSource(
-                path=entry.path,
-                library=entry.library,
-                source_specific_flags=entry.source_specific_flags,
-                single_flags=entry.single_flags,
-                dependencies_flags=entry.dependencies_flags,
-            )
-            cnt += 1
+        paths = []  # type: List[Path]
+        # Libraries are inferred once every source has been parsed
+        with self._changing():
+            for entry in flattenConfig(root_config, root_path):
+                self._addSourceInfo(
+                    path=entry.path,
+                    library=entry.library,
+                    source_specific_flags=entry.source_specific_flags,
+                    single_flags=entry.single_flags,
+                    dependencies_flags=entry.dependencies_flags,
+                )
+                paths.append(entry.path)
+                cnt += 1
+
+            # Sources might be listed more than once, parse them only once
+            self._parseSources(removeDuplicates(paths))
 
         return cnt
 
@@ -150,11 +746,49 @@ class Database(HashableByKey):  # pylint: disable=too-many-instance-attributes
         source_specific_flags=None,  # type: Optional[BuildFlags]
         single_flags=None,  # type: Optional[BuildFlags]
         dependencies_flags=None,  # type: Optional[BuildFlags]
+        parse_result=None,  # type: Optional[CompactParseResult]
     ):
         # type: (...) -> None
         """
         Adds a source to the database, triggering its parsing even if the
-        source has already been added previously
+        source has already been added previously. If parse_result is given,
+        it's used instead of parsing the source
+        """
+        with self._changing():
+            self._addSourceInfo(
+                path=path,
+                library=library,
+                source_specific_flags=source_specific_flags,
+                single_flags=single_flags,
+                dependencies_flags=dependencies_flags,
+            )
+            if parse_result is None:
+                self._parseSource(path)
+            else:
+                self._updateParseResult(path, parse_result)
+
+    def setParseResult(self, path, parse_result):
+        # type: (Path, CompactParseResult) -> None
+        """
+        Uses parse_result as the path's info instead of parsing it. Unlike
+        addSource, the path is not added to the project, so reading it still
+        treats it as not being in the project
+        """
+        with self._changing():
+            self._updateParseResult(path, parse_result)
+
+    def _addSourceInfo(
+        self,
+        path,  # type: Path
+        library,  # type: Optional[str]
+        source_specific_flags=None,  # type: Optional[BuildFlags]
+        single_flags=None,  # type: Optional[BuildFlags]
+        dependencies_flags=None,  # type: Optional[BuildFlags]
+    ):
+        # type: (...) -> None
+        """
+        Adds a source to the database without parsing it, callers are
+        responsible for doing that
         """
         _logger.info(
             "Adding %s, library=%s, flags=(source_specific=%s, single=%s, dependencies=%s)",
@@ -164,74 +798,91 @@ class Database(HashableByKey):  # pylint: disable=too-many-instance-attributes
             single_flags,
             dependencies_flags,
         )
-        self._paths.add(path)
-        self._flags_map[path] = {
-            BuildFlagScope.source_specific: tuple(source_specific_flags or ()),
-            BuildFlagScope.single: tuple(single_flags or ()),
-            BuildFlagScope.dependencies: tuple(dependencies_flags or ()),
-        }
-        if library is not None:
-            self._library_map[path] = Identifier(
-                library, case_sensitive=FileType.fromPath(path) != FileType.vhdl
+        with self._changing():
+            self._epoch.mtimes.pop(path, None)
+            self._markChanged((path,))
+            path_changed = path not in self._paths
+            self._paths.add(path)
+            self._paths_by_suffix = self._paths_by_suffix.add(
+                path, self._snapshot.version
             )
+            self._flags_map[path] = {
+                BuildFlagScope.source_specific: tuple(source_specific_flags or ()),
+                BuildFlagScope.single: tuple(single_flags or ()),
+                BuildFlagScope.dependencies: tuple(dependencies_flags or ()),
+            }
 
-        # TODO: Parse on a process pool
-        self._parseSource(path)
+            library_changed = False
+            if library is not None:
+                _library = Identifier(
+                    library, case_sensitive=FileType.fromPath(path) != FileType.vhdl
+                )
+                library_changed = self._library_map.get(path, None) != _library
+                self._library_map[path] = _library
+            elif path not in self._library_map:
+                self._stale_inferences.add(path)
+
+            if path_changed or library_changed:
+                units, dependencies = self._parse_results.get(path, _NOT_PARSED)
+                self._invalidateCaches(
+                    path, _getNames(units), _getNames(dependencies), path_changed
+                )
 
     def removeSource(self, path):
         # type: (Path) -> None
         """
         Removes a path from the database. No error is raised if the path wasn't
-        added previously. In this case, avoid clearning LRU caches
+        added previously. In this case, avoid invalidating caches
         """
         _logger.debug("Removing %s from database", path)
-        clear_lru_caches = False
+        clear_caches = False
 
-        with self._lock:
-            units = frozenset(self._getDesignUnitsByPath(path))
-            self._design_units -= units
+        with self._changing():
+            self._markChanged((path,))
+            self._stale_inferences.discard(path)
+            units, dependencies = self._parse_results.get(path, _NOT_PARSED)
+            self._setParseResult(path, None)
+            self._parsed_info.pop(path, None)
 
-            if units:
-                clear_lru_caches = True
+            if units or dependencies:
+                clear_caches = True
 
+            path_changed = False
             try:
                 self._paths.remove(path)
-                clear_lru_caches = True
+                self._paths_by_suffix = self._paths_by_suffix.remove(
+                    path, self._snapshot.version
+                )
+                path_changed = True
             except KeyError:
                 pass
 
             try:
                 del self._parse_timestamp[path]
-                clear_lru_caches = True
+                clear_caches = True
             except KeyError:
                 pass
 
             try:
                 del self._library_map[path]
-                clear_lru_caches = True
+                clear_caches = True
             except KeyError:
                 pass
 
             try:
                 del self._flags_map[path]
-                clear_lru_caches = True
+                clear_caches = True
             except KeyError:
                 pass
 
-            try:
-                del self._dependencies_map[path]
-                clear_lru_caches = True
-            except KeyError:
-                pass
+            with self._diags_lock:
+                if self._diags.pop(path, None) is not None:
+                    clear_caches = True
 
-            try:
-                del self._diags[path]
-                clear_lru_caches = True
-            except KeyError:
-                pass
-
-            if clear_lru_caches:
-                self._clearLruCaches()
+            if clear_caches or path_changed:
+                self._invalidateCaches(
+                    path, _getNames(units), _getNames(dependencies), path_changed
+                )
 
     def _addDiagnostic(self, diagnostic):
         # type: (CheckerDiagnostic) -> None
@@ -242,9 +893,10 @@ class Database(HashableByKey):  # pylint: disable=too-many-instance-attributes
         _logger.debug("Adding diagnostic %s", diagnostic)
         assert diagnostic.filename is not None
 
-        if diagnostic.filename not in self._diags:
-            self._diags[diagnostic.filename] = set()
-        self._diags[diagnostic.filename].add(diagnostic)
+        with self._diags_lock:
+            if diagnostic.filename not in self._diags:
+                self._diags[diagnostic.filename] = set()
+            self._diags[diagnostic.filename].add(diagnostic)
 
     def getDiagnosticsForPath(self, path):
         # type: (Path) -> Iterable[CheckerDiagnostic]
@@ -252,95 +904,209 @@ class Database(HashableByKey):  # pylint: disable=too-many-instance-attributes
         Returns diagnostics generated a path. It does not trigger any
         processing or analysis though
         """
-        return self._diags.get(path, ())
+        self._waitUntilLoaded()
+        with self._diags_lock:
+            return tuple(self._diags.get(path, ()))
+
+    def _getSourceState(self, path):
+        # type: (Path) -> Dict[str, Any]
+        "Gets a dict that describes the state of a single path"
+        units, dependencies = self._parse_results.get(path, _NOT_PARSED)
+        state = {
+            "path": path,
+            "mtime": self._parse_timestamp[path],
+            "flags": {
+                scope.value: self._flags_map[path].get(scope, ())
+                for scope in (
+                    BuildFlagScope.source_specific,
+                    BuildFlagScope.single,
+                    BuildFlagScope.dependencies,
+                )
+            },
+            "parse_result": (tuple(units), tuple(dependencies)),
+            "diags": tuple(),
+        }  # type: Dict[str, Any]
+
+        library = self._library_map.get(path, None)
+        if library is not None:
+            state["library"] = library
+
+        dependencies_library = self._dependencies_library.get(path, None)
+        if dependencies_library is not None:
+            state["dependencies_library"] = dependencies_library
+
+        return state
+
+    def _addSourceState(self, state):
+        # type: (Dict[str, Any]) -> None
+        "Adds a path described by a dict returned by _getSourceState"
+        path = state.pop("path")
+        self._markChanged((path,))
+        self._paths.add(path)
+        self._paths_by_suffix = self._paths_by_suffix.add(path, self._snapshot.version)
+        self._parse_timestamp[path] = float(state.pop("mtime"))
+
+        if "library" in state:
+            self._library_map[path] = state.pop("library")
+        else:
+            self._stale_inferences.add(path)
+
+        flags = state.pop("flags", {})
+        self._flags_map[path] = {
+            scope: tuple(flags.get(scope.value, ()))
+            for scope in (
+                BuildFlagScope.source_specific,
+                BuildFlagScope.single,
+                BuildFlagScope.dependencies,
+            )
+        }
+        units, dependencies = freezeCompactParseResult(state.pop("parse_result"))
+        self._setParseResult(path, (frozenset(units), frozenset(dependencies)))
+        if "dependencies_library" in state:
+            self._dependencies_library[path] = state.pop("dependencies_library")
+        with self._diags_lock:
+            self._diags[path] = set(state.pop("diags", ()))
 
     def __jsonEncode__(self):
         """
         Gets a dict that describes the current state of this object
         """
-        state = {"sources": []}
-
-        for path in self._paths:
-            source_info = {
-                "path": path,
-                "mtime": self._parse_timestamp[path],
-                "flags": {
-                    BuildFlagScope.source_specific.value: self._flags_map[path].get(
-                        BuildFlagScope.source_specific, ()
-                    ),
-                    BuildFlagScope.single.value: self._flags_map[path].get(
-                        BuildFlagScope.single, ()
-                    ),
-                    BuildFlagScope.dependencies.value: self._flags_map[path].get(
-                        BuildFlagScope.dependencies, ()
-                    ),
-                },
-                "dependencies": tuple(self._dependencies_map.get(path, ())),
-                "diags": tuple(),
+        # Might be called from other threads while the database is in use
+        self._waitUntilLoaded()
+        with self._lock:
+            state = {
+                "sources": [self._getSourceState(path) for path in self._paths],
+                "inferred_libraries": tuple(self._inferred_libraries),
+                "stale_inferences": tuple(self._stale_inferences),
             }
 
-            library = self._library_map.get(path, None)
-            if library is not None:
-                source_info["library"] = library
-
-            state["sources"].append(source_info)
-
-        state["inferred_libraries"] = tuple(self._inferred_libraries)
-        state["design_units"] = tuple(self._design_units)
-
         return state
 
     @classmethod
     def __jsonDecode__(cls, state):
-        # pylint: disable=protected-access
+
         obj = cls()
-        obj._design_units = set(state.pop("design_units"))
-        obj._inferred_libraries = set(state.pop("inferred_libraries"))
-        for info in state.pop("sources"):
-            path = info.pop("path")
-            obj._paths.add(path)
-            obj._parse_timestamp[path] = float(info.pop("mtime"))
-
-            if "library" in info:
-                obj._library_map[path] = info.pop("library")
-
-            obj._flags_map[path] = {}
-            obj._flags_map[path][BuildFlagScope.source_specific] = tuple(
-                info.get("flags", {}).pop(BuildFlagScope.source_specific.value, ())
-            )
-            obj._flags_map[path][BuildFlagScope.single] = tuple(
-                info.get("flags", {}).pop(BuildFlagScope.single.value, ())
-            )
-            obj._flags_map[path][BuildFlagScope.dependencies] = tuple(
-                info.pop("flags", {}).pop(BuildFlagScope.dependencies.value, ())
-            )
-            obj._dependencies_map[path] = set(info.pop("dependencies"))
-            obj._diags[path] = set(info.pop("diags"))
+        # pylint: disable=protected-access
+        with obj._changing():
+            obj._inferred_libraries = set(state.pop("inferred_libraries"))
+            obj._stale_inferences = set(state.pop("stale_inferences", ()))
+            for info in state.pop("sources"):
+                obj._addSourceState(info)
         # pylint: enable=protected-access
 
         return obj
 
+    def popChangedSources(self, everything=False):
+        # type: (bool) -> List[Tuple[Path, Optional[Dict[str, Any]]]]
+        """
+        Returns the state of each path that changed since the last call (or of
+        every path if everything is True), or None for paths that have been
+        removed, so that only those need to be persisted. The state also
+        includes whether the path's library was inferred.
+        Libraries whose inference is stale are not included, so that they are
+        inferred again once loaded
+        """
+        self._waitUntilLoaded()
+        with self._lock:
+            paths = self._dirty_paths | self._stale_inferences
+            if everything:
+                paths |= self._paths
+
+            result = []  # type: List[Tuple[Path, Optional[Dict[str, Any]]]]
+            for path in paths:
+                if path not in self._paths:
+                    result.append((path, None))
+                    continue
+                # Paths not parsed yet are changed again once they are
+                if path not in self._parse_timestamp:
+                    continue
+                state = self._getSourceState(path)
+                state["inferred"] = path in self._inferred_libraries
+                if path in self._stale_inferences:
+                    state.pop("library", None)
+                    state["inferred"] = False
+                result.append((path, state))
+
+            self._dirty_paths -= paths
+
+        return result
+
+    @classmethod
+    def fromSources(cls, sources):
+        # type: (Iterable[Dict[str, Any]]) -> Database
+        """
+        Creates a database from the states returned by popChangedSources. The
+        sources are not considered changed afterwards
+        """
+        obj = cls()
+        obj._addSourceStates(sources)  # pylint: disable=protected-access
+        return obj
+
+    @classmethod
+    def fromStore(cls, store, on_error=None):
+        # type: (StateStore, Optional[Callable[[Exception], None]]) -> Database
+        """
+        Creates a database from the sources in a state store, loading them on
+        a separate thread. Until they're loaded, getPathsDefining and
+        getReferencesToDesignUnit are answered from the store's indexes and
+        everything else waits. If reading the store fails, the database is
+        left empty and on_error is called with the exception
+        """
+        obj = cls()
+        # pylint: disable=protected-access
+        obj._store = store
+        obj._loading = Event()
+        obj._loader = Thread(
+            target=obj._loadFromStore, args=(store, on_error), name="DatabaseLoader"
+        )
+        obj._loader.daemon = True
+        obj._loader.start()
+        # pylint: enable=protected-access
+        return obj
+
+    def _loadFromStore(self, store, on_error):
+        # type: (StateStore, Optional[Callable[[Exception], None]]) -> None
+        "Loads sources for fromStore, runs on a thread of its own"
+        error = None  # type: Optional[Exception]
+        try:
+            self._addSourceStates(store.getSources())
+        except (sqlite3.Error, ValueError, KeyError) as exception:
+            _logger.warning("Unable to load sources from %s: %s", store, exception)
+            error = exception
+        finally:
+            loading = self._loading
+            self._loading = None
+            self._store = None
+            assert loading is not None
+            loading.set()
+
+        # Only once readers are no longer waiting, the handler might need them
+        if error is not None and on_error is not None:
+            on_error(error)
+
+    def _addSourceStates(self, sources):
+        # type: (Iterable[Dict[str, Any]]) -> None
+        "Adds sources for fromSources, they're not considered changed after"
+        with self._changing():
+            for state in sources:
+                if state.pop("inferred", False):
+                    self._inferred_libraries.add(state["path"])
+                self._addSourceState(state)
+        self._dirty_paths.clear()
+
     def getFlags(self, path, scope=None):
         # type: (Path, Optional[BuildFlagScope]) -> BuildFlags
         """
         Return a list of flags for the given path or an empty tuple if the path
         is not found in the database.
         """
-        scope_flags = self._flags_map.get(path, {}).get(
-            scope or BuildFlagScope.single, ()
-        )
-
-        source_specific_flags = self._flags_map.get(path, {}).get(
-            BuildFlagScope.source_specific, ()
-        )
-
-        return scope_flags + source_specific_flags
+        return self._snapshot.getFlags(path, scope)
 
     @property
     def paths(self):
         # type: () -> Iterable[Path]
         "Returns a list of paths currently in the database"
-        return frozenset(self._paths)
+        return self._snapshot.paths
 
     def _updatePathLibrary(self, path, library):
         # type: (Path, Identifier) -> None
@@ -349,59 +1115,73 @@ class Database(HashableByKey):  # pylint: disable=too-many-instance-attributes
         their owner's path
         """
 
-        if path not in self._library_map:
-            _logger.info("Setting library for '%s' to '%s'", path, library)
-        else:
-            current_library = self._library_map.get(path)
-            # No change, avoid manipulating the database
-            if current_library == library:
-                return
-
-            _logger.info(
-                "Replacing old library '%s' for '%s' with '%s'",
-                current_library,
-                path,
-                library,
-            )
+        with self._changing():
+            if path not in self._library_map:
+                _logger.info("Setting library for '%s' to '%s'", path, library)
+            else:
+                current_library = self._library_map.get(path)
+                # No change, avoid manipulating the database
+                if current_library == library:
+                    return
+
+                _logger.info(
+                    "Replacing old library '%s' for '%s' with '%s'",
+                    current_library,
+                    path,
+                    library,
+                )
 
-        self._library_map[path] = library
+            self._library_map[path] = library
+            self._markChanged((path,))
 
-        # Nothing to resolve if the dependency entry is empty
-        if not self._dependencies_map.get(path, None):
-            return
+            # Names of required design units that don't specify a library
+            unresolved = _getNames(
+                dependency
+                for dependency in self._parse_results.get(path, _NOT_PARSED)[1]
+                if not dependency[0] and dependency[2] is None
+            )
 
-        # Extract the unresolved dependencies that will be replaced
-        unresolved_dependencies = {
-            x for x in self._dependencies_map[path] if x.library is None
-        }
+            # Nothing to resolve if there are no unresolved dependencies
+            if not unresolved:
+                return
 
-        # RequiredDesignUnit is not mutable, so we actually need to replace the
-        # objects
-        for dependency in unresolved_dependencies:
-            self._dependencies_map[path].add(
-                RequiredDesignUnit(
-                    owner=dependency.owner,
-                    name=dependency.name,
-                    library=library,
-                    locations=dependency.locations,
-                )
-            )
+            # Libraries referred by these will change from 'work' to the new
+            # library
+            for name in tuple(self._libraries_referred_cache):
+                if name.name in unresolved:
+                    del self._libraries_referred_cache[name]
+            self._invalidateInferredLibraries(unresolved)
 
-        # Safe to remove the unresolved ones
-        self._dependencies_map[path] -= unresolved_dependencies
+            # Dependencies are built with the library when needed
+            self._dependencies_library[path] = library
 
-    @lru_cache()
     def getLibrary(self, path):
         # type: (Path) -> UnresolvedLibrary
         """
-        Gets the library the path is in, inferring and updating it if needed.
-        Any unit that can be used from VHDL code can be bound to a library,
-        even if Verilog and SystemVerilog don't have this concept.
+        Gets the library the path is in. Any unit that can be used from VHDL
+        code can be bound to a library, even if Verilog and SystemVerilog don't
+        have this concept.
         """
-        self._parseSourceIfNeeded(path)
+        self._prepareForReading(path)
+        return self._snapshot.getLibrary(path)
 
-        if path not in self.paths:
-            # Add the path to the project but put it on a different library
+    def _prepareForReading(self, path):
+        # type: (Path) -> bool
+        """
+        Parses the path if it changed and adds it to the database (on a
+        different library) if it's not in the project. Returns False if that
+        couldn't be done because another thread is changing the database
+        """
+        fresh = self._parseSourcesIfNeeded((path,)) is not None
+        snapshot = self._snapshot
+        if path in snapshot.paths or path in self._not_in_project_cache:
+            return fresh
+
+        with self._changingIfIdle() as idle:
+            if not idle:
+                return False
+            if path in self._paths:
+                return True
             self._parseSourceIfNeeded(path)
             self._updatePathLibrary(path, Identifier("not_in_project", True))
             # Report paths that are valid (that is, not temporary) when they
@@ -409,28 +1189,54 @@ class Database(HashableByKey):  # pylint: disable=too-many-instance-attributes
             if not isinstance(path, TemporaryPath):
                 self._addDiagnostic(PathNotInProjectFile(path))
 
-        elif path not in self._library_map:
-            # Library is not defined, try to infer
-            _logger.debug("Library for '%s' not set, inferring it", path)
-            library = self._inferLibraryForPath(path)
-            if library is not None:
-                self._updatePathLibrary(path, library)
+        self._not_in_project_cache.add(path)
+        return True
 
-        return self._library_map.get(path, None)
+    def _needsParsing(self, path):
+        # type: (Path) -> bool
+        "Checks if the path changed since it was last parsed"
+        mtime = self._getReadableMtime(path)
+        if mtime is None:
+            # Paths that can't be read are removed, if they were ever added
+            return path in self._parse_timestamp or path in self._snapshot.paths
+        return mtime != self._parse_timestamp.get(path, 0)
+
+    def _parseSourcesIfNeeded(self, paths):
+        # type: (Iterable[Path]) -> Optional[bool]
+        """
+        Parses paths that changed since they were last parsed, returning True
+        if that published a new snapshot and False if nothing changed.
+        Parsing is done on the writer side, so if another thread is changing
+        the database this returns None straight away and readers carry on
+        with the snapshot they have, which might be out of date
+        """
+        paths = [path for path in paths if self._needsParsing(path)]
+        if not paths:
+            return False
+
+        version = self._snapshot.version
+        with self._changingIfIdle() as idle:
+            if not idle:
+                _logger.debug("Database is busy, not parsing %d paths", len(paths))
+                return None
+            for path in paths:
+                self._parseSourceIfNeeded(path)
+
+        return self._snapshot.version != version
 
     def _parseSourceIfNeeded(self, path):
         # type: (Path) -> None
         """
         Parses a given path if needed, removing info from the database prior to that
         """
-        if not isFileReadable(path.name):
+        mtime = self._getReadableMtime(path)
+
+        if mtime is None:
             _logger.warning("Won't parse file that's not readable %s", repr(path))
             self.removeSource(path)
             return
 
         # Sources will get parsed on demand
-        mtime = p.getmtime(path.name)
-
         if mtime == self._parse_timestamp.get(path, 0):
             return
 
@@ -442,56 +1248,212 @@ class Database(HashableByKey):  # pylint: disable=too-many-instance-attributes
         Extracts info from a source, taking care of removing previously defined
         items before
         """
-        _logger.debug("Parsing %s", path)
+        digest, result = self._lookupParseCache(path)
+        if result is None:
+            _logger.debug("Parsing %s", path)
+            result = parseSourceCompact(path.name)
+            self._storeParseResult(digest, result)
 
-        try:
-            src_parser = getSourceParserFromPath(path)
-            design_units = src_parser.getDesignUnits()
-            dependencies = src_parser.getDependencies()
-        except UnknownTypeExtension:
-            # Not a file extension we know how to parse, leave design units and
-            # dependencies empty
-            design_units = set()
-            dependencies = set()
+        self._updateParseResult(path, result)
 
-        with self._lock:
-            # Update the timestamp
-            self._parse_timestamp[path] = p.getmtime(str(path))
+    def _parseSources(self, paths):
+        # type: (List[Path]) -> None
+        """
+        Parses multiple sources, using a process pool if there are enough of
+        them not found on the parse cache
+        """
+        to_parse = []  # type: List[Tuple[Path, Optional[str]]]
+        for path in paths:
+            digest, result = self._lookupParseCache(path)
+            if result is None:
+                to_parse.append((path, digest))
+            else:
+                self._updateParseResult(path, result)
 
-            # Remove all design units that referred to this path before adding
-            # new ones, but use the non API method for that to avoid recursing
-            self._design_units -= frozenset(self._getDesignUnitsByPath(path))
+        # Results come out in the same order paths were passed, so merging
+        # them is deterministic
+        results = parseSourcesCompact(
+            [path.name for path, _ in to_parse], self._parse_jobs
+        )
+        for (path, digest), result in zip(to_parse, results):
+            self._storeParseResult(digest, result)
+            self._updateParseResult(path, result)
 
-            self._design_units |= design_units
-            self._dependencies_map[path] = dependencies
-            self._clearLruCaches()
+    def _lookupParseCache(self, path):
+        # type: (Path) -> Tuple[Optional[str], Optional[CompactParseResult]]
+        """
+        Returns the digest of the path's contents and the parse result stored
+        for it, either of which is None if not available
+        """
+        if self.parse_cache is None:
+            return None, None
+
+        digest = self.parse_cache.getDigest(path)
+        if digest is None:
+            return None, None
+
+        result = self.parse_cache.get(digest)
+        if result is not None:
+            _logger.debug("Reusing parse result of %s (%s)", path, digest)
+        return digest, result
+
+    def _storeParseResult(self, digest, result):
+        # type: (Optional[str], CompactParseResult) -> None
+        "Adds a parse result to the parse cache, if any"
+        if self.parse_cache is not None and digest is not None:
+            self.parse_cache.put(digest, result)
+
+    def _updateParseResult(self, path, result):
+        # type: (Path, CompactParseResult) -> None
+        """
+        Updates the path's info from a compact parse result. Caches are only
+        invalidated if the result differs from the one used last time
+        """
+        units, dependencies = result
+        key = frozenset(units), frozenset(dependencies)
+        with self._changing():
+            self._updateParseTimestamp(path)
+            if self._parse_results.get(path, None) == key:
+                return
+
+            # Only what actually changed needs to be invalidated
+            old_units, old_dependencies = self._parse_results.get(path, _NOT_PARSED)
+            self._setParseResult(path, key)
+            changed_units = _getNames(old_units.symmetric_difference(key[0]))
+            changed_dependencies = _getNames(
+                old_dependencies.symmetric_difference(key[1])
+            )
+            if changed_units or changed_dependencies:
+                self._invalidateCaches(path, changed_units, changed_dependencies)
+
+    def _updateParseTimestamp(self, path):
+        # type: (Path) -> None
+        """
+        Updates the path's parse timestamp, using the same value the epoch
+        has (if any) so that the path is not seen as changed again
+        """
+        mtime = self._getReadableMtime(path)
+        self._parse_timestamp[path] = p.getmtime(str(path)) if mtime is None else mtime
+        self._dirty_paths.add(path)
+
+    def _setParseResult(self, path, result):
+        # type: (Path, Optional[FrozenParseResult]) -> None
+        """
+        Replaces the path's parse result (or removes it if result is None),
+        keeping the name indexes updated
+        """
+        old_units, old_dependencies = self._parse_results.pop(path, _NOT_PARSED)
+        units, dependencies = _NOT_PARSED if result is None else result
+        if result is not None:
+            self._parse_results[path] = result
+        self._dependencies_library.pop(path, None)
+
+        self._markChanged(
+            (path,),
+            _updateIndex(
+                self._units_by_name, path, _getNames(old_units), _getNames(units)
+            ),
+            _updateIndex(
+                self._dependencies_by_name,
+                path,
+                _getNames(old_dependencies),
+                _getNames(dependencies),
+            ),
+        )
 
     def _clearLruCaches(self):
-        "Clear caches from lru_caches"
-        for meth in self._cached_methods:
-            meth.cache_clear()
+        "Clear every memoized result"
+        with self._lock:
+            self._libraries_referred_cache.clear()
+            self._paths_defining_cache.clear()
+            self._build_sequence_cache.clear()
+            self._not_in_project_cache.clear()
+            # Readers might be memoizing results from the current snapshot
+            if self._change_depth:
+                self._pending_clear = True
+
+    def _invalidateCaches(self, path, unit_names, dependency_names, path_changed=False):
+        # type: (Path, Set[str], Set[str], bool) -> None
+        """
+        Drops memoized results that might have been affected by a change to
+        the given path. Unit and dependency names are the normalized names of
+        the ones that were either added or removed and path_changed indicates
+        the path itself was added or removed (which affects resolving included
+        paths as well). Results memoized by readers are only dropped once the
+        change is published
+        """
+        names = unit_names | dependency_names
+
+        _logger.debug("Invalidating caches for %s, names=%s", path, names)
+
+        with self._changing():
+            if unit_names and path in self._inferred_libraries:
+                self._stale_inferences.add(path)
+
+            # Library inference for paths defining units whose references
+            # changed might give a different result now
+            self._invalidateInferredLibraries(dependency_names)
+
+            for name in tuple(self._libraries_referred_cache):
+                if name.name in dependency_names:
+                    del self._libraries_referred_cache[name]
+
+            self._pending_invalidations.append((path, frozenset(names), path_changed))
+
+    def _invalidateMemoized(self, path, names, path_changed):
+        # type: (Path, FrozenSet[str], bool) -> None
+        "Drops results memoized by readers, see _invalidateCaches"
+        self._not_in_project_cache.discard(path)
+        for name_and_library in tuple(self._paths_defining_cache):
+            if name_and_library[0].name in names:
+                self._paths_defining_cache.pop(name_and_library, None)
+
+        for key, entry in tuple(self._build_sequence_cache.items()):
+            if (
+                path in entry.paths
+                or not names.isdisjoint(entry.names)
+                or (
+                    path_changed
+                    and any(path.endswith(include) for include in entry.includes)
+                )
+            ):
+                self._build_sequence_cache.pop(key, None)
 
-    def getDesignUnitsByPath(self, path):  # type: (Path) -> Set[tAnyDesignUnit]
-        "Gets the design units for the given path (if any)"
-        self._parseSourceIfNeeded(path)
-        return self._getDesignUnitsByPath(path)
+    def _invalidateInferredLibraries(self, names):
+        # type: (Iterable[str]) -> None
+        """
+        Flags libraries inferred for paths defining any of the given names so
+        they're worked out again
+        """
+        for name in names:
+            for path in self._units_by_name.get(name, ()):
+                if path in self._inferred_libraries:
+                    self._stale_inferences.add(path)
 
-    @lru_cache(maxsize=128, typed=False)
-    def _getDesignUnitsByPath(self, path):  # type: (Path) -> Set[tAnyDesignUnit]
+    def _memoize(self, cache, key, value, snapshot):
+        # type: (Dict[Any, Any], Any, Any, DatabaseSnapshot) -> None
         """
-        Gets the design units for the given path (if any). Differs from the
-        public method in that changes to the file are not checked before
-        running.
+        Memoizes a value computed from the given snapshot. Values computed
+        from a snapshot that has been replaced meanwhile might have missed
+        the invalidation, so they're dropped
         """
-        return {x for x in self.design_units if x.owner == path}
+        cache[key] = value
+        if self._snapshot is not snapshot:
+            cache.pop(key, None)
+
+    def getDesignUnitsByPath(self, path):
+        # type: (Path) -> FrozenSet[tAnyDesignUnit]
+        "Gets the design units for the given path (if any)"
+        self._parseSourcesIfNeeded((path,))
+        return self._snapshot.getDesignUnitsByPath(path)
 
     def getDependenciesByPath(self, path):
         # type: (Path) -> FrozenSet[BaseDependencySpec]
         """
         Returns parsed dependencies for the given path
         """
-        self._parseSourceIfNeeded(path)
-        return frozenset(self._dependencies_map.get(path, ()))
+        self._parseSourcesIfNeeded((path,))
+        return self._snapshot.getDependenciesByPath(path)
 
     def getPathsByDesignUnit(self, unit):
         # type: (tAnyDesignUnit) -> Iterator[Path]
@@ -501,29 +1463,16 @@ class Database(HashableByKey):  # pylint: disable=too-many-instance-attributes
         """
         return (
             design_unit.owner
-            for design_unit in self.design_units
-            if (unit.name, unit.type_) == (design_unit.name, design_unit.type_)
+            for design_unit in self._snapshot.getDesignUnitsByName(unit.name)
+            if unit.type_ == design_unit.type_
         )
 
-    def _inferLibraryForPath(self, path):
-        # type: (Path) -> UnresolvedLibrary
+    def _chooseInferredLibrary(self, path, all_libraries):
+        # type: (Path, List[Identifier]) -> UnresolvedLibrary
         """
-        Tries to infer which library the given path should be compiled on by
-        looking at where and how the design units it defines are used
+        Picks the library for a path given every library its units are
+        referred from (other than 'work')
         """
-        # Find all units this path defines
-        units = set(self.getDesignUnitsByPath(path))
-        _logger.debug("Units defined here in %s: %s", path, list(map(str, units)))
-        # Store all cases to use in case there are multiple libraries that
-        # could be used. If that happens, we'll use the most common one
-        all_libraries = [
-            library
-            for library in chain.from_iterable(
-                self.getLibrariesReferredByUnit(name=unit.name) for unit in units
-            )
-            if library != _LIBRARY_WORK
-        ]
-
         libraries = set(all_libraries)
 
         if not libraries:
@@ -546,39 +1495,150 @@ class Database(HashableByKey):  # pylint: disable=too-many-instance-attributes
             )
 
         self._inferred_libraries.add(path)
+        self._stale_inferences.discard(path)
         return library
 
-    @lru_cache()
+    def inferLibraries(self):
+        # type: () -> None
+        """
+        Infers libraries for every path without one set explicitly (and
+        those whose inferred library went stale)
+        """
+        with self._changing():
+            self._inferLibraries(
+                {path for path in self._paths if path not in self._library_map}
+                | (self._stale_inferences & self._paths)
+            )
+
+    def _inferLibraries(self, pending):
+        # type: (Set[Path]) -> None
+        """
+        Infers libraries for the given paths in bulk. References to units
+        defined by pending paths are gathered once per pass instead of once
+        per path, and passes are repeated while setting a library resolves
+        'work' references that other paths can be inferred from
+        """
+        with self._changing():
+            while pending:
+                _logger.debug("Inferring libraries for %d paths", len(pending))
+                self._stale_inferences -= pending
+
+                # Names of the design units each path defines
+                names_by_path = {
+                    path: [
+                        Identifier(name, case_sensitive)
+                        for _, (name, case_sensitive), _ in self._parse_results.get(
+                            path, _NOT_PARSED
+                        )[0]
+                    ]
+                    for path in pending
+                }
+                referred = self._getLibrariesReferredByNames(
+                    {name.name for names in names_by_path.values() for name in names}
+                )
+
+                for path, names in names_by_path.items():
+                    library = self._chooseInferredLibrary(
+                        path,
+                        [
+                            library
+                            for unit_name in names
+                            for name, library in referred.get(unit_name.name, ())
+                            if name == unit_name and library != _LIBRARY_WORK
+                        ],
+                    )
+                    if library is None or self._library_map.get(path) == library:
+                        continue
+                    self._updatePathLibrary(path, library)
+                    self._invalidateCaches(path, {name.name for name in names}, set())
+                    self._stale_inferences.discard(path)
+
+                # Paths flagged while setting libraries need another pass
+                pending = self._stale_inferences & self._paths
+
+    def _getLibrariesReferredByNames(self, names):
+        # type: (Iterable[str]) -> Dict[str, List[Tuple[Identifier, Identifier]]]
+        """
+        Gets the (name, library) pairs for every dependency referring to the
+        given normalized names. Libraries of unresolved dependencies are the
+        ones their owners are in
+        """
+        result = {}  # type: Dict[str, List[Tuple[Identifier, Identifier]]]
+        for name in names:
+            referred = []  # type: List[Tuple[Identifier, Identifier]]
+            result[name] = referred
+            for path in self._dependencies_by_name.get(name, ()):
+                owner_library = self._dependencies_library.get(
+                    path, self._library_map.get(path, _LIBRARY_WORK)
+                )
+                for _, dependency_name, library, _ in self._parse_results[path][1]:
+                    if dependency_name[0].lower() != name:
+                        continue
+                    referred.append(
+                        (
+                            Identifier(*dependency_name),
+                            owner_library if library is None else Identifier(*library),
+                        )
+                    )
+        return result
+
     def getLibrariesReferredByUnit(self, name):
         # type: (Identifier) -> List[Identifier]
         """
         Gets libraries that the (library, name) pair is used throughout the
         project
         """
-        _logger.debug("Searching for uses of %s", repr(name))
+        self._waitUntilLoaded()
+        with self._lock:
+            try:
+                return self._libraries_referred_cache[name]
+            except KeyError:
+                pass
 
-        result = []  # List[Identifier]
-        for path, dependencies in self._dependencies_map.items():
-            for dependency in dependencies:
-                if name != dependency.name:
-                    continue
+            result = self._getLibrariesReferredByUnit(name)
+            self._libraries_referred_cache[name] = result
+            return result
 
-                # If the dependency's library refers to 'work', it's actually
-                # referring to the library its owner is in
-                if dependency.library is not None:
-                    result.append(dependency.library)
-                else:
-                    result.append(self._library_map.get(path, _LIBRARY_WORK))
+    def _getLibrariesReferredByUnit(self, name):
+        # type: (Identifier) -> List[Identifier]
+        "Non memoized version of getLibrariesReferredByUnit"
+        _logger.debug("Searching for uses of %s", repr(name))
 
-        return result
+        return [
+            library
+            for dependency_name, library in self._getLibrariesReferredByNames(
+                (name.name,)
+            )[name.name]
+            if dependency_name == name
+        ]
 
-    @lru_cache()
     def getPathsDefining(self, name, library=None):
         # type: (Identifier, UnresolvedLibrary) -> Iterable[Path]
         """
         Search for paths that define a given name optionally inside a library.
         """
-        units = {unit for unit in self.design_units if unit.name == name}
+        store = self._store
+        if store is not None:
+            try:
+                return store.getPathsDefining(name, library)
+            except sqlite3.Error:
+                # Store might have been closed meanwhile, wait for the load
+                pass
+
+        try:
+            return self._paths_defining_cache[(name, library)]
+        except KeyError:
+            pass
+
+        snapshot = self._snapshot
+        paths = self._getPathsDefining(snapshot, name, library)
+        self._memoize(self._paths_defining_cache, (name, library), paths, snapshot)
+        return paths
+
+    def _getPathsDefining(self, snapshot, name, library):
+        # type: (DatabaseSnapshot, Identifier, UnresolvedLibrary) -> Iterable[Path]
+        "Non memoized version of getPathsDefining"
+        units = snapshot.getDesignUnitsByName(name)
 
         if not units:
             _logger.debug(
@@ -587,20 +1647,16 @@ class Database(HashableByKey):  # pylint: disable=too-many-instance-attributes
             return ()
 
         if library is not None:
-            units_matching_library = {
-                unit for unit in units if (self.getLibrary(unit.owner) == library)
-            }
-
-            if not units_matching_library:
-                # If no units match when using the library, it means the database
-                # is incomplete and we should try to infer the library from the
-                # usage of this unit
-                for owner in {x.owner for x in units}:
-                    # Force getting library for this path to trigger library
-                    # inference if needed
-                    self.getLibrary(owner)
-            else:
-                units = units_matching_library
+            # If no units match when using the library, the database is
+            # incomplete, so use all of them
+            units = (
+                frozenset(
+                    unit
+                    for unit in units
+                    if snapshot.getLibrary(unit.owner) == library
+                )
+                or units
+            )
 
         # These include paths and temporary paths, which is what this method
         # should return but useless when reporting dependencies not unique.
@@ -627,14 +1683,10 @@ class Database(HashableByKey):  # pylint: disable=too-many-instance-attributes
         if len(choices) < 2:
             return
 
-        # Reverse dependency search. Need to evaluate how this performs, but
-        # we'll try to avoid creating a set to store BaseDependencySpec objects
-        # for now
-
         for dependency in (
             dependency
-            for dependency in chain.from_iterable(self._dependencies_map.values())
-            if (library, name) == (dependency.library, dependency.name)
+            for dependency in self._snapshot.getDependenciesByName(name)
+            if dependency.library == library
         ):
 
             # Fill in a report for every occurence found
@@ -655,7 +1707,12 @@ class Database(HashableByKey):  # pylint: disable=too-many-instance-attributes
         Tries to resolve an include by searching for paths that end with the
         same set of strings as the included path
         """
-        paths = {path for path in self.paths if path.endswith(str(included_path.name))}
+        return self._resolveIncludedPath(self._snapshot, included_path)
+
+    def _resolveIncludedPath(self, snapshot, included_path):
+        # type: (DatabaseSnapshot, IncludedPath) -> Optional[Path]
+        "Implements resolveIncludedPath using the given snapshot"
+        paths = snapshot.getPathsEndingWith(str(included_path.name))
 
         if not paths:
             _logger.warning("No path matched %s", repr(included_path))
@@ -682,27 +1739,43 @@ class Database(HashableByKey):  # pylint: disable=too-many-instance-attributes
         path but only within the project file set. If a design unit can't be
         found in any source, it will be silently ignored.
         """
-        self._parseSourceIfNeeded(path)
+        with self.freshnessEpoch():
+            self._prepareForReading(path)
+            units, searched_paths, _ = self._searchDependencies(self._snapshot, path)
+            if self._parseSourcesIfNeeded(searched_paths):
+                units = self._searchDependencies(self._snapshot, path)[0]
+        return units
 
+    def _searchDependencies(self, snapshot, path):
+        # type: (DatabaseSnapshot, Path) -> Tuple[Set[LibraryUnitTuple], Set[Path], Set[str]]
+        """
+        Implements getDependenciesUnits using the given snapshot but also
+        returns the paths searched and the names of the included paths found
+        along the way
+        """
         units = set()  # type: Set[LibraryUnitTuple]
+        searched_paths = set()  # type: Set[Path]
+        includes = set()  # type: Set[str]
 
         search_paths = set((path,))
         own_units = {
-            (self.getLibrary(path), x.name) for x in self.getDesignUnitsByPath(path)
+            (snapshot.getLibrary(path), x.name)
+            for x in snapshot.getDesignUnitsByPath(path)
         }
 
         while search_paths:
+            searched_paths |= search_paths
             dependencies = {
                 dependency
                 for search_path in search_paths
-                for dependency in self._dependencies_map[search_path]
+                for dependency in snapshot.getDependenciesByPath(search_path)
                 if isinstance(dependency, RequiredDesignUnit)
             }
             # Get the dependencies of the search paths and which design units
             # they define and remove the ones we've already seen
             new_deps = {
                 (
-                    dependency.library or self.getLibrary(dependency.owner),
+                    dependency.library or snapshot.getLibrary(dependency.owner),
                     dependency.name,
                 )
                 for dependency in dependencies
@@ -716,12 +1789,17 @@ class Database(HashableByKey):  # pylint: disable=too-many-instance-attributes
             # the search started
             units |= new_deps
 
-            # Resolve included paths to a real, searchable path
-            resolved_includes = (
-                self.resolveIncludedPath(dependency)
+            included_paths = {
+                dependency
                 for search_path in search_paths
-                for dependency in self._dependencies_map[search_path]
+                for dependency in snapshot.getDependenciesByPath(search_path)
                 if isinstance(dependency, IncludedPath)
+            }
+            includes |= {str(x.name) for x in included_paths}
+
+            # Resolve included paths to a real, searchable path
+            resolved_includes = (
+                self._resolveIncludedPath(snapshot, x) for x in included_paths
             )
 
             # Paths to be searched on the next iteration are the paths of the
@@ -729,131 +1807,255 @@ class Database(HashableByKey):  # pylint: disable=too-many-instance-attributes
             search_paths = {x for x in resolved_includes if x}
 
             for library, name in new_deps:
-                new_paths = set(self.getPathsDefining(name=name, library=library))
+                new_paths = set(self._getPathsDefining(snapshot, name, library))
                 search_paths |= new_paths
 
             _logger.debug("Search paths: %s", search_paths)
 
         # Remove units defined by the path passed as argument
         units -= own_units
-        return units
+        return units, searched_paths, includes
 
-    @lru_cache()
     def getBuildSequence(self, path, builtin_libraries=None):
-        # type: (Path, Optional[Tuple[Identifier]]) -> Iterable[Tuple[Identifier, Path]]
+        # type: (Path, Optional[Tuple[Identifier]]) -> BuildSequence
         """
         Gets the build sequence that satisfies the preconditions to compile the
         given path. This is the cached version of self._getBuildSequence(),
         which can't be cached because it returns an iterator.
         """
-        return tuple(
+        key = (path, builtin_libraries)
+        with self.freshnessEpoch():
+            # Paths involved might have changed on disk without the database
+            # being told, only reuse the sequence if none of them did
+            entry = self._build_sequence_cache.get(key, None)
+            if entry is not None and not any(
+                self._needsParsing(current_path) for current_path in entry.paths
+            ):
+                return entry.sequence
+
+            # Diagnostics for the path will be populated while searching
+            with self._diags_lock:
+                self._diags[path] = set()
+
+            fresh = self._prepareForReading(path)
+            snapshot = self._snapshot
+            entry = self._getBuildSequenceEntry(snapshot, path, builtin_libraries)
+
+            parsed = self._parseSourcesIfNeeded(entry.paths)
+            if parsed:
+                snapshot = self._snapshot
+                entry = self._getBuildSequenceEntry(snapshot, path, builtin_libraries)
+
+        # If another thread was changing the database, paths involved might
+        # not have been parsed again and the result might be out of date
+        if fresh and parsed is not None:
+            self._memoize(self._build_sequence_cache, key, entry, snapshot)
+        return entry.sequence
+
+    def _getBuildSequenceEntry(self, snapshot, path, builtin_libraries):
+        # type: (DatabaseSnapshot, Path, Optional[Tuple[Identifier]]) -> _BuildSequenceEntry
+        "Works out the build sequence of a path using the given snapshot"
+        units_to_build, searched_paths, includes = self._searchDependencies(
+            snapshot, path
+        )
+
+        sequence = tuple(
             self._getBuildSequence(
-                path=path, builtin_libraries=frozenset(builtin_libraries or [])
+                snapshot=snapshot,
+                path=path,
+                builtin_libraries=frozenset(builtin_libraries or []),
+                units_to_build=set(units_to_build),
             )
         )
 
-    def _getBuildSequence(self, path, builtin_libraries):
-        # type: (Path, FrozenSet[Identifier]) -> Iterable[Tuple[Identifier, Path]]
+        return _BuildSequenceEntry(
+            sequence=sequence,
+            paths=frozenset(searched_paths).union(
+                current_path for _, current_path in sequence
+            ),
+            names=frozenset(name.name for _, name in units_to_build),
+            includes=frozenset(includes),
+        )
+
+    def getBuildLevels(self, path, builtin_libraries=None):
+        # type: (Path, Optional[Tuple[Identifier]]) -> Tuple[BuildSequence, ...]
         """
-        Gets the build sequence that satisfies the preconditions to compile the
-        given path
+        Splits the build sequence of the given path into levels. Paths on the
+        same level can be built in any order, or at the same time, once all
+        paths on previous levels have been built. A path is never moved ahead
+        of paths defining or using the units it defines, so building the levels
+        in order has the same result as building the sequence
         """
-        self._diags[path] = set()
-        units_compiled = set()  # type: Set[LibraryUnitTuple]
+        builtins = frozenset(builtin_libraries or [])
+        levels = []  # type: List[List[Tuple[Identifier, Path]]]
+        # Last level on which each unit was compiled and used
+        compiled_at = {}  # type: Dict[LibraryUnitTuple, int]
+        used_at = {}  # type: Dict[LibraryUnitTuple, int]
+
+        sequence = self.getBuildSequence(path, builtin_libraries)
+        snapshot = self._snapshot
+
+        for library, current_path in sequence:
+            own, needs = self._getUnitsOwnedAndNeeded(snapshot, current_path, builtins)
+            level = 1 + max(
+                [-1]
+                + [compiled_at.get(unit, -1) for unit in needs | own]
+                + [used_at.get(unit, -1) for unit in own]
+            )
+            if level == len(levels):
+                levels.append([])
+            levels[level].append((library, current_path))
 
-        units_to_build = self.getDependenciesUnits(path)
-        paths_to_build = set(
-            chain.from_iterable(
-                self.getPathsDefining(name=name, library=library)
-                for library, name in units_to_build
-                if library not in builtin_libraries
+            for unit in own:
+                compiled_at[unit] = level
+            for unit in needs:
+                used_at[unit] = max(level, used_at.get(unit, -1))
+
+        return tuple(tuple(level) for level in levels)
+
+    @staticmethod
+    def _getUnitsOwnedAndNeeded(snapshot, path, builtin_libraries):
+        # type: (DatabaseSnapshot, Path, FrozenSet[Identifier]) -> Tuple[Set[LibraryUnitTuple], Set[LibraryUnitTuple]]
+        """
+        Gets the units defined by the path and the units that must be compiled
+        before it
+        """
+        library = snapshot.getLibrary(path)
+
+        own = {(library, x.name) for x in snapshot.getDesignUnitsByPath(path)}
+
+        # Filter out dependencies that are either
+        # - provided by the builder
+        # - on the 'use foo.all' format because this only indicates
+        #   that a source needs a given library to
+        #   exist (which is handled by the builder)
+        # - not a required design unit (e.g, included paths)
+        needs = {
+            (
+                dependency.library or snapshot.getLibrary(dependency.owner),
+                dependency.name,
             )
-        )
+            for dependency in snapshot.getDependenciesByPath(path)
+            if dependency.name.name != "all"
+            and isinstance(dependency, RequiredDesignUnit)
+            and dependency.library not in builtin_libraries
+        } - own
 
-        # Limit the number of iterations to the worst case of every pass
-        # compiling only a single source and all of them having a chain of
-        # dependencies on the previous one
-        iteration_limit = len(paths_to_build) + 1
+        return own, needs
 
-        path_needs_map = (
-            {}
-        )  # type: Dict[Path, Set[Tuple[UnresolvedLibrary, Identifier]]]
+    def _getBuildSequence(self, snapshot, path, builtin_libraries, units_to_build):
+        # type: (DatabaseSnapshot, Path, FrozenSet[Identifier], Set[LibraryUnitTuple]) -> Iterable[Tuple[Identifier, Path]]
+        """
+        Gets the build sequence that satisfies the preconditions to compile the
+        given path.
+
+        The resulting order is the same as repeatedly sweeping the paths to
+        build (in a fixed order) and compiling every path whose dependencies
+        have been compiled, either on the current sweep or on a previous one.
+        Paths whose units have all been compiled by other paths are skipped.
+        Instead of actually sweeping, this works out the sweep and position on
+        which each path would be compiled by following the dependency graph,
+        so each path and dependency is only looked at once.
+        """
+        paths_to_build = list(
+            set(
+                chain.from_iterable(
+                    self._getPathsDefining(snapshot, name, library)
+                    for library, name in units_to_build
+                    if library not in builtin_libraries
+                )
+            )
+        )
 
-        for i in range(iteration_limit):
-            paths_built = set()  # type: Set[Path]
+        libraries = {}  # type: Dict[Path, Identifier]
+        # Number of units each path still needs and how many of the units it
+        # defines haven't been compiled yet
+        needs_count = []  # type: List[int]
+        own_count = []  # type: List[int]
+        # Maps a unit to the index of the paths waiting for it to be compiled,
+        # either because they need it or because they also define it
+        units_needed_by = {}  # type: Dict[LibraryUnitTuple, List[int]]
+        units_owned_by = {}  # type: Dict[LibraryUnitTuple, List[int]]
+        own_units = []  # type: List[Set[LibraryUnitTuple]]
+
+        # Heap of (sweep, index, action) tuples, where action is either
+        # _SKIP_PATH or _BUILD_PATH. Skipping has precedence over building
+        # because sweeps check if the path has new units before anything else
+        pending = []  # type: List[Tuple[int, int, int]]
+
+        for index, current_path in enumerate(paths_to_build):
+            own, needs = self._getUnitsOwnedAndNeeded(
+                snapshot, current_path, builtin_libraries
+            )
+            libraries[current_path] = (
+                snapshot.getLibrary(current_path) or DEFAULT_LIBRARY
+            )
 
-            for current_path in paths_to_build:
-                own = {
-                    (self.getLibrary(current_path), x.name)
-                    for x in self.getDesignUnitsByPath(current_path)
-                }
+            own_units.append(own)
+            own_count.append(len(own))
+            needs_count.append(len(needs))
 
-                # Filter out dependencies that are either
-                # - provided by the builder
-                # - on the 'use foo.all' format because this only indicates
-                #   that a source needs a given library to
-                #   exist (which is handled by the builder)
-                # - not a required design unit (e.g, included paths)
-                deps = {
-                    (
-                        dependency.library or self.getLibrary(dependency.owner),
-                        dependency.name,
-                    )
-                    for dependency in self._dependencies_map[current_path]
-                    if dependency.name.name != "all"
-                    and isinstance(dependency, RequiredDesignUnit)
-                    and dependency.library not in builtin_libraries
-                }
+            for unit in own:
+                units_owned_by.setdefault(unit, []).append(index)
+            for unit in needs:
+                units_needed_by.setdefault(unit, []).append(index)
 
-                # Units still needed are the ones we haven't seen before
-                path_needs = deps - units_compiled - own
-                new_units = own - units_compiled
+            if not own:
+                heappush(pending, (0, index, _SKIP_PATH))
+            elif not needs:
+                heappush(pending, (0, index, _BUILD_PATH))
 
-                path_needs_map[current_path] = path_needs
+        units_compiled = set()  # type: Set[LibraryUnitTuple]
+        done = [False] * len(paths_to_build)
 
-                if new_units and not path_needs:
-                    _logger.debug(
-                        "Compiling %s adds %d new units: %s",
-                        current_path,
-                        len(new_units),
-                        new_units,
-                    )
-                    yield self.getLibrary(current_path) or DEFAULT_LIBRARY, current_path
-                    paths_built.add(current_path)
-                    units_compiled |= own
-                elif not new_units:
-                    # If the current path only defines units that have been
-                    # already compiled, skip it
-                    _logger.debug("Path %s has nothing to add, skipping", current_path)
-                    paths_built.add(current_path)
-                elif path_needs and _logger.isEnabledFor(
-                    logging.DEBUG
-                ):  # pragma: no cover
-                    _logger.debug(
-                        "%s still needs %s",
-                        current_path,
-                        [(library, name.name) for library, name in path_needs],
-                    )
+        while pending:
+            sweep, index, action = heappop(pending)
+            if done[index]:
+                continue
 
-            paths_to_build -= paths_built
-            units_to_build -= units_compiled
+            done[index] = True
+            current_path = paths_to_build[index]
 
-            if not paths_built:
-                if paths_to_build:
-                    _logger.warning(
-                        "%d paths were not built: %s",
-                        len(paths_to_build),
-                        list(map(str, paths_to_build)),
-                    )
-                else:
-                    _logger.debug("Nothing more to do after %d steps", i)
-                return
+            if action == _SKIP_PATH:
+                # If the current path only defines units that have been
+                # already compiled, skip it
+                _logger.debug("Path %s has nothing to add, skipping", current_path)
+                continue
 
+            new_units = own_units[index] - units_compiled
             _logger.debug(
-                "Got %d units compiled: %s", len(units_compiled), units_compiled
+                "Compiling %s adds %d new units: %s",
+                current_path,
+                len(new_units),
+                new_units,
+            )
+            yield libraries[current_path], current_path
+
+            units_compiled |= new_units
+
+            # Paths after this one will see the new units on the same sweep,
+            # paths before it only on the next one
+            for unit in new_units:
+                for other in units_needed_by.get(unit, ()):
+                    needs_count[other] -= 1
+                    if not needs_count[other] and own_count[other]:
+                        heappush(
+                            pending,
+                            (sweep if other > index else sweep + 1, other, _BUILD_PATH),
+                        )
+                for other in units_owned_by.get(unit, ()):
+                    own_count[other] -= 1
+                    if not own_count[other]:
+                        heappush(
+                            pending,
+                            (sweep if other > index else sweep + 1, other, _SKIP_PATH),
+                        )
+
+        not_built = [x for x, is_done in zip(paths_to_build, done) if not is_done]
+        if not_built:
+            _logger.warning(
+                "%d paths were not built: %s", len(not_built), list(map(str, not_built))
             )
-
-        _logger.error("Iteration limit of %d reached", iteration_limit)
 
     def getReferencesToDesignUnit(self, unit):
         # type: (Union[tAnyDesignUnit, BaseDependencySpec]) -> Iterable[BaseDependencySpec]
@@ -862,16 +2064,34 @@ class Database(HashableByKey):  # pylint: disable=too-many-instance-attributes
         database that refer to the given design unit. Search is done by
         matching library and name.
         """
+        store = self._store
+        if store is not None:
+            try:
+                return self._getReferencesToDesignUnit(
+                    unit, store.getLibrary, store.getDependenciesByName(unit.name)
+                )
+            except sqlite3.Error:
+                # Store might have been closed meanwhile, wait for the load
+                pass
+
+        return self._getReferencesToDesignUnit(
+            unit, self.getLibrary, self._snapshot.getDependenciesByName(unit.name)
+        )
+
+    @staticmethod
+    def _getReferencesToDesignUnit(unit, get_library, dependencies):
+        # type: (Union[tAnyDesignUnit, BaseDependencySpec], Callable[[Path], Optional[Identifier]], Iterable[BaseDependencySpec]) -> Iterable[BaseDependencySpec]
+        "Filters dependencies referring to the unit's name by library"
         # Use the unit's library if the unit is a dependency
         if isinstance(unit, BaseDependencySpec):
             library = unit.library
         else:
             # If the unit is either a VHDL or a Verilog design unit (i.e.,
             # entities, modules, packages, etc), then use the owner's library
-            library = self.getLibrary(unit.owner)
+            library = get_library(unit.owner)
 
         return (
             dependency
-            for dependency in chain.from_iterable(self._dependencies_map.values())
-            if dependency.name == unit.name and dependency.library in (library, None)
+            for dependency in dependencies
+            if dependency.library in (library, None)
         )
@@ -235,6 +235,7 @@ def rebuildProject():
     project_file = bottle.request.forms.get("project_file")  # pylint: disable=no-member
     server = _getServerByProjectFile(project_file)
     server.clean()
+    server.shutdown(wait=False)
     _logger.debug("Removing and recreating server object")
     root_dir = Path(p.dirname(project_file))
     del servers[root_dir]
@@ -249,6 +250,8 @@ def shutdownServer():
     Terminates the current process to shutdown the server
     """
     _logger.info("Shutting down server")
+    for server in servers.values():
+        server.shutdown(wait=False)
     terminateProcess(os.getpid())
 
 
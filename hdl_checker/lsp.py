@@ -21,7 +21,8 @@ import logging
 from os import getpid
 from os import path as p
 from tempfile import mkdtemp
-from typing import Any, Callable, Iterable, List, Optional, Set, Tuple, Union
+from threading import Lock
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
 
 from pygls.features import (
     DEFINITION,
@@ -30,6 +31,7 @@ from pygls.features import (
     INITIALIZED,
     REFERENCES,
     TEXT_DOCUMENT_DID_CHANGE,
+    TEXT_DOCUMENT_DID_CLOSE,
     TEXT_DOCUMENT_DID_OPEN,
     TEXT_DOCUMENT_DID_SAVE,
     WORKSPACE_DID_CHANGE_CONFIGURATION,
@@ -41,6 +43,7 @@ from pygls.types import (
     DiagnosticSeverity,
     DidChangeConfigurationParams,
     DidChangeTextDocumentParams,
+    DidCloseTextDocumentParams,
     DidOpenTextDocumentParams,
     DidSaveTextDocumentParams,
     Hover,
@@ -55,13 +58,15 @@ from pygls.types import (
     TextDocumentPositionParams,
 )
 from pygls.uris import from_fs_path, to_fs_path
+from pygls.workspace import range_from_utf16
 from tabulate import tabulate
 
 from . import DEFAULT_LIBRARY, DEFAULT_PROJECT_FILE
 from .config_generators.simple_finder import SimpleFinder
 from .core import HdlCheckerCore
 from .diagnostics import CheckerDiagnostic, DiagType
-from .exceptions import UnknownParameterError
+from .exceptions import UnknownParameterError, UnknownTypeExtension
+from .parser_utils import compactParseResult
 from .parsers.elements.dependency_spec import (
     BaseDependencySpec,
     IncludedPath,
@@ -72,8 +77,9 @@ from .parsers.elements.design_unit import (
     VhdlDesignUnit,
     tAnyDesignUnit,
 )
+from .parsers.vhdl_parser import VhdlBufferParser
 from .path import Path, TemporaryPath
-from .types import ConfigFileOrigin  # , Location
+from .types import ConfigFileOrigin, FileType  # , Location
 from .utils import debounce, getTemporaryFilename, logCalls, onNewReleaseFound
 
 _logger = logging.getLogger(__name__)
@@ -125,6 +131,28 @@ def checkerDiagToLspDict(diag: CheckerDiagnostic) -> Diagnostic:
     )
 
 
+def _getChangeOffsets(content: str, change_range: Range) -> Tuple[int, int]:
+    """
+    Converts the range of a change into offsets of content, the same way
+    pygls does when applying the change to its documents
+    """
+    lines = content.splitlines(True)
+    change_range = range_from_utf16(lines, change_range)
+
+    def _getOffset(position: Position) -> int:
+        if position.line >= len(lines):
+            return len(content)
+        return sum(len(line) for line in lines[: position.line]) + min(
+            position.character, len(lines[position.line])
+        )
+
+    # Changes starting after the last line are appended to the content
+    if change_range.start.line >= len(lines):
+        return len(content), len(content)
+
+    return _getOffset(change_range.start), _getOffset(change_range.end)
+
+
 class Server(HdlCheckerCore):
     """
     HDL Checker project builder class
@@ -168,6 +196,9 @@ class HdlCheckerLanguageServer(LanguageServer):
         self._global_diags: Set[CheckerDiagnostic] = set()
         self.initialization_options: Optional[Any] = None
         self.client_capabilities: Optional[ClientCapabilities] = None
+        # Parsers of VHDL documents open on the client, updated as they change
+        self._buffers: Dict[URI, VhdlBufferParser] = {}
+        self._buffers_lock = Lock()
 
     @property
     def checker(self) -> Server:
@@ -183,6 +214,14 @@ class HdlCheckerLanguageServer(LanguageServer):
             _logger.debug("Temporary server %s is ready", self._checker)
         return self._checker
 
+    def shutdown(self) -> None:
+        """
+        Stops the checker's executor before shutting down the server
+        """
+        if self._checker is not None:
+            self._checker.shutdown()
+        super().shutdown()
+
     def showInfo(self, msg: str) -> None:
         """
         Shorthand for self.show_message(msg, MessageType.Info)
@@ -210,6 +249,8 @@ class HdlCheckerLanguageServer(LanguageServer):
             return
 
         root_dir = to_fs_path(self.workspace.root_uri)
+        if self._checker is not None:
+            self._checker.shutdown(wait=False)
         self._checker = Server(self, root_dir=Path(root_dir))
 
         _logger.debug("Updating from %s, workspace=%s", options, self.workspace)
@@ -261,6 +302,56 @@ class HdlCheckerLanguageServer(LanguageServer):
 
         return path
 
+    def openBuffer(self, uri: URI) -> None:
+        """
+        Starts tracking the contents of a VHDL document so that its changes can
+        be parsed incrementally
+        """
+        path = Path(to_fs_path(uri))
+        try:
+            if FileType.fromPath(path) is not FileType.vhdl:
+                return
+        except UnknownTypeExtension:
+            return
+
+        with self._buffers_lock:
+            self._buffers[uri] = VhdlBufferParser(
+                path, self.workspace.get_document(uri).source
+            )
+
+    def updateBuffer(self, params: DidChangeTextDocumentParams) -> None:
+        """
+        Applies changes to the document's parser, if it's being tracked, so
+        that only the regions changed are parsed again
+        """
+        uri = params.textDocument.uri
+        with self._buffers_lock:
+            buffer = self._buffers.get(uri)
+            if buffer is None:
+                return
+
+            for change in params.contentChanges:
+                if getattr(change, "range", None) is None:
+                    buffer = VhdlBufferParser(buffer.filename, change.text)
+                else:
+                    start, end = _getChangeOffsets(
+                        buffer.getSourceContent(), change.range
+                    )
+                    buffer.applyChange(start, end, change.text)
+
+            # Document has the changes applied by pygls, both should match
+            source = self.workspace.get_document(uri).source
+            if buffer.getSourceContent() != source:
+                _logger.warning("Contents of %s differ, parsing it again", uri)
+                buffer = VhdlBufferParser(buffer.filename, source)
+
+            self._buffers[uri] = buffer
+
+    def closeBuffer(self, uri: URI) -> None:
+        "Stops tracking the contents of a document"
+        with self._buffers_lock:
+            self._buffers.pop(uri, None)
+
     @debounce(LINT_DEBOUNCE_S, keyed_by="uri")
     def lint(self, uri: URI, is_saved: bool) -> None:
         """
@@ -303,8 +394,17 @@ class HdlCheckerLanguageServer(LanguageServer):
 
         if is_saved:
             return self.checker.getMessagesByPath(path)
-        text = self.workspace.get_document(doc_uri).source
-        return self.checker.getMessagesWithText(path, text)
+
+        with self._buffers_lock:
+            buffer = self._buffers.get(doc_uri)
+            if buffer is None:
+                text = self.workspace.get_document(doc_uri).source
+                parse_result = None
+            else:
+                text = buffer.getSourceContent()
+                parse_result = compactParseResult(buffer)
+
+        return self.checker.getMessagesWithText(path, text, parse_result)
 
     def references(self, params: ReferenceParams) -> Optional[List[Location]]:
         "Tries to find references for the selected element"
@@ -557,13 +657,20 @@ def setupLanguageServerFeatures(server: HdlCheckerLanguageServer) -> None:
     @server.feature(TEXT_DOCUMENT_DID_CHANGE)
     def didChange(self: HdlCheckerLanguageServer, params: DidChangeTextDocumentParams):
         """Text document did change notification."""
+        self.updateBuffer(params)
         self.lint(params.textDocument.uri, False)
 
     @server.feature(TEXT_DOCUMENT_DID_OPEN)
     def didOpen(self: HdlCheckerLanguageServer, params: DidOpenTextDocumentParams):
         """Text document did change notification."""
+        self.openBuffer(params.textDocument.uri)
         self.lint(params.textDocument.uri, True)
 
+    @server.feature(TEXT_DOCUMENT_DID_CLOSE)
+    def didClose(self: HdlCheckerLanguageServer, params: DidCloseTextDocumentParams):
+        """Text document did close notification."""
+        self.closeBuffer(params.textDocument.uri)
+
     @server.feature(WORKSPACE_DID_CHANGE_CONFIGURATION)
     def didChangeConfiguration(
         self: HdlCheckerLanguageServer, settings: DidChangeConfigurationParams = None
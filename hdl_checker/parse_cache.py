@@ -0,0 +1,121 @@
+# This file is part of HDL Checker.
+#
+# Copyright (c) 2015 - 2019 suoto (Andre Souto)
+#
+# HDL Checker is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# HDL Checker is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with HDL Checker.  If not, see <http://www.gnu.org/licenses/>.
+"Persistent store of parse results keyed by the contents of the source"
+
+import hashlib
+import json
+import logging
+import os
+import os.path as p
+from typing import Optional
+
+from hdl_checker import __version__
+from hdl_checker.parser_utils import (  # pylint: disable=unused-import
+    CompactParseResult,
+    freezeCompactParseResult,
+)
+from hdl_checker.exceptions import UnknownTypeExtension
+from hdl_checker.path import Path  # pylint: disable=unused-import
+from hdl_checker.types import FileType
+from hdl_checker.utils import writeFileAtomically
+
+_logger = logging.getLogger(__name__)
+
+# Increment whenever parsers change in a way that affects their results, so
+# that entries stored by previous versions are not reused
+PARSER_VERSION = 2
+
+_CHUNK_SIZE = 1 << 16
+
+
+class ParseCache(object):
+    """
+    Stores results of parser_utils.parseSourceCompact on disk, keyed by a
+    digest of the source content, its file type and the parser version.
+    Results can be reused for any file of the same type with the same contents
+    regardless of its path or modification time, so touching files, switching
+    branches or cloning the project again doesn't require parsing sources whose
+    contents did not change
+    """
+
+    def __init__(self, path):
+        # type: (str) -> None
+        self.path = path
+        self._salt = "{}:{}\n".format(PARSER_VERSION, __version__).encode()
+
+    def __repr__(self):
+        return "{}(path={})".format(self.__class__.__name__, repr(self.path))
+
+    def getDigest(self, path):
+        # type: (Path) -> Optional[str]
+        """
+        Digest identifying the path's file type and contents or None if it
+        can't be read. Parsers depend on the file type (e.g. Verilog and
+        SystemVerilog), so the same contents may have different results
+        """
+        try:
+            filetype = FileType.fromPath(path)
+        except UnknownTypeExtension:
+            return None
+        digest = hashlib.sha1(self._salt)
+        digest.update("{}\n".format(filetype.value).encode())
+        try:
+            with open(path.name, "rb") as fd:
+                for chunk in iter(lambda: fd.read(_CHUNK_SIZE), b""):
+                    digest.update(chunk)
+        except (IOError, OSError):
+            return None
+        return digest.hexdigest()
+
+    def _getFilename(self, digest):
+        # type: (str) -> str
+        return p.join(self.path, digest[:2], digest[2:] + ".json")
+
+    def get(self, digest):
+        # type: (str) -> Optional[CompactParseResult]
+        "Gets the parse result stored for the digest, if any"
+        filename = self._getFilename(digest)
+        try:
+            with open(filename, "r") as fd:
+                return freezeCompactParseResult(json.loads(fd.read()))
+        except (IOError, OSError):
+            return None
+        except (ValueError, TypeError):
+            _logger.warning("Ignoring invalid parse cache entry %s", filename)
+            return None
+
+    def put(self, digest, result):
+        # type: (str, CompactParseResult) -> None
+        """
+        Stores the parse result for the digest. Entries are written to a
+        temporary file first so that readers never see partial entries
+        """
+        filename = self._getFilename(digest)
+        dirname = p.dirname(filename)
+        try:
+            if not p.exists(dirname):
+                os.makedirs(dirname)
+        except OSError:
+            # Might have been created by some other process in the meantime
+            if not p.isdir(dirname):
+                _logger.warning("Unable to create %s", dirname)
+                return
+
+        try:
+            writeFileAtomically(filename, json.dumps(result))
+        except (IOError, OSError):
+            _logger.warning("Unable to write parse cache entry %s", filename)
@@ -22,17 +22,45 @@ import os
 import os.path as p
 import subprocess as subp
 from glob import iglob as glob
-from typing import Any, Dict, Iterable, NamedTuple, Optional, Set, Tuple, Type, Union
+from multiprocessing import cpu_count, get_context
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    Union,
+)
 
 import six
 
+from .parsers.elements.dependency_spec import (
+    BaseDependencySpec,
+    IncludedPath,
+    RequiredDesignUnit,
+)
+from .parsers.elements.design_unit import (  # pylint: disable=unused-import
+    VerilogDesignUnit,
+    VhdlDesignUnit,
+    tAnyDesignUnit,
+)
+from .parsers.elements.identifier import (
+    Identifier,
+    VerilogIdentifier,
+    VhdlIdentifier,
+)
 from .parsers.verilog_parser import VerilogParser
 from .parsers.vhdl_parser import VhdlParser
 
 from hdl_checker import DEFAULT_PROJECT_FILE
 from hdl_checker.exceptions import UnknownTypeExtension
 from hdl_checker.path import Path
-from hdl_checker.types import BuildFlags, BuildFlagScope, FileType
+from hdl_checker.types import BuildFlags, BuildFlagScope, DesignUnitType, FileType
 from hdl_checker.utils import ON_WINDOWS, isFileReadable, toBytes
 
 _logger = logging.getLogger(__name__)
@@ -52,6 +80,208 @@ def getSourceParserFromPath(path):  # type: (Path) -> Union[VhdlParser, VerilogP
     return PARSERS[FileType.fromPath(path)](path)
 
 
+# Parse results as plain tuples, which are much cheaper to pickle than the
+# objects they describe and can be passed between processes. Identifiers are
+# (display name, case sensitive) pairs with interned names and locations are
+# (line, column) integer pairs
+CompactIdentifier = Tuple[str, bool]
+CompactLocations = Tuple[Tuple[Optional[int], Optional[int]], ...]
+CompactDesignUnit = Tuple[str, CompactIdentifier, CompactLocations]
+CompactDependency = Tuple[
+    bool, CompactIdentifier, Optional[CompactIdentifier], CompactLocations
+]
+CompactParseResult = Tuple[Tuple[CompactDesignUnit, ...], Tuple[CompactDependency, ...]]
+
+
+# Parsing sources on a process pool only pays off when each process gets
+# enough sources, fewer than twice this are parsed serially
+_MIN_SOURCES_PER_PARSE_JOB = 64
+
+# Parse processes are spawned instead of forked: the server runs several
+# threads and forking while one of them holds a lock (e.g. the logging one)
+# can leave the child process deadlocked
+_PARSE_POOL_START_METHOD = "spawn"
+
+
+def _compactIdentifier(identifier):
+    # type: (Identifier) -> CompactIdentifier
+    return six.moves.intern(identifier.display_name), identifier.case_sensitive
+
+
+def _expandIdentifier(compact):
+    # type: (CompactIdentifier) -> Identifier
+    display_name, case_sensitive = compact
+    if case_sensitive:
+        return VerilogIdentifier(six.moves.intern(display_name))
+    return VhdlIdentifier(six.moves.intern(display_name))
+
+
+def parseSourceCompact(name):
+    # type: (str) -> CompactParseResult
+    """
+    Parses the source at the given path name and returns its design units and
+    dependencies as plain tuples. Sources whose extensions are not known have
+    neither. Being a module level function of only picklable arguments, this
+    can be used on a process pool.
+    """
+    try:
+        return compactParseResult(getSourceParserFromPath(Path(name)))
+    except UnknownTypeExtension:
+        return (), ()
+
+
+def _getParsePool(jobs):
+    # type: (int) -> Any
+    "Starts a pool of jobs processes to parse sources on"
+    return get_context(_PARSE_POOL_START_METHOD).Pool(jobs)
+
+
+def parseSourcesCompact(names, jobs=None):
+    # type: (List[str], Optional[int]) -> Iterator[CompactParseResult]
+    """
+    Parses many sources, yielding the result of parseSourceCompact for each
+    of them in the same order names were given. Sources are parsed on a pool
+    of up to jobs processes (defaults to the number of CPUs) if there are
+    enough of them to make it worth the overhead of starting it
+    """
+    jobs = min(jobs or cpu_count(), len(names) // _MIN_SOURCES_PER_PARSE_JOB)
+
+    if jobs <= 1:
+        for name in names:
+            yield parseSourceCompact(name)
+        return
+
+    _logger.info("Parsing %d sources using %d processes", len(names), jobs)
+
+    pool = _getParsePool(jobs)
+    try:
+        for result in pool.imap(
+            parseSourceCompact, names, chunksize=max(1, len(names) // (jobs * 4))
+        ):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _freezeIdentifier(compact):
+    # type: (Any) -> CompactIdentifier
+    display_name, case_sensitive = compact
+    return six.moves.intern(display_name), case_sensitive
+
+
+def _compactLocations(locations):
+    # type: (Iterable[Any]) -> CompactLocations
+    return tuple((line, column) for line, column in locations)
+
+
+def freezeCompactParseResult(result):
+    # type: (Any) -> CompactParseResult
+    """
+    Converts a parse result that went through JSON (and had its tuples
+    turned into lists) back into tuples, interning names along the way
+    """
+    units, dependencies = result
+    return (
+        tuple(
+            (type_, _freezeIdentifier(name), _compactLocations(locations),)
+            for type_, name, locations in units
+        ),
+        tuple(
+            (
+                is_include,
+                _freezeIdentifier(name),
+                None if library is None else _freezeIdentifier(library),
+                _compactLocations(locations),
+            )
+            for is_include, name, library, locations in dependencies
+        ),
+    )
+
+
+def compactParseResult(src_parser):
+    # type: (Union[VhdlParser, VerilogParser]) -> CompactParseResult
+    "Design units and dependencies found by src_parser as plain tuples"
+    design_units = src_parser.getDesignUnits()
+    dependencies = src_parser.getDependencies()
+
+    return (
+        tuple(
+            (
+                unit.type_.value,
+                _compactIdentifier(unit.name),
+                _compactLocations(unit.locations),
+            )
+            for unit in design_units
+        ),
+        tuple(
+            (
+                isinstance(dependency, IncludedPath),
+                _compactIdentifier(dependency.name),
+                None
+                if dependency.library is None
+                else _compactIdentifier(dependency.library),
+                _compactLocations(dependency.locations),
+            )
+            for dependency in dependencies
+        ),
+    )
+
+
+def expandCompactParseResult(path, result, library=None):
+    # type: (Path, Tuple[Iterable[CompactDesignUnit], Iterable[CompactDependency]], Optional[Identifier]) -> Tuple[Set[tAnyDesignUnit], Set[BaseDependencySpec]]
+    """
+    Rebuilds design units and dependencies returned by parseSourceCompact,
+    using the given path as their owner. If set, library is used for
+    required design units that don't specify one.
+    """
+    compact_units, compact_dependencies = result
+
+    design_units = set()  # type: Set[tAnyDesignUnit]
+    for type_, name, locations in compact_units:
+        display_name, case_sensitive = name
+        if case_sensitive:
+            design_units.add(
+                VerilogDesignUnit(
+                    owner=path,
+                    type_=DesignUnitType(type_),
+                    name=six.moves.intern(display_name),
+                    locations=locations,
+                )
+            )
+        else:
+            design_units.add(
+                VhdlDesignUnit(
+                    owner=path,
+                    type_=DesignUnitType(type_),
+                    name=six.moves.intern(display_name),
+                    locations=locations,
+                )
+            )
+
+    dependencies = set()  # type: Set[BaseDependencySpec]
+    for is_include, name, dependency_library, locations in compact_dependencies:
+        if is_include:
+            dependencies.add(
+                IncludedPath(
+                    owner=path, name=_expandIdentifier(name), locations=locations
+                )
+            )
+        else:
+            dependencies.add(
+                RequiredDesignUnit(
+                    owner=path,
+                    name=_expandIdentifier(name),
+                    library=library
+                    if dependency_library is None
+                    else _expandIdentifier(dependency_library),
+                    locations=locations,
+                )
+            )
+
+    return design_units, dependencies
+
+
 def _makeAbsoluteIfNeeded(root, paths):
     # type: (str, Iterable[str]) -> Iterable[str]
     "Makes paths absolute by prepending root if needed"
@@ -18,8 +18,13 @@
 
 import abc
 import logging
+import mmap
+import os
 import os.path as p
-from typing import Any, Dict, Optional, Set
+import re
+from bisect import bisect_right
+from contextlib import contextmanager
+from typing import Any, Dict, Generator, List, Optional, Pattern, Set
 
 from .elements.dependency_spec import (
     BaseDependencySpec,
@@ -32,6 +37,150 @@ from hdl_checker.utils import HashableByKey, readFile, removeDuplicates
 
 _logger = logging.getLogger(__name__)
 
+_NEWLINE = re.compile("\n")
+_BYTES_NEWLINE = re.compile(b"\n")
+_NON_ASCII = re.compile(b"[\x80-\xff]")
+
+# Number of bytes StreamingLineIndex looks at in one go
+_STREAMING_CHUNK_SIZE = 1 << 20
+
+# Files this size or larger (in bytes) are memory mapped instead of read when
+# scanned as bytes
+MMAP_MIN_SIZE = 64 * 1024
+
+
+@contextmanager
+def openSourceBuffer(name):
+    # type: (str) -> Generator[Any, None, None]
+    """
+    Opens a file as a bytes-like object, memory mapping it if it's large
+    enough for that to pay off. The object can only be used within the
+    context, and objects referring to it (such as regex matches) must be
+    gone before leaving it
+    """
+    with open(name, "rb") as fd:
+        # Empty files can't be memory mapped
+        size = os.fstat(fd.fileno()).st_size
+        if not size or size < MMAP_MIN_SIZE:
+            yield fd.read()
+            return
+        buffer = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield buffer
+        finally:
+            buffer.close()
+
+
+def isAscii(buffer):
+    # type: (Any) -> bool
+    """
+    Checks if a bytes-like object only has ASCII chars, in which case offsets
+    of bytes and of decoded chars are the same
+    """
+    return _NON_ASCII.search(buffer) is None
+
+
+class LineIndex(object):
+    """
+    Table of the offsets where each line of a text starts, so that offsets can
+    be converted to line and column numbers without scanning the text that
+    comes before them. Text can also be an ASCII only bytes-like object
+    """
+
+    def __init__(self, text):
+        # type: (Any) -> None
+        if isinstance(text, str):
+            newline = _NEWLINE  # type: Pattern
+        else:
+            newline = _BYTES_NEWLINE
+        self._starts = [0]  # type: List[int]
+        self._starts.extend(match.end() for match in newline.finditer(text))
+
+    def getLine(self, offset):
+        # type: (int) -> int
+        "Line number (0 based) of the given offset"
+        return bisect_right(self._starts, offset) - 1
+
+    def getColumn(self, offset):
+        # type: (int) -> int
+        "Column number (0 based) of the given offset"
+        return offset - self._starts[self.getLine(offset)]
+
+    def getLineStart(self, line):
+        # type: (int) -> int
+        "Offset of the first char of the given line"
+        return self._starts[line]
+
+    def applyChange(self, start, end, text):
+        # type: (int, int, str) -> None
+        """
+        Updates the index after text[start:end] was replaced by text, so that
+        only the text inserted needs scanning
+        """
+        first = bisect_right(self._starts, start)
+        last = bisect_right(self._starts, end)
+        delta = len(text) - (end - start)
+        self._starts[first:] = (
+            [start + match.end() for match in _NEWLINE.finditer(text)]
+            + [offset + delta for offset in self._starts[last:]]
+        )
+
+
+class StreamingLineIndex(object):
+    """
+    Converts offsets of bytes-like objects (such as mmap objects) into line
+    and column numbers without keeping the offset of every line, so memory
+    use doesn't depend on the size of the text. The text is only looked at
+    between offsets queried, so these should be (mostly) increasing
+    """
+
+    def __init__(self, buffer, encoding="utf-8"):
+        # type: (Any, str) -> None
+        self._buffer = buffer
+        self._encoding = encoding
+        # Last offset seen, its line number and the offset of that line's
+        # first char
+        self._offset = 0
+        self._line = 0
+        self._line_start = 0
+
+    def _countLines(self, start, end):
+        # type: (int, int) -> int
+        "Number of line breaks between start and end, in bounded chunks"
+        count = 0
+        for chunk_start in range(start, end, _STREAMING_CHUNK_SIZE):
+            chunk_end = min(chunk_start + _STREAMING_CHUNK_SIZE, end)
+            count += self._buffer[chunk_start:chunk_end].count(b"\n")
+        return count
+
+    def _advance(self, offset):
+        # type: (int) -> None
+        if offset <= self._offset:
+            return
+        self._line += self._countLines(self._offset, offset)
+        line_break = self._buffer.rfind(b"\n", self._offset, offset)
+        if line_break != -1:
+            self._line_start = line_break + 1
+        self._offset = offset
+
+    def getLine(self, offset):
+        # type: (int) -> int
+        "Line number (0 based) of the given offset"
+        self._advance(offset)
+        if offset >= self._line_start:
+            return self._line
+        return self._line - self._countLines(offset, self._line_start)
+
+    def getColumn(self, offset):
+        # type: (int) -> int
+        "Column number (0 based) of the given offset, counted in chars"
+        self._advance(offset)
+        if offset >= self._line_start:
+            line_start = self._line_start
+        else:
+            line_start = self._buffer.rfind(b"\n", 0, offset) + 1
+        return len(self._buffer[line_start:offset].decode(self._encoding, "replace"))
+
 
 class BaseSourceFile(HashableByKey):  # pylint:disable=too-many-instance-attributes
     """
@@ -52,6 +201,9 @@ class BaseSourceFile(HashableByKey):  # pylint:disable=too-many-instance-attribu
         self._dependencies = None  # type: Optional[Set[BaseDependencySpec]]
         self._design_units = None  # type: Optional[Set[tAnyDesignUnit]]
         self._libraries = None
+        # Info derived from the content, such as the line index. Dropped along
+        # with the content and never serialized
+        self._content_info = {}  # type: Dict[str, Any]
 
     def __jsonEncode__(self):
         """
@@ -61,6 +213,7 @@ class BaseSourceFile(HashableByKey):  # pylint:disable=too-many-instance-attribu
         del state["_content"]
         del state["_design_units"]
         del state["_dependencies"]
+        del state["_content_info"]
         return state
 
     @classmethod
@@ -77,6 +230,7 @@ class BaseSourceFile(HashableByKey):  # pylint:disable=too-many-instance-attribu
         obj._dependencies = None  # pylint: disable=protected-access
         obj._design_units = None  # pylint: disable=protected-access
         obj._libraries = state["_libraries"]  # pylint: disable=protected-access
+        obj._content_info = {}  # pylint: disable=protected-access
 
         return obj
 
@@ -113,6 +267,7 @@ class BaseSourceFile(HashableByKey):  # pylint:disable=too-many-instance-attribu
             self._dependencies = None
             self._design_units = None
             self._libraries = None
+            self._content_info = {}
             self._cache = {}
 
     def getmtime(self):
@@ -137,6 +292,37 @@ class BaseSourceFile(HashableByKey):  # pylint:disable=too-many-instance-attribu
 
         return self._content
 
+    @contextmanager
+    def _openSourceBuffer(self):
+        # type: () -> Generator[Any, None, None]
+        """
+        Opens the source file as a bytes-like object (see openSourceBuffer)
+        so that it can be scanned without keeping a decoded copy of it
+        """
+        self._mtime = self.getmtime()
+        with openSourceBuffer(self.filename.name) as buffer:
+            yield buffer
+
+    def _canScanBuffer(self, buffer):
+        # type: (Any) -> bool
+        """
+        Checks if buffer can be scanned instead of the decoded content, which
+        is the case when it's ASCII only (as most HDL sources are) and the
+        content hasn't been read already
+        """
+        return self._content is None and isAscii(buffer)
+
+    def getLineIndex(self):
+        # type: () -> LineIndex
+        """
+        Line index of the source content, built once and shared by every
+        pass that needs to report locations
+        """
+        content = self.getSourceContent()
+        if "line_index" not in self._content_info:
+            self._content_info["line_index"] = LineIndex(content)
+        return self._content_info["line_index"]
+
     def _getSourceContent(self):
         # type: () -> str
         """
@@ -145,11 +331,16 @@ class BaseSourceFile(HashableByKey):  # pylint:disable=too-many-instance-attribu
         """
         return readFile(str(self.filename))
 
+    def _isAvailable(self):
+        # type: () -> bool
+        "Checks if there's any content to parse"
+        return p.exists(self.filename.name)
+
     def getDesignUnits(self):  # type: () -> Set[tAnyDesignUnit]
         """
         Cached version of the _getDesignUnits method
         """
-        if not p.exists(self.filename.name):
+        if not self._isAvailable():
             return set()
         self._clearCachesIfChanged()
         if self._design_units is None:
@@ -162,7 +353,7 @@ class BaseSourceFile(HashableByKey):  # pylint:disable=too-many-instance-attribu
         """
         Cached version of the _getDependencies method
         """
-        if not p.exists(self.filename.name):
+        if not self._isAvailable():
             return set()
 
         self._clearCachesIfChanged()
@@ -181,7 +372,7 @@ class BaseSourceFile(HashableByKey):  # pylint:disable=too-many-instance-attribu
         """
         Cached version of the _getLibraries method
         """
-        if not p.exists(self.filename.name):
+        if not self._isAvailable():
             return []
 
         self._clearCachesIfChanged()
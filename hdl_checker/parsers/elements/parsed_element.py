@@ -16,7 +16,7 @@
 # along with HDL Checker.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
-from typing import Iterable, Optional, Set
+from typing import Iterable, Optional, Set, Tuple
 import abc
 
 from hdl_checker.types import Location
@@ -24,7 +24,8 @@ from hdl_checker.utils import HashableByKey
 
 _logger = logging.getLogger(__name__)
 
-LocationList = Iterable[Location]
+# Anything that unpacks into (line, column), including Location itself
+LocationList = Iterable[Tuple[Optional[int], Optional[int]]]
 
 
 class ParsedElement(HashableByKey):
@@ -17,9 +17,20 @@
 "VHDL source file parser"
 
 import logging
+import os.path as p
 import re
 import string
-from typing import Any, Generator, Iterable, List, Tuple, Type
+from typing import (
+    Any,
+    Dict,
+    Generator,
+    Iterable,
+    List,
+    Optional,
+    Pattern,
+    Tuple,
+    Type,
+)
 
 from .elements.dependency_spec import (
     BaseDependencySpec,
@@ -29,7 +40,11 @@ from .elements.dependency_spec import (
 from .elements.design_unit import VerilogDesignUnit
 from .elements.parsed_element import Location
 
-from hdl_checker.parsers.base_parser import BaseSourceFile
+from hdl_checker.parsers.base_parser import (
+    BaseSourceFile,
+    LineIndex,
+    StreamingLineIndex,
+)
 from hdl_checker.parsers.elements.identifier import VerilogIdentifier
 from hdl_checker.types import DesignUnitType, FileType
 from hdl_checker.utils import readFile
@@ -40,7 +55,9 @@ _VERILOG_IDENTIFIER = "|".join(
     [r"[a-zA-Z_][a-zA-Z0-9_$]+", r"\\[%s]+(?=\s)" % string.printable.replace(" ", "")]
 )
 
-_COMMENT = r"(?:\/\*.*?\*\/|//[^(?:\r\n?|\n)]*)"
+# Block comments not terminated run until the end of the file (as they would
+# for a compiler), so that each '/*' doesn't scan the rest of the text again
+_COMMENT = r"(?:\/\*.*?(?:\*\/|\Z)|//[^(?:\r\n?|\n)]*)"
 
 
 # Design unit scanner
@@ -59,7 +76,7 @@ _DEPENDENCIES = re.compile(
     "|".join(
         [
             r"(?P<package>\b{0})\s*::\s*(?:{0}|\*)".format(_VERILOG_IDENTIFIER),
-            r"(\bvirtual\b)?\s*\bclass\s+(?:static|automatic)?(?P<class>\b{0})".format(
+            r"(?:\bvirtual\s+)?\bclass\s+(?:static|automatic)?(?P<class>\b{0})".format(
                 _VERILOG_IDENTIFIER
             ),
             r"(?<=`include\b)\s*\"(?P<include>.*?)\"",
@@ -69,6 +86,19 @@ _DEPENDENCIES = re.compile(
     flags=re.DOTALL,
 )
 
+# Files this size or larger (in bytes) are scanned as bytes whatever their
+# content, without keeping the offset of every line
+STREAMING_MIN_SIZE = 64 * 1024 * 1024
+
+# Scanners to use on the bytes of source files
+_BYTES_PATTERNS = {
+    pattern: re.compile(pattern.pattern.encode(), flags=re.DOTALL)
+    for pattern in (_DESIGN_UNITS, _DEPENDENCIES)
+}
+
+# Match groups, line and column where the match starts and line where it ends
+_Match = Tuple[Dict[str, Optional[str]], int, int, int]
+
 
 class VerilogParser(BaseSourceFile):
     """
@@ -84,26 +114,84 @@ class VerilogParser(BaseSourceFile):
         #  lines = _COMMENT.sub("", content)
         #  return re.sub(r"\r\n?|\n", " ", lines, flags=re.S)
 
+    def _isStreaming(self):
+        # type: () -> bool
+        """
+        Large files, such as post synthesis netlists, are scanned using a
+        StreamingLineIndex so that memory use doesn't depend on their size
+        """
+        try:
+            return p.getsize(self.filename.name) >= STREAMING_MIN_SIZE
+        except OSError:
+            return False
+
+    def _iterMatches(self, pattern):
+        # type: (Pattern) -> Generator[_Match, None, None]
+        """
+        Iterates over the matches of pattern against the source. The bytes of
+        the file are scanned directly where possible, so that only what's
+        matched needs decoding
+        """
+        with self._openSourceBuffer() as buffer:
+            if self._isStreaming():
+                _logger.debug("Streaming %s", self.filename)
+                line_index = StreamingLineIndex(buffer)  # type: Any
+            elif self._canScanBuffer(buffer):
+                line_index = LineIndex(buffer)
+            else:
+                line_index = None
+
+            if line_index is not None:
+                match = None
+                try:
+                    for match in _BYTES_PATTERNS[pattern].finditer(buffer):
+                        # Comments are matched only so that they're skipped
+                        if match.lastindex is None:
+                            continue
+                        groups = {
+                            key: None
+                            if value is None
+                            else value.decode("utf-8", "replace")
+                            for key, value in match.groupdict().items()
+                        }  # type: Dict[str, Optional[str]]
+                        start, end = match.span()
+                        yield (
+                            groups,
+                            line_index.getLine(start),
+                            line_index.getColumn(start),
+                            line_index.getLine(end),
+                        )
+                finally:
+                    # Matches refer to the buffer, which can't be closed while
+                    # they exist
+                    del match
+                return
+
+        content = self.getSourceContent()
+        line_index = self.getLineIndex()
+        for text_match in pattern.finditer(content):
+            if text_match.lastindex is None:
+                continue
+            yield (
+                text_match.groupdict(),
+                line_index.getLine(text_match.start()),
+                line_index.getColumn(text_match.start()),
+                line_index.getLine(text_match.end()),
+            )
+
     def _iterDesignUnitMatches(self):
         # type: (...) -> Any
         """
         Iterates over the matches of _DESIGN_UNITS against
         source's lines
         """
-        content = self.getSourceContent()
-        lines = content.split("\n")
-        for match in _DESIGN_UNITS.finditer(self.getSourceContent()):
-            start = match.start()
-            start_line = content[:start].count("\n")
-
-            total_chars_to_line_with_match = len("\n".join(lines[:start_line]))
-            start_char = match.start() - total_chars_to_line_with_match
+        for groups, start_line, start_column, _ in self._iterMatches(_DESIGN_UNITS):
+            # Columns are counted from the line break ending the previous line
+            start_char = start_column + (1 if start_line else 0)
 
-            yield match.groupdict(), {Location(start_line, start_char)}
+            yield groups, {Location(start_line, start_char)}
 
     def _getDependencies(self):  # type: () -> Iterable[BaseDependencySpec]
-        text = self.getSourceContent()
-
         match_groups = [
             ("include", IncludedPath)
         ]  # type: List[Tuple[str, Type[BaseDependencySpec]]]
@@ -115,9 +203,9 @@ class VerilogParser(BaseSourceFile):
                 ("class", RequiredDesignUnit),
             ]
 
-        for match in _DEPENDENCIES.finditer(text):
+        for groups, _, column_number, line_number in self._iterMatches(_DEPENDENCIES):
             for match_group, klass in match_groups:
-                name = match.groupdict().get(match_group, None)
+                name = groups.get(match_group, None)
                 # package 'std' seems to be built-in. Need to have a look a
                 # this if include_name is not None and include_name != 'std':
                 if match_group == "package" and name == "std":
@@ -127,9 +215,6 @@ class VerilogParser(BaseSourceFile):
                 if name is None:
                     continue
 
-                line_number = text[: match.end()].count("\n")
-                column_number = len(text[: match.start()].split("\n")[-1])
-
                 yield klass(
                     owner=self.filename,
                     name=VerilogIdentifier(name),
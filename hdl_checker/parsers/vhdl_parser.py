@@ -17,48 +17,202 @@
 "VHDL source file parser"
 
 import re
-from typing import Any, Dict, Generator, Iterable, Optional, Set, Tuple, Union
+from bisect import bisect_right
+from typing import (
+    Any,
+    Dict,
+    Generator,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
 from .elements.dependency_spec import RequiredDesignUnit
 from .elements.design_unit import VhdlDesignUnit
 from .elements.identifier import VhdlIdentifier
 from .elements.parsed_element import Location
 
-from hdl_checker.parsers.base_parser import BaseSourceFile
+from hdl_checker.parsers.base_parser import BaseSourceFile, LineIndex
+from hdl_checker.path import Path  # pylint: disable=unused-import
 from hdl_checker.types import DesignUnitType
 
-# Design unit scanner
-_DESIGN_UNITS = re.compile(
+# Single scanner for everything extracted from VHDL sources. Alternatives
+# never overlap, so a single pass finds the same as separate scans would.
+# Comments are matched (and ignored) so that nothing inside them is picked up.
+# Alternatives must not start with \s* or similar, otherwise a failed attempt
+# at each char of a long run of whitespaces scans the rest of the run again
+_SCANNER = re.compile(
     "|".join(
         [
+            r"\bpackage\s+body\s+(?P<package_body_name>\w+)\s+is\b",
             r"(?<=\bpackage\b)\s+(?P<package_name>\w+)(?=\s+is\b)",
             r"(?<=\bentity\b)\s+(?P<entity_name>\w+)(?=\s+is\b)",
-            r"(?<=\blibrary)\s+(?P<library_name>[\w,\s]+)\b",
             r"(?<=\bcontext\b)\s+(?P<context_name>\w+)(?=\s+is\b)",
-            r"(?P<comment>\s*--.*)",
+            r"\blibrary\s+(?P<libraries>[a-z]\w*(?:\s*,\s*[a-z]\w*){0,})\s*;",
+            r"(?P<library>\b\w+)\s*\.\s*(?P<unit>\b\w+\w+)",
+            r"(?P<comment>--.*)",
         ]
     ),
     flags=re.MULTILINE | re.IGNORECASE,
 )
 
-_LIBRARIES = re.compile(
-    r"(?:\blibrary\s+(?P<name>[a-z]\w*(?:\s*,\s*[a-z]\w*){0,})\s*;)|(?:\s*--.*)",
-    flags=re.MULTILINE | re.IGNORECASE,
+# Same scanner for ASCII only bytes, where offsets match those of the decoded
+# text
+_BYTES_SCANNER = re.compile(
+    _SCANNER.pattern.encode(), flags=re.MULTILINE | re.IGNORECASE
 )
 
-_PACKAGE_BODY = re.compile(
-    r"\bpackage\s+body\s+(?P<package_body_name>\w+)\s+is\b"
-    r"|"
-    r"(?P<comment>\s*--.*)",
-    flags=re.MULTILINE | re.IGNORECASE,
+_DESIGN_UNIT_GROUPS = {
+    "package_name": DesignUnitType.package,
+    "entity_name": DesignUnitType.entity,
+    "context_name": DesignUnitType.context,
+}
+
+# Scanner match stored as (start, end, group, value), where group is the name
+# of the last group matched and value is what's needed to build the scan
+# result (None for comments)
+_Token = Tuple[int, int, str, Any]
+
+# Everything the scanner found on a given content
+_ScanResult = NamedTuple(
+    "_ScanResult",
+    (
+        ("design_units", List[Tuple[str, DesignUnitType, Location]]),
+        ("libraries", Set[str]),
+        ("uses", List[Tuple[str, str, int, int]]),
+        ("package_bodies", List[Tuple[str, int, int]]),
+    ),
 )
 
-_LIBRARY_USES = re.compile(
-    r"(?:(?P<library>\b\w+)\s*\.\s*(?P<unit>\b\w+\w+))|(?:\s*--.*)", flags=re.I
-)
 IncompleteDependency = Dict[str, Union[str, Set[Any]]]
 
 
+def _scanTokens(content, pos=0):
+    # type: (str, int) -> Generator[_Token, None, None]
+    "Runs the scanner on content, starting at pos"
+    for match in _SCANNER.finditer(content, pos):
+        group = match.lastgroup
+        # Every alternative ends with a named group
+        assert group is not None
+        if group == "unit":
+            value = (match.group("library"), match.group("unit"))  # type: Any
+        elif group == "comment":
+            value = None
+        else:
+            value = match.group(group)
+        yield match.start(), match.end(), group, value
+
+
+def _scanBufferTokens(buffer):
+    # type: (Any) -> Generator[_Token, None, None]
+    """
+    Runs the scanner on an ASCII only bytes-like object, decoding only the
+    values of tokens
+    """
+    match = None
+    try:
+        for match in _BYTES_SCANNER.finditer(buffer):
+            # Group names are str even when scanning bytes
+            group = match.lastgroup  # type: Any
+            if group == "unit":
+                value = (
+                    match.group("library").decode("ascii"),
+                    match.group("unit").decode("ascii"),
+                )  # type: Any
+            elif group == "comment":
+                value = None
+            else:
+                value = match.group(group).decode("ascii")
+            yield match.start(), match.end(), group, value
+    finally:
+        # Matches refer to the buffer, which can't be closed while they exist
+        del match
+
+
+def _isInsideToken(tokens, starts, offset):
+    # type: (List[_Token], List[int], int) -> bool
+    "Checks if offset falls within any of the tokens, whose starts are given"
+    index = bisect_right(starts, offset) - 1
+    return index >= 0 and tokens[index][1] > offset
+
+
+def _rescanTokens(tokens, old_content, content, start, end, length):
+    # type: (List[_Token], str, str, int, int, int) -> List[_Token]
+    """
+    Updates tokens of old_content after old_content[start:end] was replaced by
+    length chars to give content. Only matches can't span a ';' outside of
+    comments, so scanning restarts after the last such ';' before the change
+    and stops at the first one after it, where old tokens are reused with
+    their offsets shifted
+    """
+    delta = length - (end - start)
+    starts = [token[0] for token in tokens]
+
+    # Find where to restart scanning from
+    restart = old_content.rfind(";", 0, start)
+    while restart != -1 and _isInsideToken(tokens, starts, restart):
+        restart = old_content.rfind(";", 0, restart)
+    restart += 1
+
+    result = tokens[: bisect_right(starts, restart - 1)]
+
+    new_end = start + length
+    last_end = restart
+    for token in _scanTokens(content, restart):
+        # Look for a ';' after the change that was not part of a token before
+        # nor is now, from which point on old tokens are still valid
+        sync = content.find(";", max(last_end, new_end), token[0])
+        while sync != -1:
+            if not _isInsideToken(tokens, starts, sync - delta):
+                return result + [
+                    (tk_start + delta, tk_end + delta, group, value)
+                    for tk_start, tk_end, group, value in tokens[
+                        bisect_right(starts, sync - delta) :
+                    ]
+                ]
+            sync = content.find(";", sync + 1, token[0])
+
+        result.append(token)
+        last_end = token[1]
+
+    return result
+
+
+def _buildScanResult(tokens, line_index):
+    # type: (Iterable[_Token], LineIndex) -> _ScanResult
+    "Converts tokens into a scan result, resolving their locations"
+    result = _ScanResult([], set(), [], [])
+
+    for start, end, group, value in tokens:
+        if group == "comment":
+            continue
+
+        if group == "unit":
+            library, unit = value
+            result.uses.append(
+                (library, unit, line_index.getLine(end), line_index.getColumn(start),)
+            )
+        elif group == "libraries":
+            result.libraries.update(x.strip() for x in value.split(","))
+        elif group == "package_body_name":
+            result.package_bodies.append(
+                (value, line_index.getLine(end), line_index.getColumn(start))
+            )
+        else:
+            start_line = line_index.getLine(start)
+            # Columns are counted from the line break ending the previous line
+            start_char = start - max(line_index.getLineStart(start_line) - 1, 0)
+            result.design_units.append(
+                (value, _DESIGN_UNIT_GROUPS[group], Location(start_line, start_char))
+            )
+
+    return result
+
+
 class _PartialDependency(object):  # pylint: disable=useless-object-inheritance
     """
     Stores dependencies definitions to create immutable objects later on
@@ -103,23 +257,42 @@ class VhdlParser(BaseSourceFile):
     units it depends on and design units it provides
     """
 
-    def _iterDesignUnitMatches(self):
-        # type: (...) -> Any
-        """
-        Iterates over the matches of _DESIGN_UNITS against
-        source's lines
-        """
+    def _getTokens(self):
+        # type: () -> List[_Token]
+        "Scanner matches of the source content"
         content = self.getSourceContent()
-        lines = content.split("\n")
-
-        for match in _DESIGN_UNITS.finditer(content):
-            start = match.start()
-            start_line = content[:start].count("\n")
-
-            total_chars_to_line_with_match = len("\n".join(lines[:start_line]))
-            start_char = match.start() - total_chars_to_line_with_match
+        if "tokens" not in self._content_info:
+            self._content_info["tokens"] = list(_scanTokens(content))
+        return self._content_info["tokens"]
 
-            yield match.groupdict(), {Location(start_line, start_char)}
+    def _scan(self):
+        # type: () -> _ScanResult
+        """
+        Scans the source content once, caching the result until the content
+        changes
+        """
+        self._clearCachesIfChanged()
+        result = self._content_info.get("scan", None)  # type: Optional[_ScanResult]
+        if result is None:
+            result = self._scanBuffer()
+            if result is None:
+                result = _buildScanResult(self._getTokens(), self.getLineIndex())
+            self._content_info["scan"] = result
+        return result
+
+    def _scanBuffer(self):
+        # type: () -> Optional[_ScanResult]
+        """
+        Scans the bytes of the source file directly, so that neither a copy of
+        its decoded content nor the tokens are kept. Returns None if the
+        content needs decoding to be scanned
+        """
+        if self._content is not None:
+            return None
+        with self._openSourceBuffer() as buffer:
+            if not self._canScanBuffer(buffer):
+                return None
+            return _buildScanResult(_scanBufferTokens(buffer), LineIndex(buffer))
 
     def _getDependencies(self):  # type: () -> Generator[RequiredDesignUnit, None, None]
         library_names = {x.lower() for x in self.getLibraries()}
@@ -127,24 +300,10 @@ class VhdlParser(BaseSourceFile):
 
         dependencies = _PartialDependency()
 
-        text = self.getSourceContent()
-
-        for match in _LIBRARY_USES.finditer(text):
-            if match.groupdict()["library"] is None:
-                continue
-
-            # Strip extra whitespaces and line breaks here instead of inside
-            # the regex to allow using a single finditer call
-            library = match.groupdict()["library"]
-
+        for library, unit, line_number, column_number in self._scan().uses:
             if library.lower() not in library_names:
                 continue
 
-            unit = match.groupdict()["unit"]
-
-            line_number = text[: match.end()].count("\n")
-            column_number = len(text[: match.start()].split("\n")[-1])
-
             dependencies.add(library, unit, line_number, column_number)
 
         # Done parsing, won't add any more locations, so generate the specs
@@ -157,16 +316,10 @@ class VhdlParser(BaseSourceFile):
 
         # Package bodies need a package declaration; include those as
         # dependencies as well
-        for match in _PACKAGE_BODY.finditer(self.getSourceContent()):
-            package_body_name = match.groupdict()["package_body_name"]
-            if package_body_name is None:
-                continue
-            line_number = int(text[: match.end()].count("\n"))
-            column_number = len(text[: match.start()].split("\n")[-1])
-
+        for body_name, line_number, column_number in self._scan().package_bodies:
             yield RequiredDesignUnit(
                 owner=self.filename,
-                name=VhdlIdentifier(package_body_name),
+                name=VhdlIdentifier(body_name),
                 library=None,
                 locations={Location(line_number, column_number)},
             )
@@ -176,44 +329,56 @@ class VhdlParser(BaseSourceFile):
         """
         Parses the source file to find design units and dependencies
         """
-        libs = set()  # type: Set[str]
-
-        for match in _LIBRARIES.finditer(self.getSourceContent()):
-            for group in match.groups():
-                if group is not None:
-                    libs = libs.union(set(map(str.strip, str(group).split(","))))
-
         # Replace references of 'work' for the actual library name
-        if "work" in libs:
-            libs = libs - {"work"}
-
-        return libs
+        return self._scan().libraries - {"work"}
 
     def _getDesignUnits(self):  # type: () -> Generator[VhdlDesignUnit, None, None]
         """
         Parses the source file to find design units and dependencies
         """
+        for name, type_, location in self._scan().design_units:
+            yield VhdlDesignUnit(
+                owner=self.filename, name=name, type_=type_, locations={location},
+            )
+
+
+class VhdlBufferParser(VhdlParser):
+    """
+    Parses the contents of an editor buffer instead of the file on disk.
+    Changes applied via applyChange only scan the region they affect again
+    """
 
-        for match, locations in self._iterDesignUnitMatches():
-            if match["package_name"] is not None:
-                yield VhdlDesignUnit(
-                    owner=self.filename,
-                    name=match["package_name"],
-                    type_=DesignUnitType.package,
-                    locations=locations,
-                )
-
-            elif match["entity_name"] is not None:
-                yield VhdlDesignUnit(
-                    owner=self.filename,
-                    name=match["entity_name"],
-                    type_=DesignUnitType.entity,
-                    locations=locations,
-                )
-            elif match["context_name"] is not None:
-                yield VhdlDesignUnit(
-                    owner=self.filename,
-                    name=match["context_name"],
-                    type_=DesignUnitType.context,
-                    locations=locations,
-                )
+    def __init__(self, filename, content):
+        # type: (Path, str) -> None
+        super(VhdlBufferParser, self).__init__(filename)
+        self._content = content
+
+    def _isAvailable(self):
+        # type: () -> bool
+        return True
+
+    def _clearCachesIfChanged(self):
+        # type: () -> None
+        # Content comes from the buffer, changes to the file don't affect it
+        pass
+
+    def applyChange(self, start, end, text):
+        # type: (int, int, str) -> None
+        "Replaces content[start:end] with text"
+        old_content = self.getSourceContent()
+        content = old_content[:start] + text + old_content[end:]
+        tokens = _rescanTokens(
+            self._getTokens(), old_content, content, start, end, len(text)
+        )
+
+        content_info = {"tokens": tokens}  # type: Dict[str, Any]
+        line_index = self._content_info.get("line_index", None)
+        if line_index is not None:
+            line_index.applyChange(start, end, text)
+            content_info["line_index"] = line_index
+
+        self._content = content
+        self._design_units = None
+        self._dependencies = None
+        self._libraries = None
+        self._content_info = content_info
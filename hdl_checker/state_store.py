@@ -0,0 +1,346 @@
+# This file is part of HDL Checker.
+#
+# Copyright (c) 2015 - 2019 suoto (Andre Souto)
+#
+# HDL Checker is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# HDL Checker is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with HDL Checker.  If not, see <http://www.gnu.org/licenses/>.
+"Project state stored in a SQLite database, with rows for each source"
+
+import json
+import logging
+import sqlite3
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from hdl_checker.parser_utils import expandCompactParseResult, freezeCompactParseResult
+from hdl_checker.parsers.elements.dependency_spec import (  # pylint: disable=unused-import
+    BaseDependencySpec,
+)
+from hdl_checker.parsers.elements.identifier import Identifier
+from hdl_checker.path import Path  # pylint: disable=unused-import
+from hdl_checker.serialization import StateEncoder, jsonObjectHook
+
+_logger = logging.getLogger(__name__)
+
+# Stores written with a different schema version are emptied when opened
+_SCHEMA_VERSION = 4
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    parse_result TEXT NOT NULL,
+    dependencies_library TEXT
+);
+CREATE TABLE IF NOT EXISTS libraries (
+    path TEXT PRIMARY KEY,
+    library TEXT NOT NULL,
+    inferred INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS flags (
+    path TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    flags TEXT NOT NULL,
+    PRIMARY KEY (path, scope)
+);
+CREATE TABLE IF NOT EXISTS design_units (
+    path TEXT NOT NULL,
+    name TEXT NOT NULL,
+    display_name TEXT NOT NULL,
+    case_sensitive INTEGER NOT NULL,
+    library TEXT
+);
+CREATE INDEX IF NOT EXISTS design_units_by_path ON design_units (path);
+CREATE INDEX IF NOT EXISTS design_units_by_name ON design_units (name);
+CREATE TABLE IF NOT EXISTS dependencies (
+    path TEXT NOT NULL,
+    name TEXT NOT NULL,
+    dependency TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS dependencies_by_path ON dependencies (path);
+CREATE INDEX IF NOT EXISTS dependencies_by_name ON dependencies (name);
+"""
+
+# Tables with rows for each source, all of them have a path column
+_SOURCE_TABLES = ("sources", "libraries", "flags", "design_units", "dependencies")
+
+SourceChanges = Iterable[Tuple[Path, Optional[Dict[str, Any]]]]
+
+
+def _encode(obj):
+    # type: (Any) -> str
+    return json.dumps(obj, cls=StateEncoder)
+
+
+def _decode(text):
+    # type: (str) -> Any
+    return json.loads(text, object_hook=jsonObjectHook)
+
+
+def _decodeRows(rows):
+    # type: (List[Tuple[str, str]]) -> Iterable[Tuple[str, Any]]
+    """
+    Decodes the second column of every row, which is a lot faster when done
+    with a single call
+    """
+    values = _decode("[{}]".format(",".join(value for _, value in rows)))
+    return zip((path for path, _ in rows), values)
+
+
+class StateStore(object):
+    """
+    Stores the project state in a SQLite database. Sources (along with their
+    compact parse results), their libraries and flags are kept on separate
+    tables with rows for each source, so that only sources that changed need
+    to be written. Design units and dependencies are also indexed by name, so
+    some lookups can be answered without loading every source (see
+    Database.fromStore)
+    """
+
+    def __init__(self, filename):
+        # type: (str) -> None
+        self.filename = filename
+        self._lock = Lock()
+        # The store is written to by a different thread than the one that
+        # created it, access is serialized by self._lock
+        self._connection = sqlite3.connect(filename, check_same_thread=False)
+        try:
+            self._createSchema()
+        except sqlite3.Error:
+            self._connection.close()
+            raise
+
+    def _createSchema(self):
+        # type: () -> None
+        "Creates the tables, dropping ones written with a different schema"
+        execute = self._connection.execute
+        if execute("PRAGMA user_version").fetchone()[0] != _SCHEMA_VERSION:
+            for table in ("state",) + _SOURCE_TABLES:
+                execute("DROP TABLE IF EXISTS {}".format(table))
+            execute("PRAGMA user_version = {}".format(_SCHEMA_VERSION))
+        self._connection.executescript(_SCHEMA)
+
+    def __repr__(self):
+        return "{}(filename={})".format(self.__class__.__name__, repr(self.filename))
+
+    def close(self):
+        # type: () -> None
+        "Closes the underlying connection"
+        with self._lock:
+            self._connection.close()
+
+    def getValue(self, key):
+        # type: (str) -> Any
+        "Gets the value stored with update for the given key, None if not found"
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value FROM state WHERE key = ?", (key,)
+            ).fetchone()
+        return None if row is None else _decode(row[0])
+
+    def update(self, changes=(), values=None, replace=False):
+        # type: (SourceChanges, Optional[Dict[str, Any]], bool) -> None
+        """
+        Writes changes to sources, as returned by
+        Database.popChangedSources, and values to be retrieved with getValue.
+        If replace is True, sources not included in changes are removed. All
+        of it is written in a single transaction
+        """
+        with self._lock, self._connection:
+            cursor = self._connection.cursor()
+            if values:
+                cursor.executemany(
+                    "INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)",
+                    ((key, _encode(value)) for key, value in values.items()),
+                )
+
+            changes = tuple(changes)
+            if replace:
+                for table in _SOURCE_TABLES:
+                    cursor.execute("DELETE FROM {}".format(table))
+            else:
+                names = tuple((path.name,) for path, _ in changes)
+                for table in _SOURCE_TABLES:
+                    cursor.executemany(
+                        "DELETE FROM {} WHERE path = ?".format(table), names
+                    )
+
+            for path, state in changes:
+                if state is not None:
+                    self._insertSource(cursor, path, state)
+
+        _logger.debug("Wrote %d source(s) to %s", len(changes), self.filename)
+
+    @staticmethod
+    def _insertSource(cursor, path, state):
+        # type: (sqlite3.Cursor, Path, Dict[str, Any]) -> None
+        "Inserts the rows describing a single source"
+        name = path.name
+        dependencies_library = state.get("dependencies_library", None)
+        cursor.execute(
+            "INSERT INTO sources "
+            "(path, source, mtime, parse_result, dependencies_library) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (
+                name,
+                _encode(path),
+                state["mtime"],
+                _encode(state["parse_result"]),
+                None
+                if dependencies_library is None
+                else _encode(dependencies_library),
+            ),
+        )
+
+        library = state.get("library", None)
+        if library is not None:
+            cursor.execute(
+                "INSERT INTO libraries (path, library, inferred) VALUES (?, ?, ?)",
+                (name, _encode(library), int(state["inferred"])),
+            )
+
+        cursor.executemany(
+            "INSERT INTO flags (path, scope, flags) VALUES (?, ?, ?)",
+            (
+                (name, scope, _encode(flags))
+                for scope, flags in state["flags"].items()
+                if flags
+            ),
+        )
+
+        units, dependencies = state["parse_result"]
+        cursor.executemany(
+            "INSERT INTO design_units "
+            "(path, name, display_name, case_sensitive, library) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (
+                (
+                    name,
+                    display_name.lower(),
+                    display_name,
+                    int(case_sensitive),
+                    None if library is None else _encode(library),
+                )
+                for _, (display_name, case_sensitive), _ in units
+            ),
+        )
+        cursor.executemany(
+            "INSERT INTO dependencies (path, name, dependency) VALUES (?, ?, ?)",
+            (
+                (name, dependency[1][0].lower(), _encode(dependency))
+                for dependency in dependencies
+            ),
+        )
+
+    def getSources(self):
+        # type: () -> List[Dict[str, Any]]
+        "Gets the state of all sources, as taken by Database.fromSources"
+        # Rows are only fetched while holding the lock, so that lookups made
+        # meanwhile aren't held up by decoding them
+        with self._lock:
+            execute = self._connection.execute
+            source_rows = execute(
+                "SELECT path, source, mtime, parse_result, dependencies_library "
+                "FROM sources"
+            ).fetchall()
+            library_rows = execute(
+                "SELECT path, library, inferred FROM libraries"
+            ).fetchall()
+            flags_rows = execute("SELECT path, scope, flags FROM flags").fetchall()
+
+        sources = {}  # type: Dict[str, Dict[str, Any]]
+        parse_results = []  # type: List[Tuple[str, str]]
+        for name, source, mtime, parse_result, dependencies_library in source_rows:
+            sources[name] = {"path": _decode(source), "mtime": mtime, "flags": {}}
+            if dependencies_library is not None:
+                sources[name]["dependencies_library"] = _decode(dependencies_library)
+            parse_results.append((name, parse_result))
+
+        for name, library, inferred in library_rows:
+            sources[name]["library"] = _decode(library)
+            sources[name]["inferred"] = bool(inferred)
+
+        for name, scope, flags in flags_rows:
+            sources[name]["flags"][scope] = tuple(_decode(flags))
+
+        for name, parse_result in _decodeRows(parse_results):
+            sources[name]["parse_result"] = parse_result
+
+        return list(sources.values())
+
+    def getPathsDefining(self, name, library=None):
+        # type: (Identifier, Optional[Identifier]) -> Set[Path]
+        """
+        Gets the paths defining a design unit with the given name from the
+        design_units index. Like Database.getPathsDefining, paths whose
+        library is not the one given are only left out if any other path
+        matches it
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT sources.source, design_units.display_name, "
+                "design_units.case_sensitive, design_units.library "
+                "FROM design_units JOIN sources ON sources.path = design_units.path "
+                "WHERE design_units.name = ?",
+                (name.name,),
+            ).fetchall()
+
+        units = [
+            (source, unit_library)
+            for source, display_name, case_sensitive, unit_library in rows
+            if Identifier(display_name, bool(case_sensitive)) == name
+        ]
+        if library is not None:
+            units = [
+                (source, unit_library)
+                for source, unit_library in units
+                if unit_library is not None and _decode(unit_library) == library
+            ] or units
+
+        return {_decode(source) for source, _ in units}
+
+    def getDependenciesByName(self, name):
+        # type: (Identifier) -> Set[BaseDependencySpec]
+        "Gets the dependencies referring to the given name from their index"
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT sources.source, sources.dependencies_library, "
+                "dependencies.dependency "
+                "FROM dependencies JOIN sources ON sources.path = dependencies.path "
+                "WHERE dependencies.name = ?",
+                (name.name,),
+            ).fetchall()
+
+        result = set()  # type: Set[BaseDependencySpec]
+        for source, library, dependency in rows:
+            _, dependencies = expandCompactParseResult(
+                _decode(source),
+                freezeCompactParseResult(((), (_decode(dependency),))),
+                None if library is None else _decode(library),
+            )
+            result.update(x for x in dependencies if x.name == name)
+        return result
+
+    def getLibrary(self, path):
+        # type: (Path) -> Optional[Identifier]
+        "Gets the library stored for the given path, if any"
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT library FROM libraries WHERE path = ?", (path.name,)
+            ).fetchone()
+        return None if row is None else _decode(row[0])
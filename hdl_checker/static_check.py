@@ -18,18 +18,24 @@
 
 import logging
 import re
-from typing import List, Tuple
+from collections import Counter
+from typing import List, Optional, Tuple
 
 #  from hdl_checker.path import Path
+from hdl_checker import STATIC_CHECK_TIME_BUDGET
 from hdl_checker.diagnostics import (
     DiagType,
     LibraryShouldBeOmited,
     ObjectIsNeverUsed,
     StaticCheckerDiag,
 )
+from hdl_checker.utils import TimeBudget
 
 _logger = logging.getLogger(__name__)
 
+# Patterns below are applied to every line and must take linear time even on
+# malformed input: groups of names start with a non blank char so that they
+# can't compete with the surrounding \s* for the same whitespace
 _GET_SCOPE = re.compile(
     "|".join(
         [
@@ -45,8 +51,8 @@ _GET_SCOPE = re.compile(
 _NO_SCOPE_OBJECTS = re.compile(
     "|".join(
         [
-            r"^\s*library\s+(?P<library>[\w\s,]+)",
-            r"^\s*attribute\s+(?P<attribute>[\w\s,]+)\s*:",
+            r"^\s*library\s+(?P<library>[\w,][\w\s,]*)",
+            r"^\s*attribute\s+(?P<attribute>[\w,][\w\s,]*):",
         ]
     ),
     flags=re.I,
@@ -55,8 +61,8 @@ _NO_SCOPE_OBJECTS = re.compile(
 _ENTITY_OBJECTS = re.compile(
     "|".join(
         [
-            r"^\s*(?P<port>[\w\s,]+)\s*:\s*(in|out|inout|buffer|linkage)\s+\w+",
-            r"^\s*(?P<generic>[\w\s,]+)\s*:\s*\w+",
+            r"^\s*(?P<port>[\w,][\w\s,]*):\s*(in|out|inout|buffer|linkage)\s+\w+",
+            r"^\s*(?P<generic>[\w,][\w\s,]*):\s*\w+",
         ]
     ),
     flags=re.I,
@@ -65,10 +71,10 @@ _ENTITY_OBJECTS = re.compile(
 _ARCH_OBJECTS = re.compile(
     "|".join(
         [
-            r"^\s*constant\s+(?P<constant>[\w\s,]+)\s*:",
-            r"^\s*signal\s+(?P<signal>[\w,\s]+)\s*:",
+            r"^\s*constant\s+(?P<constant>[\w,][\w\s,]*):",
+            r"^\s*signal\s+(?P<signal>[\w,][\w\s,]*):",
             r"^\s*type\s+(?P<type>\w+)\s*:",
-            r"^\s*shared\s+variable\s+(?P<shared_variable>[\w\s,]+)\s*:",
+            r"^\s*shared\s+variable\s+(?P<shared_variable>[\w,][\w\s,]*):",
         ]
     ),
     flags=re.I,
@@ -80,13 +86,22 @@ _SHOULD_END_SCAN = re.compile(
             r"\bgeneric\s+map",
             r"\bport\s+map",
             r"\bgenerate\b",
-            r"\w+\s*:\s*entity",
+            r"\b\w+\s*:\s*entity",
             r"\bprocess\b",
         ]
     )
 ).search
 
 
+def _stripComment(line):
+    # type: (str) -> str
+    "Removes the comment from line along with the whitespaces preceding it"
+    index = line.find("--")
+    if index == -1:
+        return line
+    return line[:index].rstrip()
+
+
 def _getAreaFromMatch(dict_):  # pylint: disable=inconsistent-return-statements
     """
     Returns code area based on the match dict
@@ -103,28 +118,31 @@ def _getAreaFromMatch(dict_):  # pylint: disable=inconsistent-return-statements
     assert False, "Can't determine area from {}".format(dict_)  # pragma: no cover
 
 
-def _getObjectsFromText(lines):
+def _getObjectsFromText(lines, budget=None):
     """
     Converts the iterator from _findObjects into a dict, whose key is the
     object's name and the value if the object's info
     """
     objects = {}
-    for name, info in _findObjects(lines):
+    for name, info in _findObjects(lines, budget or TimeBudget(None)):
         if name not in objects:
             objects[name] = info
 
     return objects
 
 
-def _findObjects(lines):
+def _findObjects(lines, budget):
     """
     Returns an iterator with the object name and a dict with info about its
-    location
+    location. Stops early if the budget runs out
     """
     lnum = 0
     area = None
     for _line in lines:
-        line = re.sub(r"\s*--.*", "", _line)
+        if budget.exhausted:
+            _logger.warning("Static check ran out of time at line %d", lnum)
+            break
+        line = _stripComment(_line)
         for match in _GET_SCOPE(line):
             area = _getAreaFromMatch(match.groupdict())
 
@@ -164,39 +182,40 @@ def _findObjects(lines):
             break
 
 
+_WORDS = re.compile(r"\w+").findall
+
+
 def _getUnusedObjects(lines, objects):
     """Generator that yields objects that are only found once at the
     given buffer and thus are considered unused (i.e., we only found
     its declaration"""
 
-    text = ""
-    for line in lines:
-        text += re.sub(r"\s*--.*", "", line) + " "
+    # Count every word once instead of searching the text for each object
+    counts = Counter(
+        word.lower() for line in lines for word in _WORDS(_stripComment(line))
+    )
 
     for _object in objects:
-        r_len = 0
-        single = True
-        for _ in re.finditer(r"\b%s\b" % _object, text, flags=re.I):
-            r_len += 1
-            if r_len > 1:
-                single = False
-                break
-        if single:
+        if counts[_object.lower()] <= 1:
             yield _object
 
 
 __COMMENT_TAG_SCANNER__ = re.compile(
-    "|".join([r"\s*--\s*(?P<tag>TODO|FIXME|XXX)\s*:\s*(?P<text>.*)"])
+    "|".join([r"--\s*(?P<tag>TODO|FIXME|XXX)\s*:\s*(?P<text>.*)"])
 )
 
 
-def _getCommentTags(lines):
+def _getCommentTags(lines, budget=None):
     """
     Generates diags from 'TODO', 'FIXME' and 'XXX' tags
     """
+    budget = budget or TimeBudget(None)
     result = []
     lnum = 0
     for line in lines:
+        if budget.exhausted:
+            _logger.warning("Static check ran out of time at line %d", lnum)
+            break
         lnum += 1
         line_lc = line.lower()
         skip_line = True
@@ -236,10 +255,17 @@ def _getMiscChecks(objects):
             )
 
 
-def getStaticMessages(lines):
-    # type: (Tuple[str, ...]) -> List[StaticCheckerDiag]
-    "VHDL static checking"
-    objects = _getObjectsFromText(lines)
+def getStaticMessages(lines, budget=None):
+    # type: (Tuple[str, ...], Optional[TimeBudget]) -> List[StaticCheckerDiag]
+    """
+    VHDL static checking. Checks that don't complete within the budget
+    (STATIC_CHECK_TIME_BUDGET seconds by default) report only what they found
+    until then
+    """
+    if budget is None:
+        budget = TimeBudget(STATIC_CHECK_TIME_BUDGET)
+
+    objects = _getObjectsFromText(lines, budget)
 
     result = []  # type: List[StaticCheckerDiag]
 
@@ -254,7 +280,7 @@ def getStaticMessages(lines):
             )
         ]
 
-    return result + _getCommentTags(lines) + list(_getMiscChecks(objects))
+    return result + _getCommentTags(lines, budget) + list(_getMiscChecks(objects))
 
 
 def standalone():  # pragma: no cover
@@ -387,11 +387,13 @@ def writeListToFile(filename, _list):  # pragma: no cover
         _logger.debug("%2d | %s", i + 1, line)
 
 
+# Paths are only needed when running tests, use .get so that helpers here can
+# be imported elsewhere (e.g., benchmarks)
 if not ON_WINDOWS:
     TEST_ENVS = {
-        "ghdl": os.environ["GHDL_PATH"],
-        "msim": os.environ["MODELSIM_PATH"],
-        "xvhdl": os.environ["XSIM_PATH"],
+        "ghdl": os.environ.get("GHDL_PATH"),
+        "msim": os.environ.get("MODELSIM_PATH"),
+        "xvhdl": os.environ.get("XSIM_PATH"),
         "fallback": None,
     }
 else:
@@ -24,8 +24,11 @@ import logging
 import os
 import os.path as p
 import shutil
+import sqlite3
 import tempfile
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pprint import pformat
 
 from mock import patch
@@ -57,6 +60,7 @@ from hdl_checker.diagnostics import (
     PathNotInProjectFile,
     UnresolvedDependency,
 )
+from hdl_checker.parser_utils import parseSourceCompact
 from hdl_checker.parsers.elements.dependency_spec import RequiredDesignUnit
 from hdl_checker.parsers.elements.identifier import Identifier
 from hdl_checker.path import Path
@@ -69,6 +73,7 @@ from hdl_checker.types import (
     RebuildPath,
     RebuildUnit,
 )
+from hdl_checker.state_store import StateStore
 from hdl_checker.utils import removeIfExists
 
 _logger = logging.getLogger(__name__)
@@ -255,6 +260,16 @@ with such.A("hdl_checker project") as it:
             it.project._recoverCacheIfPossible()
             it.assertIsNone(it.project.config_file)
 
+        @it.should("parse sources using the given number of jobs")  # type: ignore
+        def test():
+            project = DummyServer(Path(TEST_PROJECT), parse_jobs=3)
+            it.assertEqual(project.database._parse_jobs, 3)
+
+            # Recovering the cache must keep the setting as well
+            project._saveCache()
+            project._recoverCacheIfPossible()
+            it.assertEqual(project.database._parse_jobs, 3)
+
         @it.should("still report static messages")  # type: ignore
         @patch(
             "hdl_checker.core.getStaticMessages",
@@ -339,9 +354,80 @@ with such.A("hdl_checker project") as it:
                 library="some_lib", design_units=[{"name": "target", "type": "entity"}]
             )
 
-            with patch("hdl_checker.core.json.dump", spec=json.dump) as func:
+            with patch.object(it.project, "_saveCache") as save_cache:
                 it.project.getMessagesByPath(source.filename)
-                func.assert_called_once()
+                timer = it.project._cache_save_timer
+                it.assertIsNotNone(timer)
+
+                # Saving happens later, further requests are coalesced
+                it.project.getMessagesByPath(source.filename)
+                it.assertIs(it.project._cache_save_timer, timer)
+                save_cache.assert_not_called()
+
+                # Shutting down should save pending changes
+                it.project.shutdown()
+                save_cache.assert_called_once()
+                it.assertIsNone(it.project._cache_save_timer)
+
+        @it.should("not write to the cache after cleaning up")  # type: ignore
+        def test():
+            source = _SourceMock(
+                library="some_lib", design_units=[{"name": "target", "type": "entity"}]
+            )
+
+            it.project.getMessagesByPath(source.filename)
+            timer = it.project._cache_save_timer
+            it.assertIsNotNone(timer)
+
+            # Same sequence used when rebuilding a project
+            it.project.clean()
+            it.assertIsNone(it.project._cache_save_timer)
+            it.assertFalse(timer.is_alive())
+            it.project.shutdown(wait=False)
+
+            it.assertFalse(p.exists(str(it.project.work_dir)))
+
+            # Setting up the project again allows saving
+            it.project.getMessagesByPath(source.filename)
+            it.assertIsNotNone(it.project._cache_save_timer)
+            it.project.shutdown()
+            it.assertTrue(p.exists(it.project._getCacheFilename().name))
+
+        @it.should("only write to the cache when the state changes")  # type: ignore
+        def test():
+            it.project._saveCache()
+            store = it.project._getStateStore()
+            with patch.object(store, "update", wraps=store.update) as update:
+                it.project._saveCache()
+                update.assert_not_called()
+
+                config_file = it.project.config_file
+                it.project.config_file = config_file._replace(last_read=0)
+                try:
+                    it.project._saveCache()
+                    update.assert_called_once()
+                    # Only the config file changed, so no source is written
+                    it.assertEqual(tuple(update.call_args[0][0]), ())
+                finally:
+                    it.project.config_file = config_file
+
+            store = StateStore(it.project._getCacheFilename().name)
+            try:
+                it.assertEqual(store.getValue("__version__"), hdl_checker.__version__)
+            finally:
+                store.close()
+
+        @it.should("only write sources that changed to the cache")  # type: ignore
+        def test():
+            it.project._saveCache()
+            path = next(iter(it.project.database.paths))
+            it.project.database._updateParseTimestamp(path)
+
+            store = it.project._getStateStore()
+            with patch.object(store, "update", wraps=store.update) as update:
+                it.project._saveCache()
+                update.assert_called_once()
+                it.assertEqual([x for x, _ in update.call_args[0][0]], [path])
 
         @it.should("restore state from a saved cache")  # type: ignore
         @patchClassMap(MockBuilder=MockBuilder)
@@ -370,8 +456,8 @@ with such.A("hdl_checker project") as it:
 
         @it.should("not recover cache if versions differ")  # type: ignore
         @patchClassMap(MockBuilder=MockBuilder)
-        @patch("hdl_checker.core.json.load", return_value={"__version__": None})
-        def test(json_load):
+        @patch("hdl_checker.core.StateStore.getValue", return_value=None)
+        def test(get_value):
             source = _SourceMock(
                 library="some_lib", design_units=[{"name": "target", "type": "entity"}]
             )
@@ -381,7 +467,7 @@ with such.A("hdl_checker project") as it:
             # Set state must only be called when recovering from cache
             with patch.object(it.project, "_setState") as set_state:
                 it.project._recoverCacheIfPossible()
-                json_load.assert_called_once()
+                get_value.assert_called_once_with("__version__")
                 set_state.assert_not_called()
 
         @it.should("clean up and reparse if the config file changes")  # type: ignore
@@ -412,6 +498,7 @@ with such.A("hdl_checker project") as it:
         @patch("hdl_checker.tests.DummyServer._handleUiWarning")
         def test(handle_ui_warning):
             it.project._saveCache()
+            it.project.shutdown()
             # Copy parameters of the object we're checking against
             root_dir = it.project.root_dir
             cache_filename = it.project._getCacheFilename()
@@ -424,15 +511,46 @@ with such.A("hdl_checker project") as it:
 
             handle_ui_warning.assert_called_once_with(
                 "Unable to recover cache from '{}': "
-                "Expecting value: line 1 column 1 (char 0)".format(cache_filename)
+                "file is not a database".format(cache_filename)
             )
+            # Corrupted file should be removed so that it can be written again
+            it.assertFalse(p.exists(cache_filename.name))
 
             it.assertIsInstance(project.builder, Fallback)
 
+        @it.should("warn when failing to load sources from cache")  # type: ignore
+        @patchClassMap(MockBuilder=MockBuilder)
+        @patch("hdl_checker.tests.DummyServer._handleUiWarning")
+        def test(handle_ui_warning):
+            it.assertTrue(it.project.database.paths)
+            it.project._saveCache()
+            it.project.shutdown()
+            root_dir = it.project.root_dir
+            cache_filename = it.project._getCacheFilename()
+
+            # Corrupt only the sources, which are loaded in the background
+            connection = sqlite3.connect(cache_filename.name)
+            with connection:
+                connection.execute("UPDATE sources SET parse_result = 'corrupted'")
+            connection.close()
+
+            project = DummyServer(root_dir)
+            project._database._loader.join()
+
+            handle_ui_warning.assert_called_once()
+            it.assertIn(
+                "Unable to recover cache from '{}'".format(cache_filename),
+                handle_ui_warning.call_args[0][0],
+            )
+            it.assertFalse(p.exists(cache_filename.name))
+            # Sources are gone, so the config file must be parsed again
+            it.assertFalse(project._database.paths)
+            it.assertEqual(project.config_file.last_read, 0)
+
         @it.should("get builder messages by path")  # type: ignore
         # Avoid saving to cache because the patched method is not JSON
         # serializable
-        @patch("hdl_checker.core.json.dump")
+        @patch("hdl_checker.core.HdlCheckerCore._scheduleCacheSave")
         def test(_):
             with PatchBuilder():
                 it.project.setConfig(
@@ -582,9 +700,7 @@ with such.A("hdl_checker project") as it:
             "warn when unable to recreate a builder described in cache"
         )
         @linuxOnly
-        @patch(
-            "hdl_checker.core.getBuilderByName", new=lambda name: FailingBuilder
-        )
+        @patch("hdl_checker.core.getBuilderByName", new=lambda name: FailingBuilder)
         def test():
             cache_content = {"builder": FailingBuilder.builder_name}
 
@@ -681,6 +797,109 @@ with such.A("hdl_checker project") as it:
                 diagnostics,
             )
 
+        @it.should("reuse the same executor across requests")  # type: ignore
+        def test():
+            filename = Path(p.join(TEST_PROJECT, "another_library", "foo.vhd"))
+            it.project.shutdown()
+
+            with patch(
+                "hdl_checker.core.ThreadPoolExecutor", side_effect=ThreadPoolExecutor
+            ) as executor:
+                first = it.project.getMessagesByPath(filename)
+                second = it.project.getMessagesByPath(filename)
+                executor.assert_called_once_with(
+                    max_workers=it.project._DEFAULT_WORKERS
+                )
+
+                # Shutting down should not prevent further requests
+                it.project.shutdown()
+                it.assertEqual(it.project.getMessagesByPath(filename), first)
+                it.assertEqual(executor.call_count, 2)
+
+            it.assertEqual(first, second)
+
+        @it.should("build independent dependencies concurrently")  # type: ignore
+        def test():
+            # Sources on the same library are not built at the same time, so
+            # use a different library for each
+            level = tuple(
+                (
+                    Identifier("library_%d" % index),
+                    Path(p.join(TEST_PROJECT, "basic_library", name)),
+                )
+                for index, name in enumerate(
+                    (
+                        "clock_divider.vhd",
+                        "package_with_constants.vhd",
+                        "very_common_pkg.vhd",
+                    )
+                )
+            )
+            # Make sure all paths are built, errors keep them from being
+            # stamped again
+            for _, path in level:
+                it.project.builder._getBuildStamps().remove(path)
+
+            caller = threading.current_thread()
+            threads = {}
+            # Builds wait until all of them are running
+            barrier = threading.Barrier(len(level), timeout=10)
+
+            def _buildAndGetDiagnostics(_, path, library, flags):
+                threads[path] = threading.current_thread()
+                if threads[path] is not caller:
+                    barrier.wait()
+                return {CheckerDiagnostic(text=str(library), filename=path)}, set()
+
+            with patch.object(
+                MockBuilder, "_buildAndGetDiagnostics", _buildAndGetDiagnostics
+            ):
+                with patch.object(it.project, "_build_jobs", 1):
+                    serial = set(it.project._buildDependencies(level))
+                    it.assertEqual(set(threads.values()), {caller})
+
+                threads.clear()
+                with patch.object(it.project, "_build_jobs", len(level)):
+                    concurrent = set(it.project._buildDependencies(level))
+                    it.assertNotIn(caller, threads.values())
+
+            it.assertEqual(
+                serial, {CheckerDiagnostic(text=str(x), filename=y) for x, y in level},
+            )
+            it.assertEqual(concurrent, serial)
+
+        @it.should("build dependencies on the caller's freshness epoch")  # type: ignore
+        def test():
+            level = tuple(
+                (
+                    Identifier("library_%d" % index),
+                    Path(p.join(TEST_PROJECT, "basic_library", name)),
+                )
+                for index, name in enumerate(
+                    ("clock_divider.vhd", "package_with_constants.vhd")
+                )
+            )
+            for _, path in level:
+                it.project.builder._getBuildStamps().remove(path)
+
+            database = it.project.database
+            epochs = []
+
+            def _buildAndGetDiagnostics(_, path, library, flags):
+                epochs.append((database._epoch.depth, database._epoch.mtimes))
+                return set(), set()
+
+            with patch.object(
+                MockBuilder, "_buildAndGetDiagnostics", _buildAndGetDiagnostics
+            ), patch.object(it.project, "_build_jobs", len(level)):
+                with database.freshnessEpoch() as mtimes:
+                    list(it.project._buildDependencies(level))
+
+            it.assertEqual(len(epochs), len(level))
+            for depth, build_mtimes in epochs:
+                it.assertTrue(depth)
+                it.assertIs(build_mtimes, mtimes)
+
         @it.should("get messages with text")  # type: ignore
         def test():
             it.assertTrue(it.project.database.paths)
@@ -723,6 +942,23 @@ with such.A("hdl_checker project") as it:
 
             it.assertCountEqual(diagnostics, expected)
 
+        @it.should("parse identical buffers only once")  # type: ignore
+        def test():
+            filename = Path(p.join(TEST_PROJECT, "another_library", "foo.vhd"))
+            content = open(filename.name, "r").read() + "\n-- parse only once"
+
+            with patch(
+                "hdl_checker.core.parseSourceCompact", side_effect=parseSourceCompact
+            ) as parse:
+                first = set(it.project.getMessagesWithText(filename, content))
+                second = set(it.project.getMessagesWithText(filename, content))
+                parse.assert_called_once()
+
+                it.project.getMessagesWithText(filename, content + "\n")
+                it.assertEqual(parse.call_count, 2)
+
+            it.assertEqual(first, second)
+
         @it.should(  # type: ignore
             "get messages with text for file outside the project file"
         )
@@ -749,6 +985,29 @@ with such.A("hdl_checker project") as it:
 
             it.assertIn(PathNotInProjectFile(filename), diagnostics)
 
+        @it.should(  # type: ignore
+            "parse identical buffers outside the project file only once"
+        )
+        def test():
+            filename = Path(p.join(TEST_TEMP_PATH, "some_file.vhd"))
+            writeListToFile(str(filename), ["entity some_entity is end;"])
+
+            content = "\n".join(
+                ["library work;", "use work.all;", "entity other_entity is end;"]
+            )
+
+            with patch(
+                "hdl_checker.core.parseSourceCompact", side_effect=parseSourceCompact
+            ) as parse, patch(
+                "hdl_checker.database.parseSourceCompact", side_effect=AssertionError
+            ):
+                first = set(it.project.getMessagesWithText(filename, content))
+                second = set(it.project.getMessagesWithText(filename, content))
+                parse.assert_called_once()
+
+            it.assertEqual(first, second)
+            it.assertIn(PathNotInProjectFile(filename), first)
+
         @it.should("get updated messages")  # type: ignore
         def test():
             filename = Path(p.join(TEST_PROJECT, "another_library", "foo.vhd"))
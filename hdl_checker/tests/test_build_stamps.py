@@ -0,0 +1,220 @@
+# This file is part of HDL Checker.
+#
+# Copyright (c) 2015 - 2019 suoto (Andre Souto)
+#
+# HDL Checker is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# HDL Checker is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with HDL Checker.  If not, see <http://www.gnu.org/licenses/>.
+# pylint: disable=missing-docstring
+# pylint: disable=protected-access
+
+import logging
+import os.path as p
+import time
+from typing import List
+
+from mock import patch
+
+from hdl_checker.tests import MockBuilder, SourceMock, TestCase, getTestTempPath
+
+from hdl_checker.build_stamps import BuildStamps
+from hdl_checker.database import Database
+from hdl_checker.diagnostics import BuilderDiag, DiagType
+from hdl_checker.parsers.elements.identifier import Identifier
+from hdl_checker.path import Path, TemporaryPath
+from hdl_checker.types import BuildFlagScope
+from hdl_checker.utils import removeDirIfExists, removeIfExists
+
+_logger = logging.getLogger(__name__)
+
+TEST_TEMP_PATH = getTestTempPath(__name__)
+
+
+class _SourceMock(SourceMock):
+    base_path = TEST_TEMP_PATH
+
+
+def _warning(path):
+    # type: (Path) -> BuilderDiag
+    return BuilderDiag(
+        builder_name="mock_builder",
+        text="some warning",
+        filename=path,
+        line_number=1,
+        severity=DiagType.WARNING,
+    )
+
+
+class TestBuildStamps(TestCase):
+    def setUp(self):
+        # type: (...) -> None
+        self.filename = p.join(TEST_TEMP_PATH, "stamps_%s.db" % self.id())
+        removeIfExists(self.filename)
+        self.path = Path(p.join(TEST_TEMP_PATH, "source.vhd"))
+
+    def test_StoreAndRecover(self):
+        # type: (...) -> None
+        stamps = BuildStamps(self.filename)
+        self.assertIsNone(stamps.get(self.path))
+        stamps.put(self.path, "some_stamp", [_warning(self.path)])
+        stamps.close()
+
+        stamps = BuildStamps(self.filename)
+        self.addCleanup(stamps.close)
+        self.assertEqual(stamps.get(self.path), "some_stamp")
+        self.assertEqual(stamps.getDiagnostics(self.path), {_warning(self.path)})
+
+        stamps.remove(self.path)
+        self.assertIsNone(stamps.get(self.path))
+        self.assertEqual(stamps.getDiagnostics(self.path), set())
+
+    def test_InvalidFileIsDiscarded(self):
+        # type: (...) -> None
+        with open(self.filename, "w") as fd:
+            fd.write("not a database")
+
+        stamps = BuildStamps(self.filename)
+        self.addCleanup(stamps.close)
+        self.assertIsNone(stamps.get(self.path))
+        stamps.put(self.path, "some_stamp", ())
+        self.assertEqual(stamps.get(self.path), "some_stamp")
+
+
+class TestBuilderWithBuildStamps(TestCase):
+    def setUp(self):
+        # type: (...) -> None
+        self.work_folder = Path(p.join(TEST_TEMP_PATH, "work_%s" % self.id()))
+        removeDirIfExists(self.work_folder.name)
+
+        self.sources = [
+            _SourceMock(
+                filename="source_%d.vhd" % i,
+                library="lib",
+                design_units=[{"name": "package_%d" % i, "type": "package"}],
+                dependencies=(("lib", "package_%d" % (i - 1)),) if i else (),
+            )
+            for i in range(3)
+        ]
+        self.database = Database()
+        self.database.configure(
+            {"sources": [(x.filename.name, {"library": "lib"}) for x in self.sources]},
+            TEST_TEMP_PATH,
+        )
+        self.builder = self._getBuilder()
+
+    def _getBuilder(self):
+        # type: (...) -> MockBuilder
+        builder = MockBuilder(self.work_folder, self.database)
+        self.addCleanup(builder.close)
+        return builder
+
+    def _build(self, builder=None):
+        # type: (...) -> List[Path]
+        "Builds all sources in order, returns the paths actually compiled"
+        builder = builder or self.builder
+        compiled = []  # type: List[Path]
+
+        def buildAndGetDiagnostics(path, library, flags):
+            compiled.append(path)
+            return {_warning(path)}, set()
+
+        with patch.object(
+            builder, "_buildAndGetDiagnostics", side_effect=buildAndGetDiagnostics
+        ):
+            for source in self.sources:
+                diagnostics, rebuilds = builder.build(
+                    source.filename, Identifier("lib"), BuildFlagScope.dependencies
+                )
+                self.assertEqual(diagnostics, {_warning(source.filename)})
+                self.assertFalse(rebuilds)
+
+        return compiled
+
+    def test_UnchangedSourcesAreNotCompiledAgain(self):
+        # type: (...) -> None
+        self.assertEqual(self._build(), [x.filename for x in self.sources])
+        self.assertEqual(self._build(), [])
+
+    def test_StampsAreKeptAcrossBuilders(self):
+        # type: (...) -> None
+        self._build()
+        self.builder.close()
+        self.assertEqual(self._build(self._getBuilder()), [])
+
+    def test_TouchingSourcesDoesNotTriggerCompiling(self):
+        # type: (...) -> None
+        self._build()
+        time.sleep(0.1)
+        for source in self.sources:
+            with open(source.filename.name, "a"):
+                pass
+        self.assertEqual(self._build(), [])
+
+    def test_ChangingSourcesCompilesDependents(self):
+        # type: (...) -> None
+        self._build()
+        time.sleep(0.1)
+        with open(self.sources[1].filename.name, "a") as fd:
+            fd.write("\n-- some comment")
+        self.assertEqual(self._build(), [x.filename for x in self.sources[1:]])
+
+    def test_ChangingFlagsTriggersCompiling(self):
+        # type: (...) -> None
+        self._build()
+        self.database.addSource(
+            self.sources[2].filename, "lib", dependencies_flags=("-some-flag",)
+        )
+        self.assertEqual(self._build(), [self.sources[2].filename])
+
+    def test_SourcesWithErrorsAreAlwaysCompiled(self):
+        # type: (...) -> None
+        path = self.sources[0].filename
+        error = BuilderDiag(
+            builder_name="mock_builder", text="some error", filename=path
+        )
+
+        with patch.object(
+            self.builder, "_buildAndGetDiagnostics", return_value=({error}, set())
+        ) as meth:
+            for _ in range(2):
+                self.assertEqual(
+                    self.builder.build(path, Identifier("lib"), BuildFlagScope.single),
+                    ({error}, set()),
+                )
+
+        self.assertEqual(meth.call_count, 2)
+
+    def test_TemporaryPathsAreNotStamped(self):
+        # type: (...) -> None
+        path = TemporaryPath(self.sources[2].filename.name)
+        with patch.object(
+            self.builder, "_buildAndGetDiagnostics", return_value=(set(), set())
+        ) as meth:
+            for _ in range(2):
+                self.builder.build(path, Identifier("lib"), BuildFlagScope.single)
+
+        self.assertEqual(meth.call_count, 2)
+        self.assertIsNone(self.builder._getBuildStamps().get(path))
+        self.assertNotIn(path, self.builder._getBuildStamps()._digests)
+
+    def test_ForcedBuildsAreAlwaysCompiled(self):
+        # type: (...) -> None
+        self._build()
+        path = self.sources[0].filename
+        with patch.object(
+            self.builder, "_buildAndGetDiagnostics", return_value=(set(), set())
+        ) as meth:
+            self.builder.build(
+                path, Identifier("lib"), BuildFlagScope.dependencies, forced=True
+            )
+
+        meth.assert_called_once()
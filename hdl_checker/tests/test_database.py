@@ -25,11 +25,12 @@ import json
 import logging
 import os.path as p
 import tempfile
+import threading
 import time
 from pprint import pformat
-from typing import Any, Dict, Iterable, Set, Tuple
+from typing import Any, Dict, Iterable, List, Set, Tuple
 
-from mock import PropertyMock, patch
+from mock import patch
 
 from hdl_checker.tests import (
     SourceMock,
@@ -42,8 +43,8 @@ from hdl_checker.tests import (
 from hdl_checker import DEFAULT_LIBRARY
 from hdl_checker.database import Database
 from hdl_checker.diagnostics import DependencyNotUnique, PathNotInProjectFile
+from hdl_checker.parser_utils import expandCompactParseResult
 from hdl_checker.parsers.elements.dependency_spec import (
-    BaseDependencySpec,
     IncludedPath,
     RequiredDesignUnit,
 )
@@ -53,6 +54,7 @@ from hdl_checker.parsers.elements.parsed_element import Location
 from hdl_checker.path import Path, TemporaryPath
 from hdl_checker.serialization import StateEncoder, jsonObjectHook
 from hdl_checker.types import BuildFlagScope, DesignUnitType, FileType
+from hdl_checker.utils import getReadableMtime
 
 _logger = logging.getLogger(__name__)
 
@@ -81,9 +83,7 @@ class _Database(Database):
         _logger.debug("- %d paths:", len(self._paths))
         for path in self._paths:
             timestamp = self._parse_timestamp[path]
-            dependencies = self._dependencies_map.get(
-                path, set()
-            )  # type: Set[BaseDependencySpec]
+            dependencies = self.snapshot.getDependenciesByPath(path)
             _logger.debug("  - Path: %s (%f)", path, timestamp)
             _logger.debug("    - library:      : %s", self._library_map.get(path, "?"))
             _logger.debug("    - flags:        : %s", self._flags_map.get(path, "-"))
@@ -419,6 +419,18 @@ class TestDatabase(TestCase):
             {("another_library", "foo"), ("lib", "bar")},
         )
 
+        # Reverse dependency search should also see the updated library
+        self.assertCountEqual(
+            self.database.getLibrariesReferredByUnit(
+                Identifier("relative_dependency", False)
+            ),
+            [Identifier("file_0_lib", False)],
+        )
+        self.assertCountEqual(
+            self.database.getLibrariesReferredByUnit(Identifier("bar", False)),
+            [Identifier("lib", False)],
+        )
+
     def test_InfersUsesMostCommonLibraryIfNeeded(self):
         # type: (...) -> Any
         # Given a design unit used in multiple ways, use the most common one
@@ -607,7 +619,94 @@ class TestDatabase(TestCase):
             database._inferred_libraries, recovered._inferred_libraries
         )
         self.assertDictEqual(database._flags_map, recovered._flags_map)
-        self.assertDictEqual(database._dependencies_map, recovered._dependencies_map)
+        self.assertDictEqual(database._parse_results, recovered._parse_results)
+        self.assertDictEqual(
+            database._dependencies_library, recovered._dependencies_library
+        )
+        self.assertDictEqual(database._units_by_name, recovered._units_by_name)
+        self.assertDictEqual(
+            database._dependencies_by_name, recovered._dependencies_by_name
+        )
+
+    def test_PathsDefiningFollowsSourceChanges(self):
+        # type: (...) -> Any
+        sources = {
+            _SourceMock(
+                filename=_path("foo.vhd"),
+                design_units=[{"name": "entity_a", "type": "entity"}],
+            ),
+            _SourceMock(filename=_path("oof.vhd"), design_units=[]),
+        }
+
+        self.database._configFromSources(sources, TEST_TEMP_PATH)
+
+        self.assertCountEqual(
+            self.database.getPathsDefining(Identifier("entity_a", False)),
+            {_Path("foo.vhd")},
+        )
+
+        # Adding a unit with the same name to another source should make it
+        # visible regardless of the case
+        _SourceMock(
+            filename=_path("oof.vhd"),
+            design_units=[{"name": "ENTITY_A", "type": "entity"}],
+        )
+        self.database.addSource(_Path("oof.vhd"), None)
+
+        self.assertCountEqual(
+            self.database.getPathsDefining(Identifier("entity_a", False)),
+            {_Path("foo.vhd"), _Path("oof.vhd")},
+        )
+
+        self.database.removeSource(_Path("foo.vhd"))
+        self.database.removeSource(_Path("oof.vhd"))
+
+        self.assertCountEqual(
+            self.database.getPathsDefining(Identifier("entity_a", False)), ()
+        )
+        self.assertDictEqual(self.database._units_by_name, {})
+        self.assertDictEqual(self.database._parse_results, {})
+
+    def test_DesignUnitsAreOnlyBuiltWhenRead(self):
+        # type: (...) -> Any
+        _SourceMock(
+            filename=_path("foo.vhd"),
+            design_units=[{"name": "entity_a", "type": "entity"}],
+            dependencies=(("lib", "entity_b"),),
+        )
+        _SourceMock(
+            filename=_path("bar.vhd"),
+            design_units=[{"name": "entity_b", "type": "entity"}],
+        )
+
+        # Not using _Database because it logs every design unit when
+        # configuring
+        database = Database()
+        with patch(
+            "hdl_checker.database.expandCompactParseResult",
+            wraps=expandCompactParseResult,
+        ) as expand:
+            database.configure(
+                {"sources": [("foo.vhd", {"library": "lib"}), "bar.vhd"]},
+                TEST_TEMP_PATH,
+            )
+            # Libraries are inferred from the compact parse results as well
+            self.assertEqual(database.getLibrary(_Path("bar.vhd")), Identifier("lib"))
+            expand.assert_not_called()
+
+            self.assertCountEqual(
+                database.getDesignUnitsByPath(_Path("foo.vhd")),
+                {
+                    VhdlDesignUnit(
+                        owner=_Path("foo.vhd"),
+                        name="entity_a",
+                        type_=DesignUnitType.entity,
+                        locations={(3, 7)},
+                    )
+                },
+            )
+            database.getDependenciesByPath(_Path("foo.vhd"))
+            expand.assert_called_once()
 
     def test_RemovingAPathThatWasAdded(self):
         self.database._configFromSources(
@@ -827,6 +926,7 @@ class TestDatabase(TestCase):
             },
         )
 
+
 class TestDirectDependencies(TestCase):
     def setUp(self):
         # type: (...) -> Any
@@ -945,6 +1045,206 @@ class TestDirectDependencies(TestCase):
             {("lib", "common_dep")},
         )
 
+    def test_ReparsingWithoutChangesKeepsCaches(self):
+        # type: (...) -> Any
+        entity_a = self.database.getBuildSequence(_Path("entity_a.vhd"))
+        indirect_dep = self.database.getBuildSequence(_Path("indirect_dep.vhd"))
+
+        # Parse every file again, nothing has changed so the same objects
+        # should be returned
+        for path in self.database.paths:
+            self.database._parseSource(path)
+
+        self.assertIs(self.database.getBuildSequence(_Path("entity_a.vhd")), entity_a)
+        self.assertIs(
+            self.database.getBuildSequence(_Path("indirect_dep.vhd")), indirect_dep
+        )
+
+    def test_ChangesOnlyInvalidateWhatDependsOnThem(self):
+        # type: (...) -> Any
+        entity_a = self.database.getBuildSequence(_Path("entity_a.vhd"))
+        indirect_dep = self.database.getBuildSequence(_Path("indirect_dep.vhd"))
+
+        # direct_dep_b is only a dependency of entity_a
+        time.sleep(0.1)
+        _SourceMock(
+            filename=_path("direct_dep_b.vhd"),
+            library="lib",
+            design_units=[{"name": "direct_dep_b", "type": "entity"}],
+            dependencies=[("work", "common_dep"), ("work", "side_effect_entity")],
+        )
+        self.database._parseSource(_Path("direct_dep_b.vhd"))
+
+        self.assertIs(
+            self.database.getBuildSequence(_Path("indirect_dep.vhd")), indirect_dep
+        )
+        self.assertIsNot(
+            self.database.getBuildSequence(_Path("entity_a.vhd")), entity_a
+        )
+        self.assertCountEqual(
+            self.database.getBuildSequence(_Path("entity_a.vhd")), entity_a
+        )
+
+        # Adding a path that defines a unit needed by indirect_dep.vhd should
+        # invalidate both
+        self.database.getBuildSequence(_Path("entity_a.vhd"))
+        _SourceMock(
+            filename=_path("another_common_dep.vhd"),
+            library="lib",
+            design_units=[{"name": "common_dep", "type": "package"}],
+        )
+        path = _Path("another_common_dep.vhd")
+        self.database.addSource(path, "lib")
+
+        self.assertNotIn(
+            (_Path("indirect_dep.vhd"), None), self.database._build_sequence_cache
+        )
+        self.assertNotIn(
+            (_Path("entity_a.vhd"), None), self.database._build_sequence_cache
+        )
+
+        self.database.removeSource(path)
+        self.assertCountEqual(
+            self.database.getBuildSequence(_Path("indirect_dep.vhd")), indirect_dep
+        )
+
+    def test_PathsAreCheckedOnceDuringEpoch(self):
+        # type: (...) -> Any
+        with patch(
+            "hdl_checker.database.getReadableMtime", wraps=getReadableMtime
+        ) as meth:
+            with self.database.freshnessEpoch():
+                self.database.getBuildSequence(_Path("entity_a.vhd"))
+                for path in self.database.paths:
+                    self.database.getDesignUnitsByPath(path)
+                    self.database.getDependenciesByPath(path)
+
+            self.assertCountEqual(
+                [call[0][0] for call in meth.call_args_list],
+                [path.name for path in self.database.paths],
+            )
+
+    def test_ChangesAreSeenAfterEpochEnds(self):
+        # type: (...) -> Any
+        with self.database.freshnessEpoch():
+            self.database.getDesignUnitsByPath(_Path("not_a_dependency.vhd"))
+
+            time.sleep(0.1)
+            _SourceMock(
+                filename=_path("not_a_dependency.vhd"),
+                library="lib",
+                design_units=[{"name": "some_other_package", "type": "package"}],
+            )
+
+            self.assertEqual(
+                {
+                    x.name.name
+                    for x in self.database.getDesignUnitsByPath(
+                        _Path("not_a_dependency.vhd")
+                    )
+                },
+                {"not_a_dependency"},
+            )
+
+        self.assertEqual(
+            {
+                x.name.name
+                for x in self.database.getDesignUnitsByPath(
+                    _Path("not_a_dependency.vhd")
+                )
+            },
+            {"some_other_package"},
+        )
+
+    def test_EpochsAreLocalToEachThread(self):
+        # type: (...) -> Any
+        def getUnitNames():
+            return {
+                x.name.name
+                for x in self.database.getDesignUnitsByPath(
+                    _Path("not_a_dependency.vhd")
+                )
+            }
+
+        with self.database.freshnessEpoch():
+            getUnitNames()
+
+            time.sleep(0.1)
+            _SourceMock(
+                filename=_path("not_a_dependency.vhd"),
+                library="lib",
+                design_units=[{"name": "some_other_package", "type": "package"}],
+            )
+
+            # Another thread is not within this thread's epoch, so it must
+            # check the path again and see the change
+            result = []  # type: List[Set[str]]
+            thread = threading.Thread(target=lambda: result.append(getUnitNames()))
+            thread.start()
+            thread.join()
+
+            self.assertEqual(result, [{"some_other_package"}])
+
+    def test_SnapshotIsOnlyPublishedAfterChanges(self):
+        # type: (...) -> Any
+        snapshot = self.database.snapshot
+        self.assertIs(self.database.snapshot, snapshot)
+
+        # Reparsing without changes doesn't need a new snapshot
+        self.database.getDesignUnitsByPath(_Path("entity_a.vhd"))
+        self.assertIs(self.database.snapshot, snapshot)
+
+        self.database.removeSource(_Path("not_a_dependency.vhd"))
+        self.assertEqual(self.database.snapshot.version, snapshot.version + 1)
+
+    def test_SnapshotsAreNotAffectedByLaterChanges(self):
+        # type: (...) -> Any
+        path = _Path("not_a_dependency.vhd")
+        snapshot = self.database.snapshot
+
+        self.database.removeSource(path)
+
+        self.assertIn(path, snapshot.paths)
+        self.assertEqual(
+            {x.name.name for x in snapshot.getDesignUnitsByPath(path)},
+            {"not_a_dependency"},
+        )
+        self.assertEqual(snapshot.getLibrary(path), Identifier("lib"))
+        self.assertNotIn(path, self.database.snapshot.paths)
+        self.assertFalse(self.database.snapshot.getDesignUnitsByPath(path))
+        self.assertFalse(self.database.snapshot.getDependenciesByPath(path))
+
+    def test_SnapshotMatchesDatabase(self):
+        # type: (...) -> Any
+        snapshot = self.database.snapshot
+        self.assertEqual(snapshot.paths, self.database.paths)
+        for path in self.database.paths:
+            self.assertEqual(snapshot.getLibrary(path), self.database.getLibrary(path))
+            self.assertEqual(
+                snapshot.getDesignUnitsByPath(path),
+                self.database.getDesignUnitsByPath(path),
+            )
+            self.assertEqual(
+                snapshot.getDependenciesByPath(path),
+                self.database.getDependenciesByPath(path),
+            )
+
+        self.assertCountEqual(
+            {x.owner for x in snapshot.getDependenciesByName(Identifier("common_dep"))},
+            {
+                _Path("common_dep.vhd"),
+                _Path("entity_a.vhd"),
+                _Path("direct_dep_a.vhd"),
+                _Path("direct_dep_b.vhd"),
+                _Path("indirect_dep.vhd"),
+                _Path("not_a_dependency.vhd"),
+            },
+        )
+        self.assertCountEqual(
+            {x.owner for x in snapshot.getDesignUnitsByName(Identifier("common_dep"))},
+            {_Path("common_dep.vhd")},
+        )
+
 
 class TestDirectCircularDependencies(TestCase):
     def setUp(self):
@@ -1058,6 +1358,243 @@ class TestMultilevelCircularDependencies(TestCase):
         )
 
 
+class TestDeepDependencyChain(TestCase):
+    def setUp(self):
+        # type: (...) -> Any
+        _logger.info("Setting up %s", self)
+        self.database = _Database()
+
+        # Each package uses the previous one, so there's only one valid build
+        # sequence
+        self.sources = {
+            _SourceMock(
+                filename=_path("chain_%d.vhd" % i),
+                library="lib",
+                design_units=[{"name": "chain_%d" % i, "type": "package"}],
+                dependencies=[("work", "chain_%d" % (i - 1))] if i else [],
+            )
+            for i in range(100)
+        }
+
+        self.database._configFromSources(self.sources, TEST_TEMP_PATH)
+
+    def tearDown(self):
+        # type: (...) -> Any
+        _logger.info("Tearing down %s", self)
+        self.database.test_reportCacheInfo()
+        del self.database
+
+    def test_BuildSequenceFollowsChain(self):
+        # type: (...) -> Any
+        self.assertEqual(
+            list(self.database.test_getBuildSequence(_Path("chain_99.vhd"))),
+            [(Identifier("lib"), _Path("chain_%d.vhd" % i)) for i in range(99)],
+        )
+
+    def test_BuildSequenceOfChainMiddle(self):
+        # type: (...) -> Any
+        self.assertEqual(
+            list(self.database.test_getBuildSequence(_Path("chain_10.vhd"))),
+            [(Identifier("lib"), _Path("chain_%d.vhd" % i)) for i in range(10)],
+        )
+
+    def test_BuildLevelsFollowChain(self):
+        # type: (...) -> Any
+        self.assertEqual(
+            self.database.getBuildLevels(_Path("chain_10.vhd")),
+            tuple(((Identifier("lib"), _Path("chain_%d.vhd" % i)),) for i in range(10)),
+        )
+
+    @patch("hdl_checker.parser_utils._MIN_SOURCES_PER_PARSE_JOB", 8)
+    def test_ParsingOnProcessPool(self):
+        # type: (...) -> Any
+        database = _Database(parse_jobs=4)
+
+        # Make sure sources are not being parsed serially
+        with patch.object(database, "_parseSource", side_effect=AssertionError):
+            database._configFromSources(self.sources, TEST_TEMP_PATH)
+
+        self.assertEqual(database.design_units, self.database.design_units)
+        self.assertEqual(database._parse_results, self.database._parse_results)
+        self.assertEqual(database._parse_timestamp, self.database._parse_timestamp)
+        self.assertEqual(
+            database.getBuildSequence(_Path("chain_99.vhd")),
+            self.database.getBuildSequence(_Path("chain_99.vhd")),
+        )
+
+    def test_SmallProjectsAreParsedSerially(self):
+        # type: (...) -> Any
+        database = _Database(parse_jobs=4)
+
+        with patch(
+            "hdl_checker.parser_utils._getParsePool", side_effect=AssertionError
+        ):
+            database._configFromSources(self.sources, TEST_TEMP_PATH)
+
+        self.assertEqual(database.design_units, self.database.design_units)
+
+
+class TestBuildLevels(TestCase):
+    def setUp(self):
+        # type: (...) -> Any
+        _logger.info("Setting up %s", self)
+        self.database = _Database()
+
+        # Top uses every package and each package uses the base one, so all
+        # packages can be built at the same time
+        self.sources = {
+            _SourceMock(
+                filename=_path("top.vhd"),
+                library="lib",
+                design_units=[{"name": "top", "type": "entity"}],
+                dependencies=[("lib", "pkg_%d" % i) for i in range(4)],
+            ),
+            _SourceMock(
+                filename=_path("base.vhd"),
+                library="lib",
+                design_units=[{"name": "base", "type": "package"}],
+            ),
+        } | {
+            _SourceMock(
+                filename=_path("pkg_%d.vhd" % i),
+                library="lib",
+                design_units=[{"name": "pkg_%d" % i, "type": "package"}],
+                dependencies=[("lib", "base")],
+            )
+            for i in range(4)
+        }
+
+        self.database._configFromSources(self.sources, TEST_TEMP_PATH)
+
+    def tearDown(self):
+        # type: (...) -> Any
+        del self.database
+
+    def test_IndependentPathsShareLevels(self):
+        # type: (...) -> Any
+        levels = self.database.getBuildLevels(_Path("top.vhd"))
+
+        self.assertEqual(levels[0], ((Identifier("lib"), _Path("base.vhd")),))
+        self.assertCountEqual(
+            levels[1], [(Identifier("lib"), _Path("pkg_%d.vhd" % i)) for i in range(4)],
+        )
+        self.assertEqual(len(levels), 2)
+
+    def test_LevelsHaveTheSequencePaths(self):
+        # type: (...) -> Any
+        self.assertCountEqual(
+            [
+                x
+                for level in self.database.getBuildLevels(_Path("top.vhd"))
+                for x in level
+            ],
+            self.database.getBuildSequence(_Path("top.vhd")),
+        )
+
+    def test_ReadersUsePreviousSnapshotWhileChanging(self):
+        # type: (...) -> Any
+        expected = self.database.getBuildLevels(_Path("top.vhd"))
+        self.database._clearLruCaches()
+        levels = []  # type: List[Any]
+        reader = threading.Thread(
+            target=lambda: levels.append(self.database.getBuildLevels(_Path("top.vhd")))
+        )
+
+        with self.database._changing():
+            self.database.removeSource(_Path("base.vhd"))
+            # Readers don't wait for the change to end and don't see it
+            reader.start()
+            reader.join(10)
+            self.assertFalse(reader.is_alive())
+            self.assertEqual(levels, [expected])
+
+        self.assertNotEqual(self.database.getBuildLevels(_Path("top.vhd")), expected)
+
+    def test_SequenceFollowsChangesMadeOnDisk(self):
+        # type: (...) -> Any
+        sequence = self.database.getBuildSequence(_Path("top.vhd"))
+        self.assertIn((Identifier("lib"), _Path("base.vhd")), sequence)
+
+        # Packages stop using base without the database being told
+        time.sleep(0.1)
+        for i in range(4):
+            _SourceMock(
+                filename=_path("pkg_%d.vhd" % i),
+                library="lib",
+                design_units=[{"name": "pkg_%d" % i, "type": "package"}],
+            )
+
+        self.assertNotIn(
+            (Identifier("lib"), _Path("base.vhd")),
+            self.database.getBuildSequence(_Path("top.vhd")),
+        )
+
+    def test_SequencesAreNotMemoizedWhileChanging(self):
+        # type: (...) -> Any
+        self.database._clearLruCaches()
+        time.sleep(0.1)
+        _SourceMock(
+            filename=_path("top.vhd"),
+            library="lib",
+            design_units=[{"name": "top", "type": "entity"}],
+        )
+
+        changing = threading.Event()
+        done = threading.Event()
+
+        def change():
+            with self.database._changing():
+                changing.set()
+                done.wait(10)
+
+        writer = threading.Thread(target=change)
+        writer.start()
+        try:
+            self.assertTrue(changing.wait(10))
+            # Can't parse top while the other thread changes the database
+            stale = self.database.getBuildSequence(_Path("top.vhd"))
+            self.assertIn((Identifier("lib"), _Path("base.vhd")), stale)
+            self.assertEqual(self.database._build_sequence_cache, {})
+        finally:
+            done.set()
+            writer.join(10)
+
+        self.assertEqual(self.database.getBuildSequence(_Path("top.vhd")), ())
+
+    def test_PathsDefiningTheSameUnitAreNotBuiltTogether(self):
+        # type: (...) -> Any
+        # Both paths define the same unit, plus one unit top needs
+        sources = {
+            _SourceMock(
+                filename=_path("top.vhd"),
+                library="lib",
+                design_units=[{"name": "top", "type": "entity"}],
+                dependencies=[("lib", "unit_a"), ("lib", "unit_b")],
+            )
+        } | {
+            _SourceMock(
+                filename=_path("both_%s.vhd" % x),
+                library="lib",
+                design_units=[
+                    {"name": "unit_%s" % x, "type": "package"},
+                    {"name": "common", "type": "package"},
+                ],
+            )
+            for x in "ab"
+        }
+        self.database._configFromSources(sources, TEST_TEMP_PATH)
+
+        # Either can be built first, but not at the same time
+        sequence = self.database.getBuildSequence(_Path("top.vhd"))
+        self.assertCountEqual(
+            [path for _, path in sequence], [_Path("both_a.vhd"), _Path("both_b.vhd")]
+        )
+        self.assertEqual(
+            self.database.getBuildLevels(_Path("top.vhd")),
+            tuple((x,) for x in sequence),
+        )
+
+
 class TestIndirectLibraryInference(TestCase):
     def setUp(self):
         # type: (...) -> Any
@@ -1114,6 +1651,114 @@ class TestIndirectLibraryInference(TestCase):
 
         self.assertEqual(sequence, ((Identifier("find_me"), _Path("target_pkg.vhd")),))
 
+    def test_LibrariesAreInferredWhenConfiguring(self):
+        # type: (...) -> Any
+        self.assertEqual(
+            self.database._library_map[_Path("target_pkg.vhd")], Identifier("find_me")
+        )
+        self.assertIn(_Path("target_pkg.vhd"), self.database._inferred_libraries)
+
+        # Getting the library now should not need inference
+        with patch.object(self.database, "_chooseInferredLibrary") as meth:
+            self.assertEqual(
+                self.database.getLibrary(_Path("target_pkg.vhd")), Identifier("find_me")
+            )
+            meth.assert_not_called()
+
+    def test_OnlyPathsWhoseReferencesChangedAreInferredAgain(self):
+        # type: (...) -> Any
+        time.sleep(0.1)
+        _SourceMock(
+            filename=_path("no_lib_but_use_it_directly.vhd"),
+            library=None,
+            design_units=[{"name": "no_lib_but_use_it_directly", "type": "package"}],
+            dependencies=[("other_lib", "target_pkg")],
+        )
+        _SourceMock(
+            filename=_path("with_lib_but_use_it_directly.vhd"),
+            library="find_me",
+            design_units=[{"name": "with_lib_but_use_it_directly", "type": "package"}],
+            dependencies=[("other_lib", "target_pkg")],
+        )
+        # Libraries are inferred again once the change ends
+        with self.database._changing():
+            self.database._parseSource(_Path("no_lib_but_use_it_directly.vhd"))
+            self.database._parseSource(_Path("with_lib_but_use_it_directly.vhd"))
+
+            self.assertEqual(
+                self.database._stale_inferences, {_Path("target_pkg.vhd")},
+            )
+
+        self.assertFalse(self.database._stale_inferences)
+        self.assertEqual(
+            self.database.getLibrary(_Path("target_pkg.vhd")), Identifier("other_lib")
+        )
+
+        # Stale inferences are worked out when the database is recovered from
+        # the cache
+        self.database._library_map[_Path("target_pkg.vhd")] = Identifier("stale")
+        self.database._stale_inferences.add(_Path("target_pkg.vhd"))
+        recovered = json.loads(
+            json.dumps(self.database, cls=StateEncoder), object_hook=jsonObjectHook
+        )
+        self.assertFalse(recovered._stale_inferences)
+        self.assertEqual(
+            recovered.getLibrary(_Path("target_pkg.vhd")), Identifier("other_lib")
+        )
+
+    def test_LazyInferenceInvalidatesLookups(self):
+        # type: (...) -> Any
+        target = _Path("target_pkg.vhd")
+        time.sleep(0.1)
+        _SourceMock(
+            filename=_path("target_pkg.vhd"),
+            library=None,
+            design_units=[
+                {"name": "target_pkg", "type": "package"},
+                {"name": "other_pkg", "type": "package"},
+            ],
+        )
+        _SourceMock(
+            filename=_path("use_other_pkg.vhd"),
+            library="find_me",
+            design_units=[{"name": "use_other_pkg", "type": "package"}],
+            dependencies=[("work", "other_pkg")],
+        )
+        self.database._parseSource(target)
+        self.database.addSource(_Path("use_other_pkg.vhd"), "find_me")
+
+        # The build sequence depends on the library inferred for target_pkg.vhd
+        # but not on the references to target_pkg that are about to change
+        self.assertEqual(
+            tuple(self.database.getBuildSequence(_Path("use_other_pkg.vhd"))),
+            ((Identifier("find_me"), target),),
+        )
+
+        time.sleep(0.1)
+        _SourceMock(
+            filename=_path("no_lib_but_use_it_directly.vhd"),
+            library=None,
+            design_units=[{"name": "no_lib_but_use_it_directly", "type": "package"}],
+            dependencies=[("other_lib", "target_pkg")],
+        )
+        _SourceMock(
+            filename=_path("with_lib_but_use_it_directly.vhd"),
+            library="find_me",
+            design_units=[{"name": "with_lib_but_use_it_directly", "type": "package"}],
+            dependencies=[("other_lib", "target_pkg")],
+        )
+        self.database._parseSource(_Path("no_lib_but_use_it_directly.vhd"))
+        self.database._parseSource(_Path("with_lib_but_use_it_directly.vhd"))
+
+        # Inferring the library again when the change ends (as opposed to via
+        # inferLibraries) must drop lookups that used the old one
+        self.assertEqual(self.database.getLibrary(target), Identifier("other_lib"))
+        self.assertFalse(self.database._stale_inferences)
+        self.assertEqual(
+            tuple(self.database.getBuildSequence(_Path("use_other_pkg.vhd"))),
+            ((Identifier("other_lib"), target),),
+        )
+
 
 class TestUnitsDefinedInMultipleSources(TestCase):
     maxDiff = None
@@ -1292,21 +1937,21 @@ class TestUnitsDefinedInMultipleSources(TestCase):
 
 class TestResolveIncludes(TestCase):
     @patch("hdl_checker.database.Database._addDiagnostic")
-    @patch("hdl_checker.database.Database.paths", new_callable=PropertyMock)
-    def test_ResolveIncludePath(self, paths, add_diagnostic):
+    def test_ResolveIncludePath(self, add_diagnostic):
         # type: (...) -> Any
         database = Database()
 
-        paths.return_value = frozenset(
-            [
-                Path("/some/path/path_0"),
-                Path("/some/path/path_1"),
-                Path("/another/base/path/path_1"),
-                Path("/yet/another/base/path/path_1"),
-                Path("/yet/another/base/path/path_2"),
-                Path("/foo/bar/path_2"),
-            ]
-        )
+        # Paths don't exist, so add their info only instead of going through
+        # addSource to avoid parsing
+        for path in (
+            Path("/some/path/path_0"),
+            Path("/some/path/path_1"),
+            Path("/another/base/path/path_1"),
+            Path("/yet/another/base/path/path_1"),
+            Path("/yet/another/base/path/path_2"),
+            Path("/foo/bar/path_2"),
+        ):
+            database._addSourceInfo(path, library=None)
 
         def includedPath(name):
             return IncludedPath(
@@ -1357,4 +2002,13 @@ class TestResolveIncludes(TestCase):
         )
 
         add_diagnostic.assert_called_once()
-        paths.assert_called()
+        add_diagnostic.reset_mock()
+
+        # Removing a path should remove it from the candidates
+        database.removeSource(Path("/foo/bar/path_2"))
+        self.assertEqual(
+            database.resolveIncludedPath(includedPath("path_2")),
+            Path("/yet/another/base/path/path_2"),
+        )
+        self.assertEqual(database.resolveIncludedPath(includedPath("bar/path_2")), None)
+        add_diagnostic.assert_not_called()
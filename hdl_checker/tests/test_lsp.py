@@ -33,6 +33,7 @@ from pygls.types import (
     ClientCapabilities,
     DiagnosticSeverity,
     DidChangeTextDocumentParams,
+    DidCloseTextDocumentParams,
     DidOpenTextDocumentParams,
     DidSaveTextDocumentParams,
     HoverAbstract,
@@ -58,6 +59,7 @@ from hdl_checker.tests import getTestTempPath, setupTestSuport, toCheckerDiagnos
 import hdl_checker
 from hdl_checker import DEFAULT_LIBRARY, lsp
 from hdl_checker.diagnostics import CheckerDiagnostic
+from hdl_checker.parser_utils import compactParseResult
 from hdl_checker.parsers.elements.dependency_spec import RequiredDesignUnit
 from hdl_checker.parsers.elements.design_unit import (
     DesignUnitType,
@@ -65,6 +67,7 @@ from hdl_checker.parsers.elements.design_unit import (
     VhdlDesignUnit,
 )
 from hdl_checker.parsers.elements.identifier import Identifier
+from hdl_checker.parsers.vhdl_parser import VhdlBufferParser
 from hdl_checker.path import Path
 from hdl_checker.types import Location
 from hdl_checker.utils import ON_WINDOWS
@@ -945,6 +948,50 @@ class TestValidProject(_LspHelper):
                 )
             )
 
+    def test_ParsesChangesIncrementally(self):
+        _logger.info("#" * 100)
+        path = Path(p.join(TEST_PROJECT, "basic_library", "clk_en_generator.vhd"))
+        uri = uris.from_fs_path(str(path))
+        text = "library lib;\nuse lib.pkg_a.all;\n\nentity foo is\nend foo;\n"
+        changed = "library lib;\nuse lib.pkg_b.all;\n\nentity foo is\nend foo;\n"
+
+        # pylint: disable=no-member
+        with patch.object(
+            self.server.checker, "getMessagesByPath", return_value=[]
+        ), patch.object(self.server.checker, "getMessagesWithText", return_value=[]):
+            hdl_checker.utils.ENABLE_DEBOUNCE = False
+            try:
+                self.client.lsp.notify(
+                    features.TEXT_DOCUMENT_DID_OPEN,
+                    DidOpenTextDocumentParams(
+                        TextDocumentItem(uri, language_id="vhdl", version=0, text=text)
+                    ),
+                )
+                self.client.lsp.send_request(
+                    features.TEXT_DOCUMENT_DID_CHANGE,
+                    DidChangeTextDocumentParams(
+                        VersionedTextDocumentIdentifier(uri, version=1),
+                        [
+                            TextDocumentContentChangeEvent(
+                                range=Range(Position(1, 12), Position(1, 13)), text="b",
+                            )
+                        ],
+                    ),
+                ).result(LSP_REQUEST_TIMEOUT)
+            finally:
+                hdl_checker.utils.ENABLE_DEBOUNCE = True
+
+            self.server.checker.getMessagesWithText.assert_called_once_with(
+                path, changed, compactParseResult(VhdlBufferParser(path, changed)),
+            )
+
+        self.client.lsp.send_request(
+            features.TEXT_DOCUMENT_DID_CLOSE,
+            DidCloseTextDocumentParams(TextDocumentIdentifier(uri)),
+        ).result(LSP_REQUEST_TIMEOUT)
+        self.assertNotIn(uri, self.server._buffers)
+        # pylint: enable=no-member
+
     def test_changeConfiguration(self):
         _logger.info("#" * 100)
         # pylint: disable=no-member
@@ -957,3 +1004,11 @@ class TestValidProject(_LspHelper):
                 "bar", {x[0].foo for x in self.server.onConfigUpdate.call_args if x},
             )
         # pylint: enable=no-member
+
+    def test_ConfigUpdateShutsDownPreviousChecker(self):
+        previous = self.server.checker
+        with patch.object(previous, "shutdown") as shutdown:
+            self.server.onConfigUpdate(None)
+            shutdown.assert_called_once_with(wait=False)
+
+        self.assertIsNot(self.server.checker, previous)
@@ -22,9 +22,12 @@
 # pylint: disable=invalid-name
 
 import logging
+import mmap
+import os
 import os.path as p
 import re
 import subprocess as subp
+from tempfile import NamedTemporaryFile, mkdtemp
 
 import parameterized  # type: ignore
 import unittest2  # type: ignore
@@ -37,7 +40,19 @@ from hdl_checker.builders.fallback import Fallback
 from hdl_checker.builders.ghdl import GHDL
 from hdl_checker.builders.msim import MSim
 from hdl_checker.builders.xvhdl import XVHDL
-from hdl_checker.utils import _getLatestReleaseVersion, onNewReleaseFound, readFile
+from hdl_checker.parsers.base_parser import (
+    LineIndex,
+    StreamingLineIndex,
+    openSourceBuffer,
+)
+from hdl_checker.utils import (
+    _getLatestReleaseVersion,
+    getReadableMtime,
+    onNewReleaseFound,
+    readFile,
+    removeDirIfExists,
+    writeFileAtomically,
+)
 
 _logger = logging.getLogger(__name__)
 
@@ -195,3 +210,133 @@ def test_DontReportOnInvalidFormats(*_):
     func = MagicMock()
     onNewReleaseFound(func)
     func.assert_not_called()
+
+
+class TestLineIndex(unittest2.TestCase):
+    def test_MatchesScanningTheText(self):
+        text = "\nfirst line\n\nsecond line\n  third\n"
+        index = LineIndex(text)
+        for offset in range(len(text) + 1):
+            self.assertEqual(index.getLine(offset), text[:offset].count("\n"))
+            self.assertEqual(
+                index.getColumn(offset), len(text[:offset].split("\n")[-1])
+            )
+
+    def test_LineStarts(self):
+        index = LineIndex("a\nbc\n\nd")
+        self.assertEqual([index.getLineStart(line) for line in range(4)], [0, 2, 5, 6])
+
+    def test_ApplyingChangesMatchesIndexingAgain(self):
+        text = "\nfirst line\n\nsecond line\n  third\n"
+        index = LineIndex(text)
+        for start, end, inserted in (
+            (0, 0, "header\n"),
+            (3, 15, ""),
+            (5, 6, "a\nb\n\nc"),
+            (10, 10, "\n"),
+            (0, 12, "no line breaks"),
+        ):
+            text = text[:start] + inserted + text[end:]
+            index.applyChange(start, end, inserted)
+            expected = LineIndex(text)
+            for offset in range(len(text) + 1):
+                self.assertEqual(index.getLine(offset), expected.getLine(offset))
+                self.assertEqual(index.getColumn(offset), expected.getColumn(offset))
+
+
+class TestStreamingLineIndex(unittest2.TestCase):
+    @patch("hdl_checker.parsers.base_parser._STREAMING_CHUNK_SIZE", 3)
+    def test_MatchesLineIndex(self):
+        text = "\nfirst line\n\nsecond line\n  th\u00edrd\n"
+        index = LineIndex(text)
+        data = text.encode("utf-8")
+        streaming_index = StreamingLineIndex(data)
+        # Offsets are mostly increasing but sometimes go back a bit
+        for offset in list(range(len(text) + 1)) + [len(text), 3, 0]:
+            byte_offset = len(text[:offset].encode("utf-8"))
+            self.assertEqual(
+                streaming_index.getLine(byte_offset), index.getLine(offset)
+            )
+            self.assertEqual(
+                streaming_index.getColumn(byte_offset), index.getColumn(offset)
+            )
+            self.assertEqual(
+                streaming_index.getLine(max(byte_offset - 7, 0)),
+                index.getLine(len(data[: max(byte_offset - 7, 0)].decode("utf-8"))),
+            )
+
+    def test_LineIndexOfAsciiBytes(self):
+        text = "\nfirst line\n\nsecond line\n  third\n"
+        index = LineIndex(text)
+        bytes_index = LineIndex(text.encode())
+        for offset in range(len(text) + 1):
+            self.assertEqual(bytes_index.getLine(offset), index.getLine(offset))
+            self.assertEqual(bytes_index.getColumn(offset), index.getColumn(offset))
+
+
+class TestOpenSourceBuffer(unittest2.TestCase):
+    def setUp(self):
+        self.filename = NamedTemporaryFile(suffix=".vhd", delete=False).name
+        self.addCleanup(os.remove, self.filename)
+
+    def test_ReadsSmallFiles(self):
+        with open(self.filename, "wb") as fd:
+            fd.write(b"entity foo is end;")
+        with openSourceBuffer(self.filename) as buffer:
+            self.assertEqual(buffer, b"entity foo is end;")
+
+    @patch("hdl_checker.parsers.base_parser.MMAP_MIN_SIZE", 0)
+    def test_MapsLargeFiles(self):
+        with open(self.filename, "wb") as fd:
+            fd.write(b"entity foo is end;")
+        with openSourceBuffer(self.filename) as buffer:
+            self.assertIsInstance(buffer, mmap.mmap)
+            self.assertEqual(buffer[:], b"entity foo is end;")
+
+    @patch("hdl_checker.parsers.base_parser.MMAP_MIN_SIZE", 0)
+    def test_EmptyFiles(self):
+        with openSourceBuffer(self.filename) as buffer:
+            self.assertEqual(buffer, b"")
+
+
+class TestWriteFileAtomically(unittest2.TestCase):
+    def setUp(self):
+        self.dirname = mkdtemp()
+        self.addCleanup(removeDirIfExists, self.dirname)
+        self.filename = p.join(self.dirname, "file.json")
+
+    def test_ReplacesContent(self):
+        writeFileAtomically(self.filename, "foo")
+        writeFileAtomically(self.filename, "bar")
+        self.assertEqual(open(self.filename).read(), "bar")
+        self.assertEqual(os.listdir(self.dirname), ["file.json"])
+
+    def test_KeepsPreviousContentOnFailure(self):
+        writeFileAtomically(self.filename, "foo")
+        with patch("hdl_checker.utils._replace", side_effect=OSError):
+            with self.assertRaises(OSError):
+                writeFileAtomically(self.filename, "bar")
+        self.assertEqual(open(self.filename).read(), "foo")
+        self.assertEqual(os.listdir(self.dirname), ["file.json"])
+
+
+class TestGetReadableMtime(unittest2.TestCase):
+    def setUp(self):
+        self.dirname = mkdtemp()
+        self.addCleanup(removeDirIfExists, self.dirname)
+        self.filename = p.join(self.dirname, "file.vhd")
+        open(self.filename, "w").close()
+
+    def test_ReadableFile(self):
+        self.assertEqual(getReadableMtime(self.filename), p.getmtime(self.filename))
+
+    def test_MissingFileOrDirectory(self):
+        self.assertIsNone(getReadableMtime(p.join(self.dirname, "missing.vhd")))
+        self.assertIsNone(getReadableMtime(self.dirname))
+
+    def test_FileThatCantBeOpened(self):
+        # Mode bits allow reading but access is denied by something else (e.g.
+        # ownership or ACLs)
+        with patch("hdl_checker.utils.os.access", return_value=False) as access:
+            self.assertIsNone(getReadableMtime(self.filename))
+            access.assert_called_once_with(self.filename, os.R_OK)
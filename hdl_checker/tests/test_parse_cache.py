@@ -0,0 +1,215 @@
+# This file is part of HDL Checker.
+#
+# Copyright (c) 2015 - 2019 suoto (Andre Souto)
+#
+# HDL Checker is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# HDL Checker is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with HDL Checker.  If not, see <http://www.gnu.org/licenses/>.
+
+# pylint: disable=missing-docstring
+# pylint: disable=protected-access
+
+import logging
+import os
+import os.path as p
+import time
+
+from mock import patch
+
+from hdl_checker.tests import SourceMock, TestCase, getTestTempPath
+
+from hdl_checker.database import Database
+from hdl_checker.parse_cache import ParseCache
+from hdl_checker.parser_utils import expandCompactParseResult, parseSourceCompact
+from hdl_checker.path import Path
+
+_logger = logging.getLogger(__name__)
+
+TEST_TEMP_PATH = getTestTempPath(__name__)
+
+
+class _SourceMock(SourceMock):
+    base_path = TEST_TEMP_PATH
+
+
+class TestParseCache(TestCase):
+    def setUp(self):
+        # type: (...) -> None
+        self.cache = ParseCache(p.join(TEST_TEMP_PATH, "cache_%s" % self.id()))
+        self.source = _SourceMock(
+            filename="source.vhd",
+            library="lib",
+            design_units=[{"name": "some_package", "type": "package"}],
+            dependencies=(("lib", "other_package"),),
+        )
+
+    def test_DigestDependsOnlyOnContents(self):
+        # type: (...) -> None
+        copy = Path(p.join(TEST_TEMP_PATH, "copy.vhd"))
+        with open(copy.name, "w") as fd:
+            fd.write(open(self.source.filename.name).read())
+
+        self.assertEqual(
+            self.cache.getDigest(self.source.filename), self.cache.getDigest(copy)
+        )
+
+        with open(copy.name, "a") as fd:
+            fd.write("\n")
+
+        self.assertNotEqual(
+            self.cache.getDigest(self.source.filename), self.cache.getDigest(copy)
+        )
+
+    def test_DigestDependsOnFileType(self):
+        # type: (...) -> None
+        content = "module foo;\n  import some_package::*;\nendmodule\n"
+        verilog = Path(p.join(TEST_TEMP_PATH, "foo.v"))
+        systemverilog = Path(p.join(TEST_TEMP_PATH, "foo.sv"))
+        for path in (verilog, systemverilog):
+            with open(path.name, "w") as fd:
+                fd.write(content)
+
+        self.assertNotEqual(
+            self.cache.getDigest(verilog), self.cache.getDigest(systemverilog)
+        )
+
+        # Only SystemVerilog sources have package dependencies, results of one
+        # must not be reused for the other
+        database = Database(parse_cache=self.cache)
+        database.configure(
+            {"sources": [verilog.name, systemverilog.name]}, TEST_TEMP_PATH
+        )
+        self.assertFalse(database.getDependenciesByPath(verilog))
+        self.assertEqual(
+            {x.name.name for x in database.getDependenciesByPath(systemverilog)},
+            {"some_package"},
+        )
+
+    def test_DigestOfUnreadablePathIsNone(self):
+        # type: (...) -> None
+        self.assertIsNone(
+            self.cache.getDigest(Path(p.join(TEST_TEMP_PATH, "missing.vhd")))
+        )
+
+    def test_StoreAndRecover(self):
+        # type: (...) -> None
+        digest = self.cache.getDigest(self.source.filename)
+        assert digest is not None
+        self.assertIsNone(self.cache.get(digest))
+
+        result = parseSourceCompact(self.source.filename.name)
+        self.cache.put(digest, result)
+
+        recovered = self.cache.get(digest)
+        assert recovered is not None
+        self.assertEqual(recovered, result)
+        self.assertEqual(
+            expandCompactParseResult(self.source.filename, recovered),
+            expandCompactParseResult(self.source.filename, result),
+        )
+
+    def test_InvalidEntriesAreIgnored(self):
+        # type: (...) -> None
+        digest = self.cache.getDigest(self.source.filename)
+        assert digest is not None
+        self.cache.put(digest, parseSourceCompact(self.source.filename.name))
+
+        with open(self.cache._getFilename(digest), "w") as fd:
+            fd.write("{")
+
+        self.assertIsNone(self.cache.get(digest))
+
+
+class TestDatabaseWithParseCache(TestCase):
+    def setUp(self):
+        # type: (...) -> None
+        self.cache = ParseCache(p.join(TEST_TEMP_PATH, "cache_%s" % self.id()))
+        self.sources = [
+            _SourceMock(
+                filename="source_%d.vhd" % i,
+                library="lib",
+                design_units=[{"name": "package_%d" % i, "type": "package"}],
+                dependencies=(("lib", "package_%d" % (i - 1)),) if i else (),
+            )
+            for i in range(3)
+        ]
+
+    def _configure(self, database):
+        # type: (Database) -> None
+        database.configure(
+            {"sources": [source.filename.name for source in self.sources]},
+            TEST_TEMP_PATH,
+        )
+
+    def test_ResultsAreReusedAcrossDatabases(self):
+        # type: (...) -> None
+        database = Database(parse_cache=self.cache)
+        self._configure(database)
+
+        other = Database(parse_cache=self.cache)
+        with patch(
+            "hdl_checker.parser_utils.parseSourceCompact", side_effect=AssertionError
+        ):
+            self._configure(other)
+
+        for source in self.sources:
+            self.assertEqual(
+                other.getDesignUnitsByPath(source.filename),
+                database.getDesignUnitsByPath(source.filename),
+            )
+            self.assertEqual(
+                other.getDependenciesByPath(source.filename),
+                database.getDependenciesByPath(source.filename),
+            )
+
+    def test_TouchingFilesDoesNotTriggerParsing(self):
+        # type: (...) -> None
+        database = Database(parse_cache=self.cache)
+        self._configure(database)
+
+        time.sleep(0.1)
+        path = self.sources[0].filename
+        os.utime(path.name, None)
+
+        units = database.getDesignUnitsByPath(path)
+
+        # Results didn't change, so design units should not be rebuilt either
+        with patch(
+            "hdl_checker.database.parseSourceCompact", side_effect=AssertionError
+        ), patch(
+            "hdl_checker.database.expandCompactParseResult", side_effect=AssertionError,
+        ):
+            self.assertEqual(
+                {x.name.name for x in database.getDesignUnitsByPath(path)},
+                {"package_0"},
+            )
+
+        self.assertEqual(
+            {id(x) for x in database.getDesignUnitsByPath(path)}, {id(x) for x in units}
+        )
+
+    def test_ChangedFilesAreParsed(self):
+        # type: (...) -> None
+        database = Database(parse_cache=self.cache)
+        self._configure(database)
+
+        time.sleep(0.1)
+        source = _SourceMock(
+            filename="source_0.vhd",
+            library="lib",
+            design_units=[{"name": "renamed_package", "type": "package"}],
+        )
+
+        self.assertEqual(
+            {x.name.name for x in database.getDesignUnitsByPath(source.filename)},
+            {"renamed_package"},
+        )
@@ -25,6 +25,7 @@ import json
 import logging
 import os
 import os.path as p
+import pickle
 import subprocess as subp
 import time
 from pprint import pformat
@@ -38,10 +39,15 @@ from hdl_checker.tests import TestCase
 from hdl_checker import DEFAULT_PROJECT_FILE
 from hdl_checker.parser_utils import (
     SourceEntry,
+    expandCompactParseResult,
     filterGitIgnoredPaths,
     flattenConfig,
+    freezeCompactParseResult,
     getIncludedConfigs,
+    getSourceParserFromPath,
     isGitRepo,
+    parseSourceCompact,
+    parseSourcesCompact,
 )
 from hdl_checker.path import Path
 from hdl_checker.types import BuildFlagScope, FileType
@@ -618,3 +624,100 @@ class TestFilterGitIgnoredPaths(TestCase):
                 )
             ),
         )
+
+
+class TestCompactParseResult(TestCase):
+    def setUp(self):
+        self.base_path = mkdtemp(prefix=__name__ + "_")
+
+    def _write(self, name, lines):
+        path = p.join(self.base_path, name)
+        with open(path, "w") as fd:
+            fd.write("\n".join(lines))
+        return Path(path)
+
+    def _assertRoundTrip(self, path):
+        parser = getSourceParserFromPath(path)
+        result = parseSourceCompact(path.name)
+
+        # Should be made only of plain tuples so it can be pickled
+        self.assertEqual(pickle.loads(pickle.dumps(result)), result)
+
+        design_units, dependencies = expandCompactParseResult(path, result)
+        self.assertCountEqual(design_units, parser.getDesignUnits())
+        self.assertCountEqual(dependencies, parser.getDependencies())
+
+    def test_VhdlSource(self):
+        # type: (...) -> Any
+        self._assertRoundTrip(
+            self._write(
+                "source.vhd",
+                [
+                    "library ieee;",
+                    "use ieee.std_logic_1164.all;",
+                    "library lib;",
+                    "use lib.some_package.all;",
+                    "use work.other_package.all;",
+                    "package Some_Package is",
+                    "end package;",
+                    "package body Some_Package is",
+                    "end package body;",
+                    "entity foo is",
+                    "end entity;",
+                ],
+            )
+        )
+
+    def test_VerilogSource(self):
+        # type: (...) -> Any
+        self._assertRoundTrip(
+            self._write(
+                "source.sv",
+                [
+                    '`include "some/header.svh"',
+                    "import SomePackage::*;",
+                    "module Foo;",
+                    "  Bar bar();",
+                    "endmodule",
+                    "package Pkg;",
+                    "endpackage",
+                ],
+            )
+        )
+
+    def test_UnknownExtension(self):
+        # type: (...) -> Any
+        path = self._write("source.txt", ["entity foo is", "end entity;"])
+        self.assertEqual(parseSourceCompact(path.name), ((), ()))
+
+    @patch("hdl_checker.parser_utils._MIN_SOURCES_PER_PARSE_JOB", 2)
+    def test_ParsingManySources(self):
+        # type: (...) -> Any
+        names = [
+            self._write(
+                "source_%d.vhd" % i,
+                ["use work.pkg_%d.all;" % (i - 1), "package pkg_%d is" % i, "end;"],
+            ).name
+            for i in range(8)
+        ]
+
+        expected = [parseSourceCompact(name) for name in names]
+
+        with patch(
+            "hdl_checker.parser_utils._getParsePool", side_effect=AssertionError
+        ):
+            self.assertEqual(list(parseSourcesCompact(names, jobs=1)), expected)
+
+        # Results from the process pool must come in the same order
+        self.assertEqual(list(parseSourcesCompact(names, jobs=4)), expected)
+
+    def test_NamesAreInterned(self):
+        # type: (...) -> Any
+        path = self._write("source.vhd", ["package pkg is", "end;"])
+        units, _ = parseSourceCompact(path.name)
+        units_from_json, _ = freezeCompactParseResult(
+            json.loads(json.dumps(parseSourceCompact(path.name)))
+        )
+
+        self.assertEqual(units, units_from_json)
+        self.assertIs(units[0][1][0], units_from_json[0][1][0])
@@ -0,0 +1,241 @@
+# This file is part of HDL Checker.
+#
+# Copyright (c) 2015 - 2019 suoto (Andre Souto)
+#
+# HDL Checker is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# HDL Checker is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with HDL Checker.  If not, see <http://www.gnu.org/licenses/>.
+# pylint: disable=missing-docstring
+# pylint: disable=protected-access
+
+import logging
+import os.path as p
+import sqlite3
+import time
+from threading import Event
+from typing import List
+
+from mock import patch
+
+from hdl_checker.tests import SourceMock, TestCase, getTestTempPath
+
+from hdl_checker.database import Database
+from hdl_checker.parsers.elements.identifier import Identifier
+from hdl_checker.path import Path
+from hdl_checker.state_store import StateStore
+from hdl_checker.types import BuildFlagScope
+from hdl_checker.utils import removeIfExists
+
+_logger = logging.getLogger(__name__)
+
+TEST_TEMP_PATH = getTestTempPath(__name__)
+
+
+class _SourceMock(SourceMock):
+    base_path = TEST_TEMP_PATH
+
+
+class TestStateStore(TestCase):
+    def setUp(self):
+        # type: (...) -> None
+        filename = p.join(TEST_TEMP_PATH, "state_%s.db" % self.id())
+        removeIfExists(filename)
+        self.store = StateStore(filename)
+        self.addCleanup(self.store.close)
+
+        self.sources = [
+            _SourceMock(
+                filename="source_%d.vhd" % i,
+                design_units=[{"name": "package_%d" % i, "type": "package"}],
+                dependencies=(("lib", "package_%d" % (i - 1)),) if i else (),
+            )
+            for i in range(3)
+        ]
+        self.database = Database()
+        self.database.configure(
+            {
+                "sources": [
+                    (source.filename.name, {"library": "lib", "flags": ("-some",)})
+                    for source in (self.sources[0], self.sources[2])
+                ]
+                # Library of this one is inferred from references to it
+                + [self.sources[1].filename.name]
+            },
+            TEST_TEMP_PATH,
+        )
+
+    def _save(self):
+        # type: (...) -> None
+        self.store.update(self.database.popChangedSources())
+
+    def _load(self):
+        # type: (...) -> Database
+        return Database.fromSources(self.store.getSources())
+
+    def test_StoreAndRecover(self):
+        # type: (...) -> None
+        inferred = self.sources[1].filename
+        self.assertEqual(self.database.getLibrary(inferred), Identifier("lib"))
+        self._save()
+
+        database = self._load()
+        self.assertCountEqual(database.paths, self.database.paths)
+        for path in self.database.paths:
+            self.assertEqual(
+                database.getDesignUnitsByPath(path),
+                self.database.getDesignUnitsByPath(path),
+            )
+            self.assertEqual(
+                database.getDependenciesByPath(path),
+                self.database.getDependenciesByPath(path),
+            )
+            self.assertEqual(database.getLibrary(path), Identifier("lib"))
+            self.assertEqual(
+                database.getFlags(path, BuildFlagScope.single),
+                self.database.getFlags(path, BuildFlagScope.single),
+            )
+
+        self.assertEqual(database._inferred_libraries, {inferred})
+        self.assertEqual(database.popChangedSources(), [])
+
+    def test_OnlyChangedSourcesAreWritten(self):
+        # type: (...) -> None
+        self._save()
+        self.assertEqual(self.database.popChangedSources(), [])
+
+        time.sleep(0.1)
+        source = _SourceMock(
+            filename="source_0.vhd",
+            design_units=[{"name": "renamed_package", "type": "package"}],
+        )
+        self.database.getDesignUnitsByPath(source.filename)
+
+        changes = self.database.popChangedSources()
+        self.assertEqual([path for path, _ in changes], [source.filename])
+        self.store.update(changes)
+
+        self.assertEqual(
+            {x.name.name for x in self._load().getDesignUnitsByPath(source.filename)},
+            {"renamed_package"},
+        )
+
+    def test_SourcesNotParsedYetAreWrittenOnceParsed(self):
+        # type: (...) -> None
+        self._save()
+        source = _SourceMock(
+            filename="not_parsed.vhd",
+            design_units=[{"name": "not_parsed", "type": "package"}],
+        )
+        self.database._addSourceInfo(source.filename, library="lib")
+
+        self.assertEqual(self.database.popChangedSources(), [])
+
+        self.database.getDesignUnitsByPath(source.filename)
+        self._save()
+        self.assertEqual(
+            {x.name.name for x in self._load().getDesignUnitsByPath(source.filename)},
+            {"not_parsed"},
+        )
+
+    def test_RemovedSourcesAreDeleted(self):
+        # type: (...) -> None
+        self._save()
+        path = self.sources[0].filename
+        self.database.removeSource(path)
+        self._save()
+
+        self.assertNotIn(path, self._load().paths)
+
+    def test_ReplaceRemovesOtherSources(self):
+        # type: (...) -> None
+        self._save()
+        self.store.update(Database().popChangedSources(everything=True), replace=True)
+        self.assertEqual(self.store.getSources(), [])
+
+    def test_Values(self):
+        # type: (...) -> None
+        self.assertIsNone(self.store.getValue("path"))
+        self.store.update(values={"path": Path("foo"), "version": "1.0"})
+        self.assertEqual(self.store.getValue("path"), Path("foo"))
+        self.assertEqual(self.store.getValue("version"), "1.0")
+
+    def test_PathsDefiningFromTheIndex(self):
+        # type: (...) -> None
+        self._save()
+        path = self.sources[1].filename
+        name = Identifier("package_1")
+
+        self.assertEqual(self.store.getPathsDefining(name), {path})
+        self.assertEqual(self.store.getPathsDefining(name, Identifier("lib")), {path})
+        # Same as the database, other libraries are used if none match
+        self.assertEqual(
+            self.store.getPathsDefining(name, Identifier("other")),
+            set(self.database.getPathsDefining(name, Identifier("other"))),
+        )
+        self.assertEqual(self.store.getPathsDefining(Identifier("foo")), set())
+
+    def test_DependenciesFromTheIndex(self):
+        # type: (...) -> None
+        self._save()
+        name = Identifier("package_0")
+        self.assertEqual(
+            self.store.getDependenciesByName(name),
+            set(self.database.snapshot.getDependenciesByName(name)),
+        )
+        self.assertEqual(
+            self.store.getLibrary(self.sources[0].filename), Identifier("lib")
+        )
+
+    def test_LookupsAreAnsweredWhileLoading(self):
+        # type: (...) -> None
+        self._save()
+        get_sources = self.store.getSources
+        release = Event()
+
+        def getSources():
+            release.wait()
+            return get_sources()
+
+        with patch.object(self.store, "getSources", getSources):
+            database = Database.fromStore(self.store)
+            self.addCleanup(release.set)
+
+            name = Identifier("package_0")
+            self.assertEqual(
+                set(database.getPathsDefining(name)), {self.sources[0].filename}
+            )
+            (unit,) = self.database.getDesignUnitsByPath(self.sources[0].filename)
+            self.assertCountEqual(
+                database.getReferencesToDesignUnit(unit),
+                self.database.getReferencesToDesignUnit(unit),
+            )
+            # Nothing is loaded yet
+            self.assertIsNotNone(database._loading)
+
+            release.set()
+            self.assertCountEqual(database.paths, self.database.paths)
+            self.assertIsNone(database._store)
+            self.assertEqual(database.popChangedSources(), [])
+
+    def test_LoadErrorsAreReported(self):
+        # type: (...) -> None
+        self._save()
+        errors = []  # type: List[Exception]
+        error = sqlite3.DatabaseError("corrupted")
+        with patch.object(self.store, "getSources", side_effect=error):
+            database = Database.fromStore(self.store, errors.append)
+            loader = database._loader
+            assert loader is not None
+            loader.join()
+
+        self.assertEqual(errors, [error])
+        self.assertFalse(database.paths)
@@ -25,6 +25,7 @@ from nose2.tools.params import params  # type: ignore
 
 import hdl_checker.static_check as static_check
 from hdl_checker.diagnostics import DiagType, LibraryShouldBeOmited, StaticCheckerDiag
+from hdl_checker.utils import TimeBudget
 
 _logger = logging.getLogger(__name__)
 
@@ -127,6 +128,29 @@ with such.A("hdl_checker project") as it:
 
         it.assertCountEqual([], static_check._getMiscChecks(objects))
 
+    @it.should("stop checking when running out of time")  # type: ignore
+    def test():
+        text = (
+            "library work;",
+            "entity foo is",
+            "    port (clk : in std_logic);",
+            "end foo; -- TODO: something to do",
+        )
+
+        it.assertNotEqual([], static_check.getStaticMessages(text))
+        it.assertEqual([], static_check.getStaticMessages(text, TimeBudget(0)))
+
+    @it.should("handle long runs of whitespaces")  # type: ignore
+    def test():
+        text = (
+            "entity foo is",
+            "    port (" + " " * 100000,
+            " " * 100000 + "clk " + " " * 100000,
+            "    signal" + " " * 100000 + "x -- y",
+        )
+
+        it.assertEqual([], static_check.getStaticMessages(text, TimeBudget(None)))
+
     with it.having("an entity-architecture pair"):
 
         @it.has_setup
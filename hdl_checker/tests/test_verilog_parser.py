@@ -21,6 +21,7 @@ import json
 import logging
 from tempfile import NamedTemporaryFile
 
+from mock import patch
 from parameterized import parameterized_class  # type: ignore
 
 from hdl_checker.tests import TestCase, writeListToFile
@@ -141,3 +142,41 @@ class TestVerilogSource(TestCase):
         _logger.info("State before: %s", state)
         recovered = json.loads(state, object_hook=jsonObjectHook)
         self.assertEqual(self.source.filename, recovered.filename)
+
+    def test_UnterminatedCommentRunsUntilTheEnd(self):
+        filename = NamedTemporaryFile(suffix="." + self.filetype).name
+        writeListToFile(
+            filename, ["module foo;", "/* not terminated", "module bar;"] + ["/*"] * 10
+        )
+        source = VerilogParser(Path(filename))
+        self.assertEqual(
+            [x.name for x in source.getDesignUnits()], [VerilogIdentifier("foo")]
+        )
+
+    def test_NonAsciiSourceIsDecodedBeforeScanning(self):
+        filename = NamedTemporaryFile(suffix="." + self.filetype).name
+        writeListToFile(
+            filename,
+            [
+                "/* ação */ module foo;",
+                '  /* ação */ `include "some/header.vh"',
+                "  /* ação */ import some_package::*;",
+                "endmodule",
+            ],
+        )
+
+        # Parsers that have read the content scan it decoded
+        decoded = VerilogParser(Path(filename))
+        decoded.getSourceContent()
+
+        source = VerilogParser(Path(filename))
+        self.assertCountEqual(source.getDesignUnits(), decoded.getDesignUnits())
+        self.assertCountEqual(source.getDependencies(), decoded.getDependencies())
+
+    @patch("hdl_checker.parsers.verilog_parser.STREAMING_MIN_SIZE", 0)
+    def test_StreamingMatchesReadingTheFile(self):
+        source = VerilogParser(Path(self.filename))
+        self.assertCountEqual(source.getDesignUnits(), self.source.getDesignUnits())
+        self.assertCountEqual(source.getDependencies(), self.source.getDependencies())
+        # Contents should not have been read into memory
+        self.assertIsNone(source._content)
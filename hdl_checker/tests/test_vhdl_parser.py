@@ -23,6 +23,7 @@ import json
 import logging
 import os
 import os.path as p
+import random
 import time
 
 from nose2.tools import such  # type: ignore
@@ -32,7 +33,7 @@ from hdl_checker.tests import assertSameFile, writeListToFile
 from hdl_checker.parsers.elements.dependency_spec import RequiredDesignUnit
 from hdl_checker.parsers.elements.design_unit import VhdlDesignUnit
 from hdl_checker.parsers.elements.identifier import Identifier
-from hdl_checker.parsers.vhdl_parser import VhdlParser
+from hdl_checker.parsers.vhdl_parser import VhdlBufferParser, VhdlParser
 from hdl_checker.path import Path
 from hdl_checker.serialization import StateEncoder, jsonObjectHook
 from hdl_checker.types import DesignUnitType
@@ -416,6 +417,26 @@ with such.A("VHDL source file object") as it:
         def test():
             it.assertEqual(os.path.getmtime(_FILENAME), it.source.getmtime())
 
+        @it.should("not keep the content of ASCII sources")  # type: ignore
+        def test():
+            it.source.getDependencies()
+            it.assertIsNone(it.source._content)
+
+        @it.should("decode non ASCII sources before scanning")  # type: ignore
+        def test():
+            code = list(it._code)
+            code[
+                11
+            ] = '    constant ANOTHER_CONSTANT : string := "ação" & work.foo.bar;'
+            writeListToFile(_FILENAME, code)
+            try:
+                source = VhdlParser(Path(_FILENAME))
+                decoded = VhdlBufferParser(Path(_FILENAME), "\n".join(code))
+                it.assertCountEqual(source.getDesignUnits(), decoded.getDesignUnits())
+                it.assertCountEqual(source.getDependencies(), decoded.getDependencies())
+            finally:
+                writeListToFile(_FILENAME, it._code)
+
     with it.having("a context code"):
 
         @it.has_setup
@@ -486,5 +507,156 @@ with such.A("VHDL source file object") as it:
         def test():
             it.assertEqual(os.path.getmtime(_FILENAME), it.source.getmtime())
 
+    with it.having("comments ending with keywords"):
+
+        @it.has_setup
+        def setup():
+            it._code = [
+                "-- The package below goes into a library",
+                "package pkg_a is",
+                "end package;",
+                "-- Uses lib.pkg_b from library",
+                "library lib;",
+                "use lib.pkg_b.all;",
+            ]
+
+            writeListToFile(_FILENAME, it._code)
+
+        @it.has_teardown
+        def teardown():
+            if os.path.exists(_FILENAME):
+                os.remove(_FILENAME)
+
+        @it.should("create the object with no errors")  # type: ignore
+        def test():
+            it.source = VhdlParser(Path(_FILENAME))
+
+        @it.should("return the names of the packages found")  # type: ignore
+        def test():
+            it.assertCountEqual(
+                list(it.source.getDesignUnits()),
+                [
+                    VhdlDesignUnit(
+                        owner=it.source.filename,
+                        type_=DesignUnitType.package,
+                        name="pkg_a",
+                        locations={(1, 8)},
+                    )
+                ],
+            )
+
+        @it.should("return its dependencies")  # type: ignore
+        def test():  # type: () -> None
+            it.assertCountEqual(
+                it.source.getDependencies(),
+                [
+                    _DependencySpec(
+                        owner=it.source.filename,
+                        name="pkg_b",
+                        library="lib",
+                        locations={(5, 4)},
+                    )
+                ],
+            )
+
+        @it.should("return the libraries found")  # type: ignore
+        def test():
+            it.assertCountEqual(it.source.getLibraries(), ["lib"])
+
+        @it.should("scan the content only once")  # type: ignore
+        def test():
+            it.assertIs(it.source._scan(), it.source._scan())
+
+    with it.having("a buffer being edited"):
+
+        @it.has_setup
+        def setup():
+            it._code = "\n".join(
+                [
+                    "library lib; -- Comment; with a semicolon",
+                    "use lib.pkg_a.all;",
+                    "package pkg_a is",
+                    "  constant C : integer := lib.pkg_b.C;",
+                    "end package;",
+                    "package body pkg_a is",
+                    "end package body;",
+                ]
+            )
+            it.source = VhdlBufferParser(Path(_FILENAME), it._code)
+
+        @it.should("parse its contents even if the file doesn't exist")  # type: ignore
+        def test():
+            it.assertFalse(p.exists(_FILENAME))
+            it.assertCountEqual(
+                it.source.getDependencies(),
+                [
+                    _DependencySpec(
+                        owner=it.source.filename,
+                        name="pkg_a",
+                        library="lib",
+                        locations={(1, 4)},
+                    ),
+                    _DependencySpec(
+                        owner=it.source.filename,
+                        name="pkg_b",
+                        library="lib",
+                        locations={(3, 26)},
+                    ),
+                    _DependencySpec(
+                        owner=it.source.filename,
+                        name="pkg_a",
+                        library=None,
+                        locations={(5, 0)},
+                    ),
+                ],
+            )
+
+        @it.should("shift locations below the change")  # type: ignore
+        def test():
+            it.source.applyChange(0, 0, "-- Header\n\n")
+            it.assertCountEqual(
+                list(it.source.getDesignUnits()),
+                [
+                    VhdlDesignUnit(
+                        owner=it.source.filename,
+                        type_=DesignUnitType.package,
+                        name="pkg_a",
+                        locations={(4, 8)},
+                    )
+                ],
+            )
+
+        @it.should("match parsing the content from scratch")  # type: ignore
+        def test():
+            pieces = [
+                "library lib;",
+                "use lib.pkg.all;",
+                "-- comment; with a semicolon",
+                "package pkg_c is",
+                "package body pkg_c is",
+                "entity foo is",
+                "end;",
+                "lib.pkg.C",
+                "-",
+                ";",
+                "\n",
+                " ",
+            ]
+            rand = random.Random(0)
+            for _ in range(500):
+                content = it.source.getSourceContent()
+                start = rand.randint(0, len(content))
+                end = rand.randint(start, min(len(content), start + 20))
+                text = "".join(rand.choice(pieces) for _ in range(rand.randint(0, 3)))
+
+                it.source.applyChange(start, end, text)
+
+                expected = VhdlBufferParser(
+                    it.source.filename, content[:start] + text + content[end:]
+                )
+                it.assertEqual(it.source._getTokens(), expected._getTokens())
+                it.assertEqual(it.source.getDependencies(), expected.getDependencies())
+                it.assertEqual(it.source.getDesignUnits(), expected.getDesignUnits())
+
 
 it.createTests(globals())
@@ -29,8 +29,10 @@ import signal
 import subprocess as subp
 import sys
 import threading
+import time
 from collections import Counter
-from tempfile import NamedTemporaryFile
+from stat import S_ISREG
+from tempfile import NamedTemporaryFile, mkstemp
 from threading import Timer
 from typing import Callable, Dict, Iterable, List, Optional, Tuple, TypeVar, Union
 
@@ -249,6 +251,24 @@ def isFileReadable(path):
         return False
 
 
+def getReadableMtime(path):
+    # type: (str) -> Optional[float]
+    """
+    Returns the modification time of path if it's a readable file or None
+    otherwise. Unlike isFileReadable, the file is not opened: os.access takes
+    ownership, ACLs and the permissions of parent directories into account
+    """
+    try:
+        stat_result = os.stat(path)
+    except OSError:
+        return None
+
+    if not S_ISREG(stat_result.st_mode) or not os.access(path, os.R_OK):
+        return None
+
+    return stat_result.st_mtime
+
+
 def runShellCommand(cmd_with_args, shell=False, env=None, cwd=None):
     # type: (Union[Tuple[str], List[str]], bool, Optional[Dict], Optional[str]) -> Iterable[str]
     """
@@ -294,6 +314,27 @@ def removeIfExists(filename):
         return False
 
 
+# os.replace overwrites the destination on every platform, Python 2 only has
+# os.rename
+_replace = getattr(os, "replace", os.rename)
+
+
+def writeFileAtomically(filename, content):
+    # type: (str, str) -> None
+    """
+    Writes content to a temporary file on the same directory as filename and
+    then renames it, so that readers never see partially written files
+    """
+    fd, temp_name = mkstemp(dir=p.dirname(filename), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as temp_fd:
+            temp_fd.write(content)
+        _replace(temp_name, filename)
+    except:
+        removeIfExists(temp_name)
+        raise
+
+
 def removeDirIfExists(dirname):
     # type: (str) -> bool
     """
@@ -378,6 +419,24 @@ def getMostCommonItem(items):
     return max(items, key=data.get)
 
 
+class TimeBudget(object):  # pylint: disable=useless-object-inheritance
+    """
+    Time allowed for some work, so that long loops can check if they should
+    stop early. A budget of None never runs out
+    """
+
+    def __init__(self, seconds):
+        # type: (Optional[float]) -> None
+        self.seconds = seconds
+        self._deadline = None if seconds is None else time.time() + seconds
+
+    @property
+    def exhausted(self):
+        # type: () -> bool
+        "Checks if the time allowed has passed"
+        return self._deadline is not None and time.time() >= self._deadline
+
+
 def readFile(path):
     "Wrapper around open().read() that return \n for new lines"
     return open(path, mode="r", newline="\n", errors="replace").read()